@@ -26,8 +26,12 @@ CREATE TABLE IF NOT EXISTS users (
     skills TEXT[] DEFAULT '{}',
     achievements TEXT[] DEFAULT '{}',
     joined_date TIMESTAMP DEFAULT NOW(),
+    token_version INTEGER NOT NULL DEFAULT 0,
+    avatar TEXT,
     created_at TIMESTAMP DEFAULT NOW()
 );
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar TEXT;
 
 -- Cohorts table
 CREATE TABLE IF NOT EXISTS cohorts (
@@ -65,10 +69,33 @@ CREATE TABLE IF NOT EXISTS stats (
     category TEXT NOT NULL,
     label TEXT NOT NULL,
     value TEXT NOT NULL,
+    number DOUBLE PRECISION,
+    value_format TEXT,
     icon TEXT NOT NULL,
     color TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT NOW()
 );
+ALTER TABLE stats ADD COLUMN IF NOT EXISTS number DOUBLE PRECISION;
+ALTER TABLE stats ADD COLUMN IF NOT EXISTS value_format TEXT;
+
+-- Stats snapshots (one row per category and interval, see utils/stats_history.py)
+CREATE TABLE IF NOT EXISTS stats_snapshots (
+    id TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    taken_at BIGINT NOT NULL,
+    stat_ids JSONB NOT NULL DEFAULT '[]',
+    numbers JSONB NOT NULL DEFAULT '[]'
+);
+
+-- Cohort progress history (one sample per change, see utils/progress_history.py)
+CREATE TABLE IF NOT EXISTS cohort_progress (
+    id TEXT PRIMARY KEY,
+    cohort_id TEXT NOT NULL,
+    recorded_at BIGINT NOT NULL,
+    progress INTEGER NOT NULL,
+    completed_milestones INTEGER NOT NULL,
+    participants INTEGER NOT NULL
+);
 
 -- Channels table
 CREATE TABLE IF NOT EXISTS channels (
@@ -80,8 +107,20 @@ CREATE TABLE IF NOT EXISTS channels (
     last_message_time TEXT DEFAULT '',
     online BOOLEAN DEFAULT FALSE,
     typing BOOLEAN DEFAULT FALSE,
+    members_only BOOLEAN DEFAULT FALSE,
+    cohort_id TEXT,
     created_at TIMESTAMP DEFAULT NOW()
 );
+ALTER TABLE channels ADD COLUMN IF NOT EXISTS members_only BOOLEAN DEFAULT FALSE;
+ALTER TABLE channels ADD COLUMN IF NOT EXISTS cohort_id TEXT;
+
+-- Channel members table (members-only channels, see utils/membership.py)
+CREATE TABLE IF NOT EXISTS channel_members (
+    id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    joined_at TIMESTAMP DEFAULT NOW()
+);
 
 -- Messages table
 CREATE TABLE IF NOT EXISTS messages (
@@ -115,6 +154,80 @@ CREATE TABLE IF NOT EXISTS events (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Message archive table (compressed blocks of old messages from utils/retention.py)
+CREATE TABLE IF NOT EXISTS message_archives (
+    id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    first_date TEXT,
+    last_date TEXT,
+    message_ids JSONB NOT NULL DEFAULT '[]',
+    parent_ids JSONB,
+    data TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Archive block of every archived message, keyed by message id
+CREATE TABLE IF NOT EXISTS archived_messages (
+    id TEXT PRIMARY KEY,
+    block_id TEXT NOT NULL
+);
+
+-- Revoked access tokens (a token id, or a user's lowest valid token version), pruned after expiry
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL CHECK (kind IN ('token', 'user')),
+    user_id TEXT,
+    token_version INTEGER,
+    expires_at BIGINT NOT NULL
+);
+
+-- First responses of requests sent with an Idempotency-Key, replayed to retries until they expire
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    id TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    response JSONB NOT NULL,
+    expires_at BIGINT NOT NULL
+);
+
+-- Background jobs table (durable jobs from utils/jobs.py, removed once they succeed)
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Change log table (one row per write to a synced table, read by GET /api/sync)
+CREATE TABLE IF NOT EXISTS changes (
+    id TEXT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    entity TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    data JSONB,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Named counters (the change log's versions), advanced by next_sequence() below
+CREATE TABLE IF NOT EXISTS sequences (
+    id TEXT PRIMARY KEY,
+    value BIGINT NOT NULL
+);
+
+-- Schema metadata table (seed version marker checked on startup)
+CREATE TABLE IF NOT EXISTS schema_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
 -- Insert default stats data
 INSERT INTO stats (id, category, label, value, icon, color) VALUES
     ('c1', 'cohort', 'Total Participants', '105', 'Users', 'text-cyan-600'),
@@ -137,12 +250,63 @@ INSERT INTO cohorts (id, name, program, status, start_date, end_date, participan
      ARRAY['Onboarding', 'Mentor Matching', 'Development', 'Launch'], 0)
 ON CONFLICT (id) DO NOTHING;
 
+-- Seed version marker (matches SEED_VERSION in utils/db_init.py)
+-- Left at 1 here so the API seeds channels, campus leads and messages on first start
+INSERT INTO schema_meta (key, value) VALUES ('seed_version', '1')
+ON CONFLICT (key) DO NOTHING;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_cohorts_status ON cohorts(status);
 CREATE INDEX IF NOT EXISTS idx_stats_category ON stats(category);
 CREATE INDEX IF NOT EXISTS idx_messages_channel ON messages(channel_id);
 CREATE INDEX IF NOT EXISTS idx_events_date ON events(date);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_channels_type ON channels(type);
+CREATE INDEX IF NOT EXISTS idx_channels_cohort ON channels(cohort_id);
+CREATE INDEX IF NOT EXISTS idx_campus_leads_status ON campus_leads(status);
+CREATE INDEX IF NOT EXISTS idx_campus_leads_user ON campus_leads(user_id);
+CREATE INDEX IF NOT EXISTS idx_events_cohort ON events(cohort_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_messages_reply_to ON messages(reply_to_id);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(date);
+CREATE INDEX IF NOT EXISTS idx_message_archives_channel ON message_archives(channel_id);
+CREATE INDEX IF NOT EXISTS idx_changes_version ON changes(version);
+CREATE INDEX IF NOT EXISTS idx_channel_members_channel ON channel_members(channel_id);
+CREATE INDEX IF NOT EXISTS idx_channel_members_user ON channel_members(user_id);
+CREATE INDEX IF NOT EXISTS idx_cohort_progress_cohort ON cohort_progress(cohort_id);
+CREATE INDEX IF NOT EXISTS idx_stats_snapshots_category ON stats_snapshots(category);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at);
+
+-- Apply a stats diff for one category in a single transaction
+-- Used by PUT /api/stats/{category} so unchanged tiles keep their ids and
+-- readers never see an empty category between a delete and an insert
+CREATE OR REPLACE FUNCTION apply_stats_diff(p_category TEXT, p_upserts JSONB, p_delete_ids TEXT[])
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO stats (id, category, label, value, number, value_format, icon, color)
+    SELECT s.id, p_category, s.label, s.value, s.number, s.value_format, s.icon, s.color
+    FROM jsonb_to_recordset(p_upserts)
+        AS s(id TEXT, label TEXT, value TEXT, number DOUBLE PRECISION, value_format TEXT, icon TEXT, color TEXT)
+    ON CONFLICT (id) DO UPDATE
+        SET label = EXCLUDED.label,
+            value = EXCLUDED.value,
+            number = EXCLUDED.number,
+            value_format = EXCLUDED.value_format,
+            icon = EXCLUDED.icon,
+            color = EXCLUDED.color;
+
+    DELETE FROM stats WHERE category = p_category AND id = ANY(p_delete_ids);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Advance a named counter and return its new value in one statement (Store.next_sequence)
+-- Change log versions come from here, so API servers on different hosts never reuse one
+CREATE OR REPLACE FUNCTION next_sequence(p_name TEXT, p_start BIGINT)
+RETURNS BIGINT AS $$
+    INSERT INTO sequences (id, value) VALUES (p_name, p_start + 1)
+    ON CONFLICT (id) DO UPDATE SET value = sequences.value + 1
+    RETURNING value;
+$$ LANGUAGE sql;
 
 -- Enable Row Level Security (RLS) - Optional but recommended
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
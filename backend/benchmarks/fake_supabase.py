@@ -0,0 +1,214 @@
+"""
+Local stand-in for the Supabase client used by the benchmarks
+Implements the subset of the postgrest query builder the routers use
+(select/insert/update/upsert/delete with eq/in_/gt/lt/limit/order and rpc) on top of
+in-process tables. Every execute() blocks for the configured latency, like the
+synchronous Supabase client does. Columns come from SUPABASE_SETUP.sql, and
+ordering by a column the real table doesn't have fails like PostgREST does.
+"""
+import copy
+from datetime import datetime, timedelta
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Tuple
+
+SETUP_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "SUPABASE_SETUP.sql")
+
+def _schema_columns(path: str = SETUP_SQL) -> Tuple[dict, dict]:
+    """
+    (table name -> column names, table name -> columns defaulting to NOW()),
+    declared by CREATE TABLE and ALTER TABLE ... ADD COLUMN
+    """
+    with open(path) as f:
+        sql = f.read()
+    columns, timestamps = {}, {}
+    for table, body in re.findall(r"CREATE TABLE IF NOT EXISTS (\w+) \((.*?)\n\);", sql, re.S):
+        lines = [line.strip() for line in body.strip().splitlines() if line.strip()]
+        columns[table] = {line.split()[0] for line in lines}
+        timestamps[table] = [line.split()[0] for line in lines if "DEFAULT NOW()" in line]
+    for table, column in re.findall(r"ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+)", sql):
+        columns.setdefault(table, set()).add(column)
+    return columns, timestamps
+
+class FakeAPIError(Exception):
+    """Raised by execute() for queries PostgREST would reject"""
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    def __init__(self, client, table: str):
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._columns = None
+        self._payload = None
+        self._filters = []
+        self._limit = None
+        self._offset = 0
+        self._order = []
+
+    def select(self, columns: str = "*", **kwargs):
+        self._action = "select"
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, payload, **kwargs):
+        self._action, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload, **kwargs):
+        self._action, self._payload = "upsert", payload
+        return self
+
+    def update(self, payload, **kwargs):
+        self._action, self._payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self._action = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def lt(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order.append((column, desc))
+        return self
+
+    def _check(self):
+        known = self._client.columns.get(self._table)
+        for column, _ in self._order:
+            if known is not None and column not in known:
+                raise FakeAPIError(f"column {self._table}.{column} does not exist")
+
+    def _matches(self, row) -> bool:
+        return all(f(row) for f in self._filters)
+
+    def execute(self):
+        self._client.simulate_latency()
+        self._check()
+        with self._client.lock:
+            return FakeResponse(self._run(self._client.tables.setdefault(self._table, {})))
+
+    def _run(self, rows: dict):
+        if self._action == "select":
+            result = [row for row in rows.values() if self._matches(row)]
+            # Stable sorts, last key first, rows without the column keep insertion order
+            for column, desc in reversed(self._order):
+                result.sort(key=lambda row: str(row.get(column) or ""), reverse=desc)
+            if self._limit is not None:
+                result = result[self._offset:self._offset + self._limit]
+            if self._columns:
+                result = [{c: row.get(c) for c in self._columns} for row in result]
+            return copy.deepcopy(result)
+
+        if self._action in ("insert", "upsert"):
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            result = []
+            for item in payload:
+                row = dict(item)
+                # schema_meta is keyed by "key", every other table by "id"
+                primary_key = "key" if "key" in row and "id" not in row else "id"
+                key = row.get(primary_key) or str(uuid.uuid4())
+                row[primary_key] = key
+                if self._action == "upsert" and key in rows:
+                    rows[key].update(row)
+                else:
+                    rows[key] = self._client.with_defaults(self._table, row)
+                result.append(copy.deepcopy(rows[key]))
+            return result
+
+        matched = [key for key, row in rows.items() if self._matches(row)]
+        if self._action == "update":
+            for key in matched:
+                rows[key].update(self._payload)
+            return [copy.deepcopy(rows[key]) for key in matched]
+
+        # delete
+        return [rows.pop(key) for key in matched]
+
+class FakeRpc:
+    def __init__(self, client, fn: str, params: dict):
+        self._client = client
+        self._fn = fn
+        self._params = params
+
+    def execute(self):
+        self._client.simulate_latency()
+        handler = getattr(self._client, f"_rpc_{self._fn}")
+        with self._client.lock:
+            return FakeResponse(handler(**self._params))
+
+class FakeSupabase:
+    """In-process Supabase stand-in with injected per-call latency (seconds)"""
+
+    def __init__(self, latency: float = 0.0, tables: dict = None):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.columns, self.timestamps = _schema_columns()
+        self._clock = datetime.now()
+        self.tables = {
+            name: {row.get("id") or row.get("key"): self.with_defaults(name, dict(row)) for row in rows}
+            for name, rows in (tables or {}).items()
+        }
+        self.calls = 0
+
+    def simulate_latency(self):
+        self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def with_defaults(self, table: str, row: dict) -> dict:
+        """Fill DEFAULT NOW() columns, strictly increasing so they order rows like insertion"""
+        for column in self.timestamps.get(table, ()):
+            if row.get(column) is None:
+                self._clock += timedelta(microseconds=1)
+                row[column] = self._clock.isoformat()
+        return row
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, fn: str, params: dict = None) -> FakeRpc:
+        return FakeRpc(self, fn, params or {})
+
+    def _rpc_next_sequence(self, p_name: str, p_start: int):
+        sequences = self.tables.setdefault("sequences", {})
+        value = sequences[p_name]["value"] + 1 if p_name in sequences else p_start + 1
+        sequences[p_name] = {"id": p_name, "value": value}
+        return value
+
+    def _rpc_apply_stats_diff(self, p_category: str, p_upserts: list, p_delete_ids: list):
+        stats = self.tables.setdefault("stats", {})
+        for row in p_upserts:
+            stats[row["id"]] = {**row, "category": p_category}
+        for stat_id in p_delete_ids:
+            stats.pop(stat_id, None)
+        return None
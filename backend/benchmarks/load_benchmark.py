@@ -0,0 +1,257 @@
+"""
+Load-test and benchmark suite for the API routers
+
+Drives the real `app` from server.py in-process through httpx's ASGI transport
+with a mix of realistic workloads (logins, dashboard loads, chat send/read,
+calendar queries and stats edits). Supabase is replaced by a local stand-in
+with configurable injected latency, or the run can use the in-memory or
+SQLite store directly to compare storage backends.
+
+Reports p50/p95/p99 latency and throughput per endpoint, optionally writes the
+results as JSON and compares them against a previous run.
+
+Usage (from the backend directory):
+    python benchmarks/load_benchmark.py --users 20 --duration 10 --latency-ms 5 --output results.json
+    python benchmarks/load_benchmark.py --compare results.json --threshold 0.2
+    python benchmarks/load_benchmark.py --backend sqlite
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from benchmarks.fake_supabase import FakeSupabase
+from storage.seed import SEED_DATA
+from storage.supabase_store import SupabaseStore
+from utils.database import db, create_store
+from utils.metrics import InstrumentedClient
+
+# Scenario name -> relative weight in the mixed workload
+WORKLOAD_MIX = {
+    "login": 1,
+    "dashboard": 4,
+    "chat": 4,
+    "calendar": 2,
+    "stats_edit": 1,
+}
+
+PASSWORD = "benchmark-password"
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[label].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random):
+        self.email = f"bench-user-{index}@bench.edventurepark.com"
+        self.role = "team" if index % 3 else "campus_lead"
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.headers = {}
+
+    async def register(self):
+        response = await self.client.post("/api/auth/register", json={
+            "email": self.email, "name": self.email.split("@")[0], "role": self.role, "password": PASSWORD
+        })
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def login(self):
+        await self.recorder.call(self.client, "POST /api/auth/login", "POST", "/api/auth/login",
+                                 json={"email": self.email, "password": PASSWORD})
+
+    async def dashboard(self):
+        call, h = self.recorder.call, self.headers
+        await call(self.client, "GET /api/cohorts", "GET", "/api/cohorts", headers=h)
+        await call(self.client, "GET /api/stats/{category}", "GET", "/api/stats/cohort", headers=h)
+        await call(self.client, "GET /api/stats/{category}", "GET", "/api/stats/campus_lead", headers=h)
+        await call(self.client, "GET /api/campus-leads", "GET", "/api/campus-leads", headers=h)
+        await call(self.client, "GET /api/messages/channels", "GET", "/api/messages/channels", headers=h)
+        await call(self.client, "GET /api/events", "GET", "/api/events", headers=h)
+        await call(self.client, "GET /api/profile", "GET", "/api/profile", headers=h)
+
+    async def chat(self):
+        channel_id = self.rng.choice(["2", "3", "4"])
+        h = self.headers
+        await self.recorder.call(self.client, "GET /api/messages/{channel_id}", "GET", f"/api/messages/{channel_id}", headers=h)
+        await self.recorder.call(self.client, "POST /api/messages/{channel_id}", "POST", f"/api/messages/{channel_id}", headers=h, json={
+            "channel_id": channel_id, "sender": self.email, "role": self.role, "content": "Benchmark message " + "x" * self.rng.randint(10, 200)
+        })
+
+    async def calendar(self):
+        h = self.headers
+        if self.rng.random() < 0.3:
+            await self.recorder.call(self.client, "POST /api/events", "POST", "/api/events", headers=h, json={
+                "title": "Benchmark session", "description": "Load test event",
+                "date": f"2030-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}", "time": "10:00",
+                "cohort_id": "1", "created_by": self.email
+            })
+        await self.recorder.call(self.client, "GET /api/events", "GET", "/api/events", headers=h)
+
+    async def stats_edit(self):
+        h = self.headers
+        response = await self.recorder.call(self.client, "GET /api/stats/{category}", "GET", "/api/stats/cohort", headers=h)
+        if self.role != "team" or response.status_code != 200:
+            return
+        stats = response.json()
+        if stats:
+            stats[self.rng.randrange(len(stats))]["value"] = str(self.rng.randint(1, 500))
+        await self.recorder.call(self.client, "PUT /api/stats/{category}", "PUT", "/api/stats/cohort", headers=h, json={"stats": stats})
+
+    async def run(self, deadline: float):
+        scenarios = list(WORKLOAD_MIX)
+        weights = [WORKLOAD_MIX[name] for name in scenarios]
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(scenarios, weights)[0]
+            await getattr(self, scenario)()
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def install_fake_supabase(latency_ms: float) -> FakeSupabase:
+    fake = FakeSupabase(latency=latency_ms / 1000, tables=SEED_DATA)
+    db.client = InstrumentedClient(fake)
+    db.store = SupabaseStore(lambda: db.client)
+    return fake
+
+def install_store(backend: str, latency_ms: float):
+    """Point the app at the requested backend, returns the fake Supabase client if used"""
+    if backend == "supabase":
+        return install_fake_supabase(latency_ms)
+    if backend == "sqlite":
+        from utils.config import settings
+        settings.sqlite_path = os.path.join(tempfile.mkdtemp(prefix="edventure-bench-"), "bench.db")
+    db.store = create_store(backend)
+    return None
+
+async def run_benchmark(users: int, duration: float, latency_ms: float, seed: int, backend: str = "supabase") -> dict:
+    from server import app
+    from utils.config import settings
+    from utils.jobs import job_queue
+
+    # Every virtual user shares one client address, which the rate limiter would throttle
+    settings.rate_limit_enabled = False
+    fake = install_store(backend, latency_ms)
+    recorder = Recorder()
+    rng = random.Random(seed)
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport doesn't run startup events, start the background job workers like the server does
+    await job_queue.start()
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        virtual_users = [VirtualUser(i, client, recorder, random.Random(rng.random())) for i in range(users)]
+        await asyncio.gather(*(user.register() for user in virtual_users))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user.run(started + duration) for user in virtual_users))
+        elapsed = time.perf_counter() - started
+    await job_queue.stop()
+
+    endpoints = {}
+    total_requests = 0
+    for label, samples in sorted(recorder.latencies.items()):
+        samples.sort()
+        total_requests += len(samples)
+        endpoints[label] = {
+            "requests": len(samples),
+            "errors": recorder.errors[label],
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p95_ms": round(percentile(samples, 95) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        }
+
+    return {
+        "benchmark": "load",
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {"users": users, "duration_s": duration, "backend": backend, "latency_ms": latency_ms, "seed": seed, "mix": WORKLOAD_MIX},
+        "elapsed_s": round(elapsed, 3),
+        "total_requests": total_requests,
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "backend_calls": fake.calls if fake else None,
+        "endpoints": endpoints,
+    }
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """Return a list of endpoints whose p95 or throughput regressed by more than `threshold`"""
+    regressions = []
+    for label, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if not before:
+            continue
+        if before["p95_ms"] > 0 and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{label}: p95 {before['p95_ms']} ms -> {now['p95_ms']} ms")
+        if now["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{label}: throughput {before['throughput_rps']} -> {now['throughput_rps']} req/s")
+    return regressions
+
+def print_report(result: dict):
+    print(f"{result['config']['backend']}: {result['total_requests']} requests in {result['elapsed_s']} s "
+          f"({result['throughput_rps']} req/s, {result['backend_calls']} backend calls)")
+    print(f"{'endpoint':<34}{'reqs':>8}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, row in result["endpoints"].items():
+        print(f"{label:<34}{row['requests']:>8}{row['errors']:>6}{row['throughput_rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed-workload load benchmark for the API")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run the workload")
+    parser.add_argument("--backend", choices=["supabase", "sqlite", "memory"], default="supabase",
+                        help="Storage backend, supabase uses the local stand-in")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected latency per Supabase call")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args.users, args.duration, args.latency_ms, args.seed, args.backend))
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
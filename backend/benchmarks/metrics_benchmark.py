@@ -0,0 +1,83 @@
+"""
+Instrumentation overhead benchmark
+
+Measures the per-call cost of the metrics primitives and of MetricsMiddleware
+around a minimal ASGI app, so the overhead added to every request is known.
+
+Usage (from the backend directory):
+    python benchmarks/metrics_benchmark.py --iterations 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import MetricsMiddleware, MetricsRegistry, track_backend_call
+
+class _Route:
+    path = "/api/bench/{item_id}"
+
+async def _bare_app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+async def _send(message):
+    pass
+
+def _per_call_ns(func, iterations: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter_ns() - started) / iterations
+
+async def _asgi_per_call_ns(app, iterations: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        scope = {"type": "http", "method": "GET", "path": "/api/bench/1"}
+        await app(scope, _receive, _send)
+    return (time.perf_counter_ns() - started) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure metrics instrumentation overhead")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable output")
+    args = parser.parse_args()
+    n = args.iterations
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "Benchmark counter", ("route",))
+    histogram = registry.histogram("bench_seconds", "Benchmark histogram", ("route",))
+
+    def use_backend_timer():
+        with track_backend_call("memory", "bench", "select"):
+            pass
+
+    bare_ns = asyncio.run(_asgi_per_call_ns(_bare_app, n))
+    instrumented_ns = asyncio.run(_asgi_per_call_ns(MetricsMiddleware(_bare_app), n))
+
+    result = {
+        "benchmark": "metrics_overhead",
+        "iterations": n,
+        "counter_inc_ns": round(_per_call_ns(lambda: counter.inc("/a"), n), 1),
+        "histogram_observe_ns": round(_per_call_ns(lambda: histogram.observe("/a", value=0.003), n), 1),
+        "backend_timer_ns": round(_per_call_ns(use_backend_timer, n), 1),
+        "request_bare_ns": round(bare_ns, 1),
+        "request_instrumented_ns": round(instrumented_ns, 1),
+        "middleware_overhead_ns": round(instrumented_ns - bare_ns, 1),
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>26}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Multi-worker throughput and consistency benchmark
+
+Starts uvicorn with 1 and N workers on the SQLite backend with the per-worker
+read cache enabled, then:
+- measures read throughput (dashboard-style GETs) from concurrent clients
+- sends messages and reads them back over fresh connections, which land on
+  arbitrary workers, counting reads that miss the message just written
+
+Usage (from the backend directory):
+    python benchmarks/multiworker_benchmark.py --workers 4 --duration 5
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READ_PATHS = ["/api/cohorts", "/api/stats/cohort", "/api/campus-leads", "/api/messages/channels", "/api/messages/2"]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _request(port: int, method: str, path: str, body=None, headers=None, conn=None):
+    own = conn is None
+    conn = conn or http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        conn.request(method, path, body=payload, headers={"Content-Type": "application/json", **(headers or {})})
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, data
+    finally:
+        if own:
+            conn.close()
+
+def start_server(workers: int, workdir: str):
+    port = _free_port()
+    env = {
+        **os.environ,
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(workdir, "bench.db"),
+        "SHARED_STATE_PATH": os.path.join(workdir, "bench.versions"),
+        "READ_CACHE_ENABLED": "true",
+        "WORKERS": str(workers),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if _request(port, "GET", "/api/health")[0] == 200:
+                # Give the remaining workers a moment to finish starting
+                time.sleep(0.5 if workers > 1 else 0)
+                return process, port
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise TimeoutError("Server did not start")
+
+def measure_throughput(port: int, headers: dict, clients: int, duration: float) -> float:
+    stop = time.monotonic() + duration
+    counts = [0] * clients
+
+    def client(index: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        i = 0
+        while time.monotonic() < stop:
+            _request(port, "GET", READ_PATHS[i % len(READ_PATHS)], headers=headers, conn=conn)
+            i += 1
+        counts[index] = i
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration
+
+def check_consistency(port: int, headers: dict, rounds: int) -> int:
+    """Write a message, then read it back from several fresh connections; return misses"""
+    misses = 0
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for i in range(rounds):
+            status, data = _request(port, "POST", "/api/messages/2", headers=headers, body={
+                "channel_id": "2", "sender": "bench", "role": "team", "content": f"consistency {i}"
+            })
+            message_id = json.loads(data)["id"]
+            reads = pool.map(lambda _: _request(port, "GET", "/api/messages/2", headers=headers)[1], range(8))
+            misses += sum(1 for body in reads if message_id not in {m["id"] for m in json.loads(body)})
+    return misses
+
+def run(workers: int, clients: int, duration: float, rounds: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="edventure-mw-") as workdir:
+        process, port = start_server(workers, workdir)
+        try:
+            status, data = _request(port, "POST", "/api/auth/register", body={
+                "email": "bench@bench.edventurepark.com", "name": "bench", "role": "team", "password": "benchmark"
+            })
+            headers = {"Authorization": f"Bearer {json.loads(data)['access_token']}"}
+            return {
+                "workers": workers,
+                "read_throughput_rps": round(measure_throughput(port, headers, clients, duration), 1),
+                "consistency_reads": rounds * 8,
+                "consistency_misses": check_consistency(port, headers, rounds),
+            }
+        finally:
+            process.terminate()
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single and multi-worker throughput and consistency")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--rounds", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable output")
+    args = parser.parse_args()
+
+    results = [run(1, args.clients, args.duration, args.rounds)]
+    if args.workers > 1:
+        results.append(run(args.workers, args.clients, args.duration, args.rounds))
+
+    if args.json:
+        print(json.dumps({"benchmark": "multiworker", "results": results}))
+    else:
+        for result in results:
+            print(f"{result['workers']} worker(s): {result['read_throughput_rps']} req/s, "
+                  f"{result['consistency_misses']}/{result['consistency_reads']} stale reads")
+
+if __name__ == "__main__":
+    main()
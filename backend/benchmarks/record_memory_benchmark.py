@@ -0,0 +1,116 @@
+"""
+In-memory row size benchmark
+
+Fills the memory store with messages and events twice, once kept as plain
+dicts (how every table used to be stored) and once as the compact records of
+storage/records.py, and reports the heap held per row and the time to read a
+channel's messages back as dicts. Rows go through a JSON round trip first, so
+their strings are separate objects like those of rows parsed from requests.
+
+Usage (from the backend directory):
+    python benchmarks/record_memory_benchmark.py --messages 50000 --events 5000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage.memory_store as memory_store
+from storage.memory_store import MemoryStore
+from storage.records import RECORD_TYPES
+
+SENDERS = [("Sarah", "team"), ("Priya Sharma", "campus_lead"), ("Rahul Verma", "campus_lead"), ("Arjun", "team")]
+WORDS = ("the cohort interview session campus students event workshop schedule confirmed mentor demo day "
+         "registration deadline pitch feedback team venue slides tomorrow next week thanks great update").split()
+
+def _messages(count: int, channels: int):
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=365)
+    for i in range(count):
+        sender, role = rng.choice(SENDERS)
+        day = start + timedelta(days=i * 365 // count)
+        hour, minute = rng.randrange(8, 20), rng.randrange(60)
+        yield json.loads(json.dumps({
+            "id": f"m{i}", "channel_id": str(i % channels + 1), "sender": sender, "role": role,
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randrange(4, 24))).capitalize(),
+            "timestamp": f"{(hour - 1) % 12 + 1:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}",
+            "time": f"{hour:02d}:{minute:02d}", "date": day.isoformat(), "read": rng.random() < 0.8,
+            "starred": rng.random() < 0.02, "file_name": None, "file_type": None, "file_url": None,
+            "reply_to_id": None,
+        }))
+
+def _events(count: int, users: int):
+    rng = random.Random(7)
+    start = date.today()
+    for i in range(count):
+        yield json.loads(json.dumps({
+            "id": f"e{i}", "title": f"Workshop {i}", "description": "Hands-on session", "cohort_id": str(i % 3 + 1),
+            "date": (start + timedelta(days=i % 90)).isoformat(), "time": f"{rng.randrange(8, 20):02d}:00",
+            "created_by": f"user-{rng.randrange(users)}", "created_at": f"2025-10-22T10:{i % 60:02d}:00",
+            "attendees": [f"user-{rng.randrange(users)}" for _ in range(rng.randrange(0, 30))],
+        }))
+
+def _measure(args, record_types: dict) -> dict:
+    memory_store.RECORD_TYPES = record_types
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    store = MemoryStore(seed=False)
+    for row in _messages(args.messages, args.channels):
+        store.insert('messages', row)
+    gc.collect()
+    after_messages = tracemalloc.get_traced_memory()[0]
+    for row in _events(args.events, args.users):
+        store.insert('events', row)
+    gc.collect()
+    after_events = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    samples = []
+    for _ in range(5):
+        started = time.perf_counter()
+        store.list('messages', {"channel_id": "1"})
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "bytes_per_message": round((after_messages - baseline) / max(args.messages, 1)),
+        "bytes_per_event": round((after_events - after_messages) / max(args.events, 1)),
+        "channel_read_ms": round(statistics.median(samples), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure heap per message and event, dict rows vs compact records")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--users", type=int, default=2000, help="Distinct attendee and creator ids")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable output")
+    args = parser.parse_args()
+
+    before = _measure(args, {})
+    after = _measure(args, dict(RECORD_TYPES))
+    memory_store.RECORD_TYPES = RECORD_TYPES
+    result = {
+        "benchmark": "record_memory",
+        "messages": args.messages,
+        "events": args.events,
+        **{f"dict_{key}": value for key, value in before.items()},
+        **{f"record_{key}": value for key, value in after.items()},
+        "message_savings": round(1 - after["bytes_per_message"] / before["bytes_per_message"], 3),
+        "event_savings": round(1 - after["bytes_per_event"] / before["bytes_per_event"], 3) if args.events else None,
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>26}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Message retention benchmark
+
+Fills a store with a year of chat history, archives everything older than the
+hot window and reports the archive compression ratio, the heap held by the
+messages before and after archiving (memory backend) and the latency of
+history pages served from the hot table, from cold (not yet decoded) archive
+blocks and from blocks in the decoded-block cache.
+
+Usage (from the backend directory):
+    python benchmarks/retention_benchmark.py --messages 50000 --hot-days 90
+    python benchmarks/retention_benchmark.py --backend sqlite
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.memory_store import MemoryStore
+from storage.sqlite_store import SQLiteStore
+from utils.retention import archive_messages, block_cache, read_history
+
+SENDERS = [("Sarah", "team"), ("Priya Sharma", "campus_lead"), ("Rahul Verma", "campus_lead"), ("Arjun", "team")]
+WORDS = ("the cohort interview session campus students event workshop schedule confirmed mentor demo day "
+         "registration deadline pitch feedback team venue slides tomorrow next week thanks great update").split()
+
+def _messages(count: int, channels: int, days: int):
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=days)
+    for i in range(count):
+        sender, role = rng.choice(SENDERS)
+        day = start + timedelta(days=i * days // count)
+        hour, minute = rng.randrange(8, 20), rng.randrange(60)
+        yield {
+            "id": f"m{i}", "channel_id": str(i % channels + 1), "sender": sender, "role": role,
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randrange(4, 24))).capitalize(),
+            "timestamp": f"{(hour - 1) % 12 + 1:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}",
+            "time": f"{hour:02d}:{minute:02d}", "date": day.isoformat(), "read": rng.random() < 0.8,
+            "starred": rng.random() < 0.02, "file_name": None, "file_type": None, "file_url": None,
+            "reply_to_id": None,
+        }
+
+def _timed_ms(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure message archive compression and history read latency")
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--days", type=int, default=365, help="Days of history to generate")
+    parser.add_argument("--hot-days", type=int, default=90)
+    parser.add_argument("--block-size", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable output")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    if args.backend == "sqlite":
+        store = SQLiteStore(os.path.join(tempfile.mkdtemp(), "retention.db"), seed=False)
+    else:
+        store = MemoryStore(seed=False)
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for row in _messages(args.messages, args.channels, args.days):
+        store.insert('messages', row)
+    gc.collect()
+    heap_before = tracemalloc.get_traced_memory()[0] - baseline
+
+    cutoff = (date.today() - timedelta(days=args.hot_days)).isoformat()
+    started = time.perf_counter()
+    archived = archive_messages(store, cutoff, args.block_size)
+    archive_seconds = time.perf_counter() - started
+    gc.collect()
+    heap_after = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    blocks = store.list('message_archives', columns=("seq", "channel_id", "message_ids", "data"))
+    archived_bytes = sum(len(block["data"]) for block in blocks)
+    archived_ids = {message_id for block in blocks for message_id in block["message_ids"]}
+    archived_raw = sum(len(json.dumps(row, separators=(",", ":")))
+                       for row in _messages(args.messages, args.channels, args.days) if row["id"] in archived_ids)
+
+    # Page cursors: the newest page is hot, the oldest message of the channel is deep in the archive
+    channel = "1"
+    channel_blocks = [block for block in blocks if block["channel_id"] == channel]
+    oldest = min(channel_blocks, key=lambda block: block["seq"])["message_ids"] if channel_blocks else None
+    deep_cursor = oldest[min(args.page_size, len(oldest) - 1)] if oldest else None
+
+    def cold_page():
+        block_cache.clear()
+        read_history(store, channel, deep_cursor, args.page_size)
+
+    result = {
+        "benchmark": "message_retention",
+        "backend": args.backend,
+        "messages": args.messages,
+        "archived": archived,
+        "blocks": len(blocks),
+        "archive_seconds": round(archive_seconds, 3),
+        "raw_json_bytes": archived_raw,
+        "archived_bytes": archived_bytes,
+        "compression_ratio": round(archived_raw / archived_bytes, 2) if archived_bytes else None,
+        "heap_before_bytes": heap_before if args.backend == "memory" else None,
+        "heap_after_bytes": heap_after if args.backend == "memory" else None,
+        "hot_page_ms": _timed_ms(lambda: read_history(store, channel, None, args.page_size), 50),
+        "cold_page_ms": _timed_ms(cold_page, 20) if deep_cursor else None,
+        "cached_page_ms": _timed_ms(lambda: read_history(store, channel, deep_cursor, args.page_size), 50) if deep_cursor else None,
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>18}: {value}")
+
+if __name__ == "__main__":
+    main()
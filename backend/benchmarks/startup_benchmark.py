@@ -0,0 +1,83 @@
+"""
+Startup benchmark for the EdVenture Park Community API
+
+Starts the API with uvicorn in a fresh process and measures the time until the
+first request to /api/health succeeds (time-to-first-request).
+
+Usage (from the backend directory):
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_startup(timeout: float = 30.0, extra_env: dict = None) -> float:
+    """Return seconds from process spawn to the first successful health check"""
+    port = _free_port()
+    env = {**os.environ, **(extra_env or {})}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/api/health"
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("Server exited before becoming ready")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError(f"Server not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API time-to-first-request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--blocking-init", action="store_true", help="Await database initialization during startup")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable output")
+    args = parser.parse_args()
+
+    extra_env = {"DB_INIT_IN_BACKGROUND": "false"} if args.blocking_init else {}
+    samples = [measure_startup(extra_env=extra_env) for _ in range(args.runs)]
+
+    result = {
+        "benchmark": "startup",
+        "runs": args.runs,
+        "blocking_init": args.blocking_init,
+        "time_to_first_request_ms": {
+            "min": round(min(samples) * 1000, 1),
+            "median": round(statistics.median(samples) * 1000, 1),
+            "max": round(max(samples) * 1000, 1),
+        },
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        ttfr = result["time_to_first_request_ms"]
+        print(f"Time to first request over {args.runs} runs: "
+              f"min {ttfr['min']} ms, median {ttfr['median']} ms, max {ttfr['max']} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict, Generic, TypeVar
 from datetime import datetime
 
 # User Schemas
@@ -45,6 +45,7 @@ class UserProfile(BaseModel):
     skills: Optional[List[str]] = []
     achievements: Optional[List[str]] = []
     joined_date: Optional[str] = None
+    avatar: Optional[str] = None  # Thumbnails at /api/profile/avatars/{avatar}/{size}, set by uploading one
 
 # Cohort Schemas
 class CohortBase(BaseModel):
@@ -68,6 +69,25 @@ class Cohort(CohortBase):
     class Config:
         from_attributes = True
 
+class ProgressStats(BaseModel):
+    min: int
+    max: int
+    last: int
+
+class ProgressBucket(BaseModel):
+    start: str
+    samples: int
+    progress: ProgressStats
+    completed_milestones: ProgressStats
+    participants: ProgressStats
+
+class CohortProgressHistory(BaseModel):
+    cohort_id: str
+    start: str
+    end: str
+    bucket_seconds: int
+    buckets: List[ProgressBucket]  # Buckets without samples are left out
+
 # Campus Lead Schemas
 class CampusLeadBase(BaseModel):
     name: str
@@ -93,6 +113,8 @@ class CampusLead(CampusLeadBase):
 class ChannelBase(BaseModel):
     name: str
     type: str  # 'team', 'campus_leads', 'general'
+    members_only: bool = False  # Only team members and added members see it
+    cohort_id: Optional[str] = None  # Cohort the channel is for, its reminders are posted here
 
 class ChannelCreate(ChannelBase):
     pass
@@ -122,6 +144,14 @@ class MessageCreate(MessageBase):
     file_url: Optional[str] = None
     reply_to_id: Optional[str] = None
 
+class MessagePreview(BaseModel):
+    """The quoted parent of a reply"""
+    id: str
+    sender: Optional[str] = None
+    content: Optional[str] = None  # Truncated
+    file_name: Optional[str] = None
+    deleted: bool = False
+
 class Message(MessageBase):
     id: str
     timestamp: str
@@ -132,11 +162,26 @@ class Message(MessageBase):
     file_name: Optional[str] = None
     file_type: Optional[str] = None
     file_url: Optional[str] = None
-    reply_to: Optional[dict] = None
+    reply_to_id: Optional[str] = None
+    reply_to: Optional[MessagePreview] = None
     
     class Config:
         from_attributes = True
 
+class PresenceUser(BaseModel):
+    user_id: str
+    email: str
+
+class ChannelPresence(BaseModel):
+    online: List[PresenceUser]
+    typing: List[PresenceUser]
+
+class ChannelMember(BaseModel):
+    user_id: str
+    name: Optional[str] = None
+    email: Optional[str] = None
+    role: Optional[str] = None
+
 # Event Schemas
 class EventBase(BaseModel):
     title: str
@@ -160,9 +205,11 @@ class Event(EventBase):
 # Stats Schemas
 class StatBase(BaseModel):
     label: str
-    value: str
+    value: str  # Display value, `number` formatted into `value_format`
     icon: str
     color: str
+    number: Optional[float] = None  # None for stats without a number
+    value_format: Optional[str] = None  # e.g. "{}%" or "{} leads"
 
 class Stat(StatBase):
     id: str
@@ -171,10 +218,63 @@ class Stat(StatBase):
     class Config:
         from_attributes = True
 
+class StatUpdateItem(StatBase):
+    id: Optional[str] = None  # Existing stat id, omitted for new tiles
+    value: Optional[str] = None  # Derived from number and value_format when omitted
+
 class StatsUpdate(BaseModel):
-    stats: List[StatBase]
+    stats: List[StatUpdateItem]
+
+class StatTrend(BaseModel):
+    id: str
+    label: str
+    value: str
+    values: List[Optional[float]]  # Last value of each period, oldest first, None without a snapshot
+    delta: Optional[float] = None  # Current period minus the previous one
+    delta_percent: Optional[float] = None
+    slope: Optional[float] = None  # Least squares change per period
+
+class StatTrends(BaseModel):
+    category: str
+    period: str
+    periods: List[str]  # Start date of each period (UTC)
+    stats: List[StatTrend]
+
+# Dashboard Schemas
+SectionData = TypeVar("SectionData")
+
+class DashboardSection(BaseModel, Generic[SectionData]):
+    version: str
+    data: Optional[SectionData] = None  # None when the client already has this version
+
+class Dashboard(BaseModel):
+    profile: DashboardSection[UserProfile]
+    cohorts: DashboardSection[List[Cohort]]
+    cohort_stats: DashboardSection[List[Stat]]
+    campus_lead_stats: DashboardSection[List[Stat]]
+    campus_leads: DashboardSection[List[CampusLead]]
+    channels: DashboardSection[List[Channel]]
+    events: DashboardSection[List[Event]]
+
+# Sync Schemas
+class SyncChange(BaseModel):
+    version: int
+    entity: str  # 'cohorts', 'campus_leads', 'events' or 'channels'
+    id: str
+    operation: str  # 'upsert' or 'delete'
+    data: Optional[dict] = None  # The row after the change, None for deletes
+
+class SyncResponse(BaseModel):
+    version: int  # Pass back as ?since= on the next sync
+    snapshot: Optional[Dict[str, List[dict]]] = None  # Full collections, replaces local state when set
+    changes: List[SyncChange] = []
+    has_more: bool = False
 
 # Token Schema
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -1,21 +1,25 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from datetime import timedelta
-from models.schemas import UserCreate, UserLogin, Token, User
-from utils.auth import get_password_hash, verify_password, create_access_token, get_current_user
-from utils.database import get_db
+from models.schemas import UserCreate, UserLogin, Token, User, PasswordChange
+from utils.auth import get_password_hash, verify_password, run_password_hashing, create_access_token, get_current_user
+from utils.database import get_store
 from utils.config import settings
+from utils.rate_limit import enforce_rate_limit, client_ip
+from utils.revocation import revocations
 import uuid
 from datetime import datetime
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
-# In-memory storage for development (replace with Supabase)
-users_db = {}
-
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate):
+async def register(user: UserCreate, request: Request):
+    # Limit before hashing, bcrypt is the expensive part
+    enforce_rate_limit("register_ip", client_ip(request))
+    
+    store = get_store()
+    
     # Check if user already exists
-    if any(u["email"] == user.email for u in users_db.values()):
+    if store.find_one('users', {"email": user.email}) is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -23,7 +27,7 @@ async def register(user: UserCreate):
     
     # Create new user
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_password_hashing(get_password_hash, user.password)
     
     user_data = {
         "id": user_id,
@@ -41,11 +45,11 @@ async def register(user: UserCreate):
         "joined_date": datetime.now().isoformat()
     }
     
-    users_db[user_id] = user_data
+    store.insert('users', user_data)
     
     # Create access token
     access_token = create_access_token(
-        data={"sub": user.email, "user_id": user_id, "role": user.role}
+        data={"sub": user.email, "user_id": user_id, "role": user.role, "ver": 0}
     )
     
     user_response = User(**{k: v for k, v in user_data.items() if k != "password_hash"})
@@ -53,15 +57,15 @@ async def register(user: UserCreate):
     return Token(access_token=access_token, token_type="bearer", user=user_response)
 
 @router.post("/login", response_model=Token)
-async def login(user_login: UserLogin):
+async def login(user_login: UserLogin, request: Request):
+    # Limit per client and per account before checking the password with bcrypt
+    enforce_rate_limit("login_ip", client_ip(request))
+    enforce_rate_limit("login_user", user_login.email.lower())
+    
     # Find user by email
-    user_data = None
-    for user in users_db.values():
-        if user["email"] == user_login.email:
-            user_data = user
-            break
+    user_data = get_store().find_one('users', {"email": user_login.email})
     
-    if not user_data or not verify_password(user_login.password, user_data["password_hash"]):
+    if not user_data or not await run_password_hashing(verify_password, user_login.password, user_data["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -70,7 +74,8 @@ async def login(user_login: UserLogin):
     
     # Create access token
     access_token = create_access_token(
-        data={"sub": user_data["email"], "user_id": user_data["id"], "role": user_data["role"]}
+        data={"sub": user_data["email"], "user_id": user_data["id"], "role": user_data["role"],
+              "ver": user_data.get("token_version") or 0}
     )
     
     user_response = User(**{k: v for k, v in user_data.items() if k != "password_hash"})
@@ -80,12 +85,48 @@ async def login(user_login: UserLogin):
 @router.get("/me", response_model=User)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     user_id = current_user.get("user_id")
+    user_data = get_store().get('users', user_id)
     
-    if user_id not in users_db:
+    if user_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    user_data = users_db[user_id]
-    return User(**{k: v for k, v in user_data.items() if k != "password_hash"})
\ No newline at end of file
+    return User(**{k: v for k, v in user_data.items() if k != "password_hash"})
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(current_user: dict = Depends(get_current_user)):
+    if current_user.get("jti"):
+        revocations.revoke_token(current_user["jti"], current_user.get("user_id"), current_user["exp"])
+    else:
+        # Tokens from before jti was added can only be revoked all at once
+        revocations.revoke_user(current_user.get("user_id"))
+
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(current_user: dict = Depends(get_current_user)):
+    revocations.revoke_user(current_user.get("user_id"))
+
+@router.put("/password", response_model=Token)
+async def change_password(change: PasswordChange, current_user: dict = Depends(get_current_user)):
+    enforce_rate_limit("login_user", current_user.get("sub", "").lower())
+    
+    store = get_store()
+    user_data = store.get('users', current_user.get("user_id"))
+    if user_data is None or not await run_password_hashing(verify_password, change.current_password, user_data["password_hash"]):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Current password is incorrect"
+        )
+    
+    password_hash = await run_password_hashing(get_password_hash, change.new_password)
+    user_data = store.update('users', user_data["id"], {"password_hash": password_hash})
+    # Every other session ends, the caller continues with a new token
+    version = revocations.revoke_user(user_data["id"])
+    access_token = create_access_token(
+        data={"sub": user_data["email"], "user_id": user_data["id"], "role": user_data["role"], "ver": version}
+    )
+    
+    user_response = User(**{k: v for k, v in user_data.items() if k != "password_hash"})
+    
+    return Token(access_token=access_token, token_type="bearer", user=user_response)
@@ -1,90 +1,44 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Response
+from typing import List, Optional
 from models.schemas import CampusLead, CampusLeadCreate
 from utils.auth import get_current_user
+from utils.revocation import revocations
+from utils.database import get_store
+from utils.fields import parse_fields, store_columns, sparse_response
+from utils.idempotency import idempotency
+from utils.membership import directory
 import uuid
 
 router = APIRouter(prefix="/api/campus-leads", tags=["Campus Leads"])
 
-# In-memory storage for development
-campus_leads_db = {
-    "1": {
-        "id": "1",
-        "user_id": None,
-        "name": "Priya Sharma",
-        "college": "MS Degree College",
-        "location": "Hyderabad, Telangana",
-        "status": "Active",
-        "events_organized": 12,
-        "students_reached": 245,
-        "last_activity": "2 hours ago",
-        "performance": "Excellent"
-    },
-    "2": {
-        "id": "2",
-        "user_id": None,
-        "name": "Rahul Verma",
-        "college": "IIT Bombay",
-        "location": "Mumbai, Maharashtra",
-        "status": "Active",
-        "events_organized": 18,
-        "students_reached": 320,
-        "last_activity": "5 hours ago",
-        "performance": "Excellent"
-    },
-    "3": {
-        "id": "3",
-        "user_id": None,
-        "name": "Ananya Reddy",
-        "college": "NIT Warangal",
-        "location": "Warangal, Telangana",
-        "status": "Active",
-        "events_organized": 9,
-        "students_reached": 180,
-        "last_activity": "1 day ago",
-        "performance": "Good"
-    },
-    "4": {
-        "id": "4",
-        "user_id": None,
-        "name": "Karthik Menon",
-        "college": "VIT Chennai",
-        "location": "Chennai, Tamil Nadu",
-        "status": "Active",
-        "events_organized": 15,
-        "students_reached": 290,
-        "last_activity": "3 hours ago",
-        "performance": "Excellent"
-    },
-    "5": {
-        "id": "5",
-        "user_id": None,
-        "name": "Sneha Patel",
-        "college": "BITS Pilani",
-        "location": "Pilani, Rajasthan",
-        "status": "Inactive",
-        "events_organized": 6,
-        "students_reached": 125,
-        "last_activity": "1 week ago",
-        "performance": "Average"
-    }
-}
-
 @router.get("", response_model=List[CampusLead])
-async def get_campus_leads(current_user: dict = Depends(get_current_user)):
-    return list(campus_leads_db.values())
+async def get_campus_leads(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, CampusLead)
+    leads = get_store().list('campus_leads', columns=store_columns('campus_leads', requested))
+    if requested:
+        return sparse_response(CampusLead, requested, leads)
+    return leads
 
 @router.get("/{lead_id}", response_model=CampusLead)
-async def get_campus_lead(lead_id: str, current_user: dict = Depends(get_current_user)):
-    if lead_id not in campus_leads_db:
+async def get_campus_lead(lead_id: str, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, CampusLead)
+    lead_data = get_store().get('campus_leads', lead_id, store_columns('campus_leads', requested))
+    if lead_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Campus lead not found"
         )
-    return campus_leads_db[lead_id]
+    if requested:
+        return sparse_response(CampusLead, requested, lead_data, many=False)
+    return lead_data
 
 @router.post("", response_model=CampusLead, status_code=status.HTTP_201_CREATED)
-async def create_campus_lead(lead: CampusLeadCreate, current_user: dict = Depends(get_current_user)):
+async def create_campus_lead(
+    lead: CampusLeadCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
     # Only team members can create campus leads
     if current_user.get("role") != "team":
         raise HTTPException(
@@ -92,30 +46,32 @@ async def create_campus_lead(lead: CampusLeadCreate, current_user: dict = Depend
             detail="Only team members can create campus leads"
         )
     
-    lead_id = str(uuid.uuid4())
-    lead_data = {
-        "id": lead_id,
-        **lead.model_dump()
-    }
+    async def create():
+        lead_id = str(uuid.uuid4())
+        lead_data = {
+            "id": lead_id,
+            **lead.model_dump()
+        }
+        return get_store().insert('campus_leads', lead_data)
     
-    campus_leads_db[lead_id] = lead_data
-    return lead_data
+    # Retries with the same Idempotency-Key get the first response instead of a duplicate lead
+    return await idempotency.run(idempotency_key, current_user, "create_campus_lead", lead.model_dump(), response, create)
 
 @router.put("/{lead_id}", response_model=CampusLead)
 async def update_campus_lead(lead_id: str, lead: CampusLeadCreate, current_user: dict = Depends(get_current_user)):
-    if lead_id not in campus_leads_db:
+    lead_data = get_store().update('campus_leads', lead_id, lead.model_dump())
+    if lead_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Campus lead not found"
         )
-    
-    lead_data = campus_leads_db[lead_id]
-    lead_data.update(lead.model_dump())
     return lead_data
 
 @router.delete("/{lead_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_campus_lead(lead_id: str, current_user: dict = Depends(get_current_user)):
-    if lead_id not in campus_leads_db:
+    store = get_store()
+    lead = store.get('campus_leads', lead_id, columns=("id", "user_id"))
+    if lead is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Campus lead not found"
@@ -128,4 +84,8 @@ async def delete_campus_lead(lead_id: str, current_user: dict = Depends(get_curr
             detail="Only team members can delete campus leads"
         )
     
-    del campus_leads_db[lead_id]
\ No newline at end of file
+    store.delete('campus_leads', lead_id)
+    if lead.get("user_id"):
+        # Sign the removed lead out everywhere and take them out of their channels
+        revocations.revoke_user(lead["user_id"])
+        directory.remove_user(lead["user_id"])
\ No newline at end of file
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
-from models.schemas import Cohort, CohortCreate
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Response
+from typing import List, Optional
+from models.schemas import Cohort, CohortCreate, CohortProgressHistory
 from utils.auth import get_current_user
-from utils.database import get_db
+from utils.database import get_store
+from utils.singleflight import singleflight
+from utils.fields import parse_fields, store_columns, sparse_response
+from utils.idempotency import idempotency
+from utils.jobs import enqueue
+from utils.progress_history import progress_history
+from utils.reminders import reminders
 import uuid
 from datetime import datetime
 import logging
@@ -11,106 +17,72 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/cohorts", tags=["Cohorts"])
 
-# Fallback in-memory storage for development when Supabase is not available
-cohorts_db = {
-    "1": {
-        "id": "1",
-        "name": "EVP A25",
-        "program": "Pre-Incubation",
-        "status": "Active",
-        "start_date": "2025-01-15",
-        "end_date": "2025-04-30",
-        "participants": 45,
-        "progress": 65,
-        "milestones": ["Ideation", "Prototyping", "Market Research", "Pitch Preparation"],
-        "completed_milestones": 2,
-        "created_at": datetime.now().isoformat()
-    },
-    "2": {
-        "id": "2",
-        "name": "EdAstra Batch 6",
-        "program": "Innovation Challenge",
-        "status": "Active",
-        "start_date": "2025-02-01",
-        "end_date": "2025-05-15",
-        "participants": 32,
-        "progress": 40,
-        "milestones": ["Team Formation", "Problem Identification", "Solution Design", "Demo Day"],
-        "completed_milestones": 1,
-        "created_at": datetime.now().isoformat()
-    },
-    "3": {
-        "id": "3",
-        "name": "Tentative Sprint",
-        "program": "Advanced Incubation",
-        "status": "Planning",
-        "start_date": "2025-03-01",
-        "end_date": "2025-06-30",
-        "participants": 28,
-        "progress": 15,
-        "milestones": ["Onboarding", "Mentor Matching", "Development", "Launch"],
-        "completed_milestones": 0,
-        "created_at": datetime.now().isoformat()
-    }
-}
-
 @router.get("", response_model=List[Cohort])
-async def get_cohorts(current_user: dict = Depends(get_current_user)):
-    try:
-        db = get_db()
-        if db is not None:
-            # Fetch from Supabase
-            response = db.table('cohorts').select('*').execute()
-            if response.data:
-                return response.data
-            else:
-                logger.info("No cohorts found in database")
-                return []
-        else:
-            # Fallback to in-memory
-            logger.warning("Using in-memory storage for cohorts")
-            return list(cohorts_db.values())
-    except Exception as e:
-        logger.error(f"Error fetching cohorts: {e}")
-        # Fallback to in-memory on error
-        return list(cohorts_db.values())
+async def get_cohorts(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, Cohort)
+    # Identical concurrent reads share one backend call, keyed by role and fields
+    cohorts = await singleflight.do(
+        "cohorts", (current_user.get("role"), requested),
+        get_store().list, 'cohorts', None, None, store_columns('cohorts', requested))
+    if requested:
+        return sparse_response(Cohort, requested, cohorts)
+    return cohorts
 
 @router.get("/{cohort_id}", response_model=Cohort)
-async def get_cohort(cohort_id: str, current_user: dict = Depends(get_current_user)):
+async def get_cohort(cohort_id: str, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, Cohort)
+    cohort_data = get_store().get('cohorts', cohort_id, store_columns('cohorts', requested))
+    if cohort_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cohort not found"
+        )
+    if requested:
+        return sparse_response(Cohort, requested, cohort_data, many=False)
+    return cohort_data
+
+def _timestamp(value: str, name: str) -> int:
     try:
-        db = get_db()
-        if db is not None:
-            # Fetch from Supabase
-            response = db.table('cohorts').select('*').eq('id', cohort_id).execute()
-            if response.data and len(response.data) > 0:
-                return response.data[0]
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Cohort not found"
-                )
-        else:
-            # Fallback to in-memory
-            if cohort_id not in cohorts_db:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Cohort not found"
-                )
-            return cohorts_db[cohort_id]
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error fetching cohort: {e}")
-        # Fallback to in-memory on error
-        if cohort_id not in cohorts_db:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cohort not found"
-            )
-        return cohorts_db[cohort_id]
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{name} must be an ISO date or date-time"
+        )
+
+@router.get("/{cohort_id}/progress", response_model=CohortProgressHistory)
+async def get_cohort_progress(
+    cohort_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    buckets: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Progress, completed milestones and participants over time, min/max/last
+    per bucket. The range defaults to the first recorded change until now.
+    """
+    if get_store().get('cohorts', cohort_id, columns=("id",)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cohort not found"
+        )
+    start_at = _timestamp(start, "start") if start else None
+    end_at = _timestamp(end, "end") if end else int(datetime.now().timestamp())
+    if start_at is not None and start_at > end_at:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+    return progress_history.query(cohort_id, start_at, end_at, buckets)
 
 @router.post("", response_model=Cohort, status_code=status.HTTP_201_CREATED)
-async def create_cohort(cohort: CohortCreate, current_user: dict = Depends(get_current_user)):
+async def create_cohort(
+    cohort: CohortCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
     # Only team members can create cohorts
     if current_user.get("role") != "team":
         raise HTTPException(
@@ -118,31 +90,20 @@ async def create_cohort(cohort: CohortCreate, current_user: dict = Depends(get_c
             detail="Only team members can create cohorts"
         )
     
-    cohort_id = str(uuid.uuid4())
-    cohort_data = {
-        "id": cohort_id,
-        **cohort.model_dump(),
-        "created_at": datetime.now().isoformat()
-    }
-    
-    try:
-        db = get_db()
-        if db is not None:
-            # Insert into Supabase
-            response = db.table('cohorts').insert(cohort_data).execute()
-            if response.data and len(response.data) > 0:
-                return response.data[0]
-            return cohort_data
-        else:
-            # Fallback to in-memory
-            logger.warning("Using in-memory storage for cohort creation")
-            cohorts_db[cohort_id] = cohort_data
-            return cohort_data
-    except Exception as e:
-        logger.error(f"Error creating cohort: {e}")
-        # Fallback to in-memory on error
-        cohorts_db[cohort_id] = cohort_data
+    async def create():
+        cohort_id = str(uuid.uuid4())
+        cohort_data = {
+            "id": cohort_id,
+            **cohort.model_dump(),
+            "created_at": datetime.now().isoformat()
+        }
+        cohort_data = get_store().insert('cohorts', cohort_data)
+        # The reminder heap is this worker's memory, only the stored sample is a job
+        reminders.schedule_cohort(cohort_data)
+        await enqueue("record_cohort_progress", {"cohort_id": cohort_id})
         return cohort_data
+    
+    return await idempotency.run(idempotency_key, current_user, "create_cohort", cohort.model_dump(), response, create)
 
 @router.put("/{cohort_id}", response_model=Cohort)
 async def update_cohort(cohort_id: str, cohort: CohortCreate, current_user: dict = Depends(get_current_user)):
@@ -153,46 +114,16 @@ async def update_cohort(cohort_id: str, cohort: CohortCreate, current_user: dict
             detail="Only team members can update cohorts"
         )
     
-    try:
-        db = get_db()
-        if db is not None:
-            # Check if exists in Supabase
-            check_response = db.table('cohorts').select('*').eq('id', cohort_id).execute()
-            if not check_response.data:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Cohort not found"
-                )
-            
-            # Update in Supabase
-            update_data = cohort.model_dump()
-            response = db.table('cohorts').update(update_data).eq('id', cohort_id).execute()
-            if response.data and len(response.data) > 0:
-                return response.data[0]
-            return {**update_data, "id": cohort_id}
-        else:
-            # Fallback to in-memory
-            if cohort_id not in cohorts_db:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Cohort not found"
-                )
-            cohort_data = cohorts_db[cohort_id]
-            cohort_data.update(cohort.model_dump())
-            return cohort_data
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error updating cohort: {e}")
-        # Fallback to in-memory on error
-        if cohort_id not in cohorts_db:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cohort not found"
-            )
-        cohort_data = cohorts_db[cohort_id]
-        cohort_data.update(cohort.model_dump())
-        return cohort_data
+    cohort_data = get_store().update('cohorts', cohort_id, cohort.model_dump())
+    if cohort_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cohort not found"
+        )
+    # Moves the start and end reminders if the dates changed
+    reminders.schedule_cohort(cohort_data)
+    await enqueue("record_cohort_progress", {"cohort_id": cohort_id})
+    return cohort_data
 
 @router.delete("/{cohort_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_cohort(cohort_id: str, current_user: dict = Depends(get_current_user)):
@@ -203,35 +134,10 @@ async def delete_cohort(cohort_id: str, current_user: dict = Depends(get_current
             detail="Only team members can delete cohorts"
         )
     
-    try:
-        db = get_db()
-        if db is not None:
-            # Check if exists in Supabase
-            check_response = db.table('cohorts').select('*').eq('id', cohort_id).execute()
-            if not check_response.data:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Cohort not found"
-                )
-            
-            # Delete from Supabase
-            db.table('cohorts').delete().eq('id', cohort_id).execute()
-        else:
-            # Fallback to in-memory
-            if cohort_id not in cohorts_db:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Cohort not found"
-                )
-            del cohorts_db[cohort_id]
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error deleting cohort: {e}")
-        # Fallback to in-memory on error
-        if cohort_id not in cohorts_db:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cohort not found"
-            )
-        del cohorts_db[cohort_id]
\ No newline at end of file
+    if not get_store().delete('cohorts', cohort_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cohort not found"
+        )
+    reminders.cancel_cohort(cohort_id)
+    progress_history.drop(cohort_id)
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Optional
+from models.schemas import Dashboard
+from routes.messages import user_channels, with_presence
+from utils.auth import get_current_user
+from utils.database import get_store
+from utils.singleflight import singleflight
+import asyncio
+import hashlib
+import json
+
+router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
+
+def _section_version(data) -> str:
+    """Content hash of a section, stable across workers and backends"""
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=8).hexdigest()
+
+def _parse_versions(versions: Optional[str]) -> dict:
+    """Parse "section:version,section:version" sent back by the client"""
+    known = {}
+    for item in (versions or "").split(","):
+        name, _, version = item.partition(":")
+        if name and version:
+            known[name.strip()] = version.strip()
+    return known
+
+async def _profile(user: dict):
+    user_data = await asyncio.to_thread(get_store().get, 'users', user.get("user_id"))
+    if user_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return {k: v for k, v in user_data.items() if k != "password_hash"}
+
+async def _cohorts(user: dict):
+    # Same keys as GET /api/cohorts and GET /api/stats/{category}, so these calls coalesce with them
+    return await singleflight.do("cohorts", (user.get("role"), None), get_store().list, 'cohorts')
+
+def _stats(category: str):
+    async def load(user: dict):
+        return await singleflight.do(
+            "stats", (category, user.get("role"), None), get_store().list, 'stats', {"category": category})
+    return load
+
+async def _campus_leads(user: dict):
+    return await asyncio.to_thread(get_store().list, 'campus_leads')
+
+async def _channels(user: dict):
+    channels = await asyncio.to_thread(user_channels, get_store(), user)
+    return with_presence(channels, user.get("user_id"))
+
+async def _events(user: dict):
+    return await asyncio.to_thread(get_store().list, 'events')
+
+# Section name -> loader, each one is what the matching standalone endpoint returns
+SECTIONS = {
+    "profile": _profile,
+    "cohorts": _cohorts,
+    "cohort_stats": _stats("cohort"),
+    "campus_lead_stats": _stats("campus_lead"),
+    "campus_leads": _campus_leads,
+    "channels": _channels,
+    "events": _events,
+}
+
+@router.get("", response_model=Dashboard)
+async def get_dashboard(versions: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """
+    Everything the dashboards need in one round trip. Sections are loaded
+    concurrently; pass back the versions from the previous response as
+    ?versions=cohorts:<version>,events:<version> and unchanged sections are
+    returned with data set to null.
+    """
+    known = _parse_versions(versions)
+    results = await asyncio.gather(*(load(current_user) for load in SECTIONS.values()))
+
+    dashboard = {}
+    for name, data in zip(SECTIONS, results):
+        version = _section_version(data)
+        section = {"version": version}
+        if known.get(name) != version:
+            section["data"] = data
+        dashboard[name] = section
+    return dashboard
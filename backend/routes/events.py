@@ -1,75 +1,93 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Response
+from typing import List, Optional
 from models.schemas import Event, EventCreate
 from utils.auth import get_current_user
+from utils.database import get_store
+from utils.fields import parse_fields, store_columns, sparse_response
+from utils.idempotency import idempotency
+from utils.reminders import reminders
 import uuid
 from datetime import datetime
 
 router = APIRouter(prefix="/api/events", tags=["Events"])
 
-# In-memory storage for development
-events_db = {}
-
 @router.get("", response_model=List[Event])
-async def get_events(current_user: dict = Depends(get_current_user)):
-    return list(events_db.values())
+async def get_events(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, Event)
+    events = get_store().list('events', columns=store_columns('events', requested))
+    if requested:
+        return sparse_response(Event, requested, events)
+    return events
 
 @router.get("/{event_id}", response_model=Event)
-async def get_event(event_id: str, current_user: dict = Depends(get_current_user)):
-    if event_id not in events_db:
+async def get_event(event_id: str, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, Event)
+    event_data = get_store().get('events', event_id, store_columns('events', requested))
+    if event_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Event not found"
         )
-    return events_db[event_id]
+    if requested:
+        return sparse_response(Event, requested, event_data, many=False)
+    return event_data
 
 @router.post("", response_model=Event, status_code=status.HTTP_201_CREATED)
-async def create_event(event: EventCreate, current_user: dict = Depends(get_current_user)):
-    event_id = str(uuid.uuid4())
-    event_data = {
-        "id": event_id,
-        **event.model_dump(),
-        "attendees": [],
-        "created_at": datetime.now().isoformat()
-    }
+async def create_event(
+    event: EventCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    async def create():
+        event_id = str(uuid.uuid4())
+        event_data = {
+            "id": event_id,
+            **event.model_dump(),
+            "attendees": [],
+            "created_at": datetime.now().isoformat()
+        }
+        event_data = get_store().insert('events', event_data)
+        # Inline on purpose: only pushes onto this worker's in-memory reminder heap
+        reminders.schedule_event(event_data)
+        return event_data
     
-    events_db[event_id] = event_data
-    return event_data
+    return await idempotency.run(idempotency_key, current_user, "create_event", event.model_dump(), response, create)
 
 @router.put("/{event_id}", response_model=Event)
 async def update_event(event_id: str, event: EventCreate, current_user: dict = Depends(get_current_user)):
-    if event_id not in events_db:
+    event_data = get_store().update('events', event_id, event.model_dump())
+    if event_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Event not found"
         )
-    
-    event_data = events_db[event_id]
-    event_data.update(event.model_dump())
+    # Moves the reminder if the date or time changed
+    reminders.schedule_event(event_data)
     return event_data
 
 @router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_event(event_id: str, current_user: dict = Depends(get_current_user)):
-    if event_id not in events_db:
+    if not get_store().delete('events', event_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Event not found"
         )
-    
-    del events_db[event_id]
+    reminders.cancel_event(event_id)
 
 @router.post("/{event_id}/attend", response_model=Event)
 async def attend_event(event_id: str, current_user: dict = Depends(get_current_user)):
-    if event_id not in events_db:
+    store = get_store()
+    event = store.get('events', event_id)
+    if event is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Event not found"
         )
     
-    event = events_db[event_id]
     user_id = current_user.get("user_id")
     
     if user_id not in event["attendees"]:
-        event["attendees"].append(user_id)
+        event = store.update('events', event_id, {"attendees": event["attendees"] + [user_id]})
     
     return event
\ No newline at end of file
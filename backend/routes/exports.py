@@ -0,0 +1,78 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import Iterator, Optional
+from utils.auth import get_current_user
+from utils.database import get_store
+from utils.exports import transcript_chunks, cohort_report_chunks, gzip_chunks
+from datetime import date
+
+router = APIRouter(prefix="/api/exports", tags=["Exports"])
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+def _require_team(user: dict):
+    if user.get("role") != "team":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only team members can export data"
+        )
+
+def _date_range(start: Optional[str], end: Optional[str]):
+    """Validated YYYY-MM-DD bounds, inclusive"""
+    try:
+        start = date.fromisoformat(start).isoformat() if start else None
+        end = date.fromisoformat(end).isoformat() if end else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start and end must be dates (YYYY-MM-DD)"
+        )
+    if start and end and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+    return start, end
+
+def _stream(chunks: Iterator[bytes], filename: str, format: str, gzip: bool) -> StreamingResponse:
+    # A sync generator, Starlette iterates it in the threadpool so store reads never block the event loop
+    if gzip:
+        chunks, filename = gzip_chunks(chunks), filename + ".gz"
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/channels/{channel_id}")
+async def export_channel(
+    channel_id: str,
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """A channel's transcript oldest first, archived messages included, streamed as CSV or JSONL"""
+    _require_team(current_user)
+    start, end = _date_range(start, end)
+    store = get_store()
+    if store.get('channels', channel_id, columns=("id",)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Channel not found"
+        )
+    return _stream(transcript_chunks(store, channel_id, format, start, end),
+                   f"channel-{channel_id}.{format}", format, gzip)
+
+@router.get("/cohorts")
+async def export_cohorts(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Cohort summary report as CSV, limited to cohorts running at some point between start and end"""
+    _require_team(current_user)
+    start, end = _date_range(start, end)
+    return _stream(cohort_report_chunks(get_store(), start, end), "cohorts.csv", "csv", gzip)
@@ -1,132 +1,94 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
-from models.schemas import Message, MessageCreate, Channel, ChannelCreate
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Request, Response
+from typing import List, Optional
+from models.schemas import Message, MessageCreate, Channel, ChannelCreate, ChannelPresence, ChannelMember
 from utils.auth import get_current_user
+from utils.database import get_store
+from utils.fields import parse_fields, store_columns, sparse_response
+from utils.idempotency import idempotency
+from utils.jobs import job, enqueue
+from utils.membership import directory
+from utils.presence import presence
+from utils.rate_limit import enforce_rate_limit, client_ip
+from utils.retention import read_history, update_archived, find_archived, archived_replies
+import asyncio
 import uuid
 from datetime import datetime
 
 router = APIRouter(prefix="/api/messages", tags=["Messages"])
 
-# In-memory storage for development
-channels_db = {
-    "1": {
-        "id": "1",
-        "name": "Team Announcements",
-        "type": "team",
-        "unread": 3,
-        "last_message": "New cohort starting next month",
-        "last_message_time": "10:30 AM",
-        "online": True,
-        "typing": False,
-        "created_at": datetime.now().isoformat()
-    },
-    "2": {
-        "id": "2",
-        "name": "Campus Leads - Telangana",
-        "type": "campus_leads",
-        "unread": 5,
-        "last_message": "Info session scheduled",
-        "last_message_time": "11:45 AM",
-        "online": True,
-        "typing": False,
-        "created_at": datetime.now().isoformat()
-    },
-    "3": {
-        "id": "3",
-        "name": "Campus Leads - Maharashtra",
-        "type": "campus_leads",
-        "unread": 0,
-        "last_message": "Great turnout today!",
-        "last_message_time": "Yesterday",
-        "online": False,
-        "typing": False,
-        "created_at": datetime.now().isoformat()
-    },
-    "4": {
-        "id": "4",
-        "name": "EVP A25 Coordinators",
-        "type": "general",
-        "unread": 2,
-        "last_message": "Interview dates confirmed",
-        "last_message_time": "9:15 AM",
-        "online": True,
-        "typing": False,
-        "created_at": datetime.now().isoformat()
-    },
-    "5": {
-        "id": "5",
-        "name": "EdAstra Team",
-        "type": "team",
-        "unread": 1,
-        "last_message": "Workshop materials ready",
-        "last_message_time": "2 days ago",
-        "online": False,
-        "typing": False,
-        "created_at": datetime.now().isoformat()
-    }
-}
-
-messages_db = {
-    "2": [  # Channel 2 messages
-        {
-            "id": "1",
-            "channel_id": "2",
-            "sender": "Sarah",
-            "role": "team",
-            "content": "Hi everyone! We have confirmed the dates for the EVP A25 preliminary interviews.",
-            "timestamp": "10:30 AM",
-            "time": "10:30",
-            "date": "2025-10-22",
-            "read": True,
-            "starred": False,
-            "file_name": None,
-            "file_type": None,
-            "file_url": None,
-            "reply_to": None
-        },
-        {
-            "id": "2",
-            "channel_id": "2",
-            "sender": "Priya",
-            "role": "campus_lead",
-            "content": "That's great! We have around 30 students interested from our campus.",
-            "timestamp": "10:35 AM",
-            "time": "10:35",
-            "date": "2025-10-22",
-            "read": True,
-            "starred": False,
-            "file_name": None,
-            "file_type": None,
-            "file_url": None,
-            "reply_to": None
-        },
-        {
-            "id": "3",
-            "channel_id": "2",
-            "sender": "Rahul",
-            "role": "campus_lead",
-            "content": "We organized an info session yesterday. Got excellent response with 45+ registrations!",
-            "timestamp": "10:42 AM",
-            "time": "10:42",
-            "date": "2025-10-22",
-            "read": True,
-            "starred": True,
-            "file_name": None,
-            "file_type": None,
-            "file_url": None,
-            "reply_to": None
-        }
-    ]
-}
+# Newest message id per channel, so a retried preview update never overwrites a newer one
+_latest_message = {}
+
+# Not durable: the preview is cosmetic and the next message in the channel rewrites it
+@job("update_channel_preview", durable=False)
+def update_channel_preview(payload: dict):
+    if _latest_message.get(payload["channel_id"]) != payload["message_id"]:
+        return
+    get_store().update('channels', payload["channel_id"], {
+        "last_message": payload["content"],
+        "last_message_time": payload["time"]
+    })
+
+# Longest quoted text embedded in a reply preview
+PREVIEW_LENGTH = 120
+PREVIEW_COLUMNS = ("id", "channel_id", "sender", "content", "file_name")
+
+def _preview(parent_id: str, parent: Optional[dict]) -> dict:
+    if parent is None:
+        return {"id": parent_id, "deleted": True}
+    content = parent.get("content") or ""
+    if len(content) > PREVIEW_LENGTH:
+        content = content[:PREVIEW_LENGTH - 1] + "…"
+    return {"id": parent_id, "sender": parent.get("sender"), "content": content, "file_name": parent.get("file_name")}
+
+def _parents(store, channel_id: str, parent_ids: List[str]) -> dict:
+    """Parent messages by id: one batched lookup, then the archive for the rest"""
+    parents = {row["id"]: row for row in store.get_many('messages', parent_ids, columns=PREVIEW_COLUMNS)
+               if row["channel_id"] == channel_id}
+    missing = [parent_id for parent_id in parent_ids if parent_id not in parents]
+    if missing:
+        parents.update(find_archived(store, channel_id, missing))
+    return parents
+
+def hydrate_replies(store, channel_id: str, messages: List[dict]) -> List[dict]:
+    """Embed a preview of the parent into every reply, parents that are gone show as deleted"""
+    parent_ids = list(dict.fromkeys(m["reply_to_id"] for m in messages if m.get("reply_to_id")))
+    if parent_ids:
+        parents = _parents(store, channel_id, parent_ids)
+        for message in messages:
+            if message.get("reply_to_id"):
+                message["reply_to"] = _preview(message["reply_to_id"], parents.get(message["reply_to_id"]))
+    return messages
+
+def visible_channels(channels: List[dict], user: dict) -> List[dict]:
+    """Filter channels down to the ones a user can access"""
+    if user.get("role") == "team":
+        return channels
+    return [ch for ch in channels if directory.can_access(ch["id"], user)]
+
+def user_channels(store, user: dict, columns=None) -> List[dict]:
+    """The channels a user can access, looked up by id instead of filtering every channel"""
+    if user.get("role") == "team":
+        return store.list('channels', columns=columns)
+    ids = directory.visible_ids(user)
+    rows = {row["id"]: row for row in store.get_many('channels', ids, columns=columns)}
+    return [rows[channel_id] for channel_id in ids if channel_id in rows]
+
+def with_presence(channels: List[dict], user_id: str) -> List[dict]:
+    """Fill online/typing from live heartbeats of other users"""
+    for channel in channels:
+        channel.update(presence.channel_flags(channel["id"], user_id))
+    return channels
 
 @router.get("/channels", response_model=List[Channel])
-async def get_channels(current_user: dict = Depends(get_current_user)):
-    # Filter channels based on user role
-    user_role = current_user.get("role")
-    if user_role == "campus_lead":
-        # Campus leads don't see team-only channels
-        return [ch for ch in channels_db.values() if ch["type"] != "team"]
-    return list(channels_db.values())
+async def get_channels(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, Channel)
+    # Presence needs the channel id even when it wasn't requested
+    channels = user_channels(get_store(), current_user, store_columns('channels', requested, "id"))
+    channels = with_presence(channels, current_user.get("user_id"))
+    if requested:
+        return sparse_response(Channel, requested, channels)
+    return channels
 
 @router.post("/channels", response_model=Channel, status_code=status.HTTP_201_CREATED)
 async def create_channel(channel: ChannelCreate, current_user: dict = Depends(get_current_user)):
@@ -149,64 +111,199 @@ async def create_channel(channel: ChannelCreate, current_user: dict = Depends(ge
         "created_at": datetime.now().isoformat()
     }
     
-    channels_db[channel_id] = channel_data
+    channel_data = get_store().insert('channels', channel_data)
+    directory.add_channel(channel_data)
     return channel_data
 
-@router.get("/{channel_id}", response_model=List[Message])
-async def get_messages(channel_id: str, current_user: dict = Depends(get_current_user)):
-    if channel_id not in channels_db:
+def _check_access(channel_id: str, user: dict):
+    """404 for unknown channels, 403 for channels the user can't see, no store reads for known ones"""
+    if not directory.knows(channel_id):
+        # Created by another path (e.g. seeding) since the directory was built
+        channel = get_store().get('channels', channel_id, columns=("id", "type", "members_only"))
+        if channel is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Channel not found"
+            )
+        directory.add_channel(channel)
+    if not directory.can_access(channel_id, user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a member of this channel"
+        )
+
+def _require_team(user: dict):
+    if user.get("role") != "team":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only team members can manage channel members"
+        )
+
+@router.get("/{channel_id}/members", response_model=List[ChannelMember])
+async def get_members(channel_id: str, current_user: dict = Depends(get_current_user)):
+    """Members added to a channel (team members see every channel without being added)"""
+    _require_team(current_user)
+    _check_access(channel_id, current_user)
+    store = get_store()
+    user_ids = directory.members(channel_id)
+    users = {row["id"]: row for row in store.get_many('users', user_ids, columns=("id", "name", "email", "role"))}
+    return [
+        {"user_id": user_id, **{key: users[user_id][key] for key in ("name", "email", "role")}}
+        if user_id in users else {"user_id": user_id}
+        for user_id in user_ids
+    ]
+
+@router.put("/{channel_id}/members/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def add_member(channel_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
+    _require_team(current_user)
+    _check_access(channel_id, current_user)
+    if get_store().get('users', user_id, columns=("id",)) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Channel not found"
+            detail="User not found"
         )
-    
-    # Return messages for this channel
-    return messages_db.get(channel_id, [])
+    directory.add_member(channel_id, user_id)
 
-@router.post("/{channel_id}", response_model=Message, status_code=status.HTTP_201_CREATED)
-async def send_message(channel_id: str, message: MessageCreate, current_user: dict = Depends(get_current_user)):
-    if channel_id not in channels_db:
+@router.delete("/{channel_id}/members/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_member(channel_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
+    _require_team(current_user)
+    _check_access(channel_id, current_user)
+    if not directory.remove_member(channel_id, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Channel not found"
+            detail="Not a member of this channel"
         )
+
+@router.get("/{channel_id}", response_model=List[Message])
+async def get_messages(
+    channel_id: str,
+    fields: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """Channel history, oldest first. Page back with ?before=<oldest message id>&limit=, archived messages included"""
+    requested = parse_fields(fields, Message)
+    hydrate = requested is None or "reply_to" in requested
+    store = get_store()
+    _check_access(channel_id, current_user)
     
-    message_id = str(uuid.uuid4())
-    now = datetime.now()
-    
-    message_data = {
-        "id": message_id,
-        **message.model_dump(),
-        "timestamp": now.strftime("%I:%M %p"),
-        "time": now.strftime("%H:%M"),
-        "date": now.strftime("%Y-%m-%d"),
-        "read": False,
-        "starred": False
-    }
-    
-    # Add message to channel
-    if channel_id not in messages_db:
-        messages_db[channel_id] = []
-    messages_db[channel_id].append(message_data)
+    # Return messages for this channel, older pages come from archive blocks
+    columns = store_columns('messages', requested, *(("reply_to_id",) if hydrate else ()))
+    messages = read_history(store, channel_id, before, limit, columns)
+    if hydrate:
+        messages = hydrate_replies(store, channel_id, messages)
+    if requested:
+        return sparse_response(Message, requested, messages)
+    return messages
+
+@router.post("/{channel_id}", response_model=Message, status_code=status.HTTP_201_CREATED)
+async def send_message(
+    channel_id: str,
+    message: MessageCreate,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    store = get_store()
+    _check_access(channel_id, current_user)
     
-    # Update channel's last message
-    channels_db[channel_id]["last_message"] = message.content
-    channels_db[channel_id]["last_message_time"] = now.strftime("%I:%M %p")
+    async def create():
+        # Replays of a stored response don't count against the rate limits
+        enforce_rate_limit("send_message_ip", client_ip(request))
+        enforce_rate_limit("send_message_user", current_user.get("user_id"))
+        
+        reply_to = None
+        if message.reply_to_id:
+            reply_to = _parents(store, channel_id, [message.reply_to_id]).get(message.reply_to_id)
+            if reply_to is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Replied-to message not found in this channel"
+                )
+        
+        message_id = str(uuid.uuid4())
+        now = datetime.now()
+        
+        message_data = {
+            "id": message_id,
+            **message.model_dump(),
+            "channel_id": channel_id,
+            "timestamp": now.strftime("%I:%M %p"),
+            "time": now.strftime("%H:%M"),
+            "date": now.strftime("%Y-%m-%d"),
+            "read": False,
+            "starred": False
+        }
+        
+        # Add message to channel
+        message_data = store.insert('messages', message_data)
+        if reply_to is not None:
+            message_data["reply_to"] = _preview(message.reply_to_id, reply_to)
+        
+        presence.stopped_typing(channel_id, current_user.get("user_id"))
+        
+        # Update channel's last message after responding
+        _latest_message[channel_id] = message_id
+        await enqueue("update_channel_preview", {
+            "channel_id": channel_id,
+            "message_id": message_id,
+            "content": message.content,
+            "time": now.strftime("%I:%M %p")
+        })
+        
+        return message_data
     
-    return message_data
+    params = {**message.model_dump(), "channel_id": channel_id}
+    return await idempotency.run(idempotency_key, current_user, "send_message", params, response, create)
 
-@router.put("/{channel_id}/{message_id}/star", response_model=Message)
-async def toggle_star(channel_id: str, message_id: str, current_user: dict = Depends(get_current_user)):
-    if channel_id not in messages_db:
+@router.post("/{channel_id}/heartbeat", status_code=status.HTTP_204_NO_CONTENT)
+async def heartbeat(channel_id: str, current_user: dict = Depends(get_current_user)):
+    _check_access(channel_id, current_user)
+    presence.heartbeat(channel_id, current_user.get("user_id"), current_user.get("sub"))
+
+@router.post("/{channel_id}/typing", status_code=status.HTTP_204_NO_CONTENT)
+async def typing(channel_id: str, current_user: dict = Depends(get_current_user)):
+    _check_access(channel_id, current_user)
+    presence.typing(channel_id, current_user.get("user_id"), current_user.get("sub"))
+
+@router.get("/{channel_id}/presence", response_model=ChannelPresence)
+async def get_presence(channel_id: str, current_user: dict = Depends(get_current_user)):
+    _check_access(channel_id, current_user)
+    return presence.snapshot(channel_id)
+
+@router.get("/{channel_id}/{message_id}/replies", response_model=List[Message])
+async def get_replies(channel_id: str, message_id: str, current_user: dict = Depends(get_current_user)):
+    """Replies to a message, oldest first, found through the reply_to_id index"""
+    store = get_store()
+    _check_access(channel_id, current_user)
+    
+    # Archived replies are older, hot copies win over leftovers of an interrupted archive run
+    replies = {row["id"]: row for row in archived_replies(store, channel_id, message_id)}
+    replies.update((row["id"], row) for row in store.list('messages', {"reply_to_id": message_id})
+                   if row["channel_id"] == channel_id)
+    if not replies and not _parents(store, channel_id, [message_id]):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Channel not found"
+            detail="Message not found"
         )
+    return hydrate_replies(store, channel_id, list(replies.values()))
+
+@router.put("/{channel_id}/{message_id}/star", response_model=Message)
+async def toggle_star(channel_id: str, message_id: str, current_user: dict = Depends(get_current_user)):
+    store = get_store()
+    _check_access(channel_id, current_user)
+    
+    message = store.get('messages', message_id)
+    if message is not None and message["channel_id"] == channel_id:
+        message = store.update('messages', message_id, {"starred": not message["starred"]})
+        return hydrate_replies(store, channel_id, [message])[0]
     
-    for message in messages_db[channel_id]:
-        if message["id"] == message_id:
-            message["starred"] = not message["starred"]
-            return message
+    archived = await asyncio.to_thread(
+        update_archived, store, channel_id, message_id, lambda archived: {"starred": not archived["starred"]})
+    if archived is not None:
+        return hydrate_replies(store, channel_id, [archived])[0]
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -215,10 +312,11 @@ async def toggle_star(channel_id: str, message_id: str, current_user: dict = Dep
 
 @router.delete("/{channel_id}/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_message(channel_id: str, message_id: str, current_user: dict = Depends(get_current_user)):
-    if channel_id not in messages_db:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Channel not found"
-        )
+    store = get_store()
+    _check_access(channel_id, current_user)
     
-    messages_db[channel_id] = [m for m in messages_db[channel_id] if m["id"] != message_id]
\ No newline at end of file
+    message = store.get('messages', message_id)
+    if message is not None and message["channel_id"] == channel_id:
+        store.delete('messages', message_id)
+    else:
+        await asyncio.to_thread(update_archived, store, channel_id, message_id, None)
\ No newline at end of file
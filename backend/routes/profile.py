@@ -1,38 +1,109 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, File, Header, Response, UploadFile
+from typing import Optional
 from models.schemas import UserProfile
 from utils.auth import get_current_user
-from routes.auth import users_db
+from utils.avatars import (
+    AVATAR_SIZES, DIGEST_PATTERN, avatar_digest, cached_thumbnail, has_avatar, load_thumbnail, render_avatar, write_avatar
+)
+from utils.config import settings
+from utils.database import get_store
+from utils.jobs import run_cpu
+import asyncio
 
 router = APIRouter(prefix="/api/profile", tags=["Profile"])
 
 @router.get("", response_model=UserProfile)
 async def get_profile(current_user: dict = Depends(get_current_user)):
     user_id = current_user.get("user_id")
+    user_data = get_store().get('users', user_id)
     
-    if user_id not in users_db:
+    if user_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    user_data = users_db[user_id]
     return UserProfile(**{k: v for k, v in user_data.items() if k != "password_hash"})
 
 @router.put("", response_model=UserProfile)
 async def update_profile(profile: UserProfile, current_user: dict = Depends(get_current_user)):
     user_id = current_user.get("user_id")
+    store = get_store()
+    user_data = store.get('users', user_id)
     
-    if user_id not in users_db:
+    if user_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    user_data = users_db[user_id]
-    # Update user data with new profile info (excluding password_hash)
+    # Update user data with new profile info (excluding password_hash, the avatar is set by uploading one)
     profile_dict = profile.model_dump()
-    for key, value in profile_dict.items():
-        if key in user_data and key != "password_hash":
-            user_data[key] = value
+    changes = {key: value for key, value in profile_dict.items() if key in user_data and key not in ("password_hash", "avatar")}
+    user_data = store.update('users', user_id, changes)
     
-    return UserProfile(**{k: v for k, v in user_data.items() if k != "password_hash"})
\ No newline at end of file
+    return UserProfile(**{k: v for k, v in user_data.items() if k != "password_hash"})
+
+@router.put("/avatar", response_model=UserProfile)
+async def upload_avatar(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+    """Set the avatar from a JPEG, PNG, WebP or GIF upload, served in every size of AVATAR_SIZES"""
+    data = await file.read(settings.avatar_max_upload_bytes + 1)
+    if len(data) > settings.avatar_max_upload_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Avatars are limited to {settings.avatar_max_upload_bytes // (1024 * 1024)} MB"
+        )
+    
+    digest = avatar_digest(data)
+    # Content-addressed, an image uploaded before (by anyone) is not processed again
+    if not await asyncio.to_thread(has_avatar, digest):
+        try:
+            thumbnails = await run_cpu(render_avatar, data)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        await asyncio.to_thread(write_avatar, digest, thumbnails)
+    
+    user_data = get_store().update('users', current_user.get("user_id"), {"avatar": digest})
+    if user_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return UserProfile(**{k: v for k, v in user_data.items() if k != "password_hash"})
+
+@router.delete("/avatar", response_model=UserProfile)
+async def delete_avatar(current_user: dict = Depends(get_current_user)):
+    # Thumbnail files stay, other users may have uploaded the same image
+    user_data = get_store().update('users', current_user.get("user_id"), {"avatar": None})
+    if user_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return UserProfile(**{k: v for k, v in user_data.items() if k != "password_hash"})
+
+@router.get("/avatars/{digest}/{size}")
+async def get_avatar(digest: str, size: int, if_none_match: Optional[str] = Header(None)):
+    """
+    A thumbnail by content hash. No authentication, so <img> tags can load it;
+    the URL changes with the content, so it is cached for good.
+    """
+    if not DIGEST_PATTERN.match(digest) or size not in AVATAR_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Avatar not found"
+        )
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{digest}-{size}"'}
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    data = cached_thumbnail(digest, size) or await asyncio.to_thread(load_thumbnail, digest, size)
+    if data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Avatar not found"
+        )
+    return Response(content=data, media_type="image/webp", headers=headers)
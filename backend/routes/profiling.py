@@ -0,0 +1,50 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from utils.auth import get_current_user
+from utils.profiling import SamplingProfiler, get_profile_path, render_profile_text
+import asyncio
+
+router = APIRouter(prefix="/api/profiling", tags=["Profiling"])
+
+def _require_team(current_user: dict):
+    if current_user.get("role") != "team":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only team members can access profiles"
+        )
+
+@router.get("/requests/{profile_id}")
+async def get_request_profile(
+    profile_id: str,
+    format: str = Query("text", pattern="^(text|prof)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    _require_team(current_user)
+    
+    path = get_profile_path(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    
+    if format == "prof":
+        # Raw cProfile output, open with snakeviz or convert with flameprof
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    return PlainTextResponse(await asyncio.to_thread(render_profile_text, path))
+
+@router.post("/sample", response_class=PlainTextResponse)
+async def sample_process(
+    seconds: float = Query(5.0, gt=0),
+    current_user: dict = Depends(get_current_user)
+):
+    _require_team(current_user)
+    
+    try:
+        # Sampling runs in a worker thread so the event loop keeps serving (and being sampled)
+        return await asyncio.to_thread(SamplingProfiler().run, seconds)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
-from models.schemas import Stat, StatsUpdate, StatBase
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from typing import List, Optional
+from models.schemas import Stat, StatsUpdate, StatBase, StatUpdateItem, StatTrends
 from utils.auth import get_current_user
-from utils.database import get_db
+from utils.database import get_store
+from utils.singleflight import singleflight
+from utils.fields import parse_fields, store_columns, sparse_response
+from utils.stats_history import PERIODS, stats_history, typed_stat
 import uuid
 import logging
 
@@ -10,46 +13,79 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/stats", tags=["Statistics"])
 
-# Fallback in-memory storage for development when Supabase is not available
-stats_db = {
-    "cohort": [
-        {"id": "c1", "category": "cohort", "label": "Total Participants", "value": "105", "icon": "Users", "color": "text-cyan-600"},
-        {"id": "c2", "category": "cohort", "label": "Active Cohorts", "value": "3", "icon": "TrendingUp", "color": "text-lime-600"},
-        {"id": "c3", "category": "cohort", "label": "Completion Rate", "value": "78%", "icon": "Target", "color": "text-purple-600"},
-        {"id": "c4", "category": "cohort", "label": "Success Stories", "value": "24", "icon": "Award", "color": "text-orange-600"},
-    ],
-    "campus_lead": [
-        {"id": "l1", "category": "campus_lead", "label": "Telangana", "value": "15 leads", "icon": "MapPin", "color": "text-cyan-600"},
-        {"id": "l2", "category": "campus_lead", "label": "Maharashtra", "value": "12 leads", "icon": "MapPin", "color": "text-lime-600"},
-        {"id": "l3", "category": "campus_lead", "label": "Tamil Nadu", "value": "10 leads", "icon": "MapPin", "color": "text-purple-600"},
-        {"id": "l4", "category": "campus_lead", "label": "Karnataka", "value": "8 leads", "icon": "MapPin", "color": "text-orange-600"},
-    ]
-}
-
 @router.get("/{category}", response_model=List[Stat])
-async def get_stats(category: str, current_user: dict = Depends(get_current_user)):
-    try:
-        db = get_db()
-        if db is not None:
-            # Fetch from Supabase
-            response = db.table('stats').select('*').eq('category', category).execute()
-            if response.data:
-                return response.data
-            else:
-                logger.info(f"No stats found for category: {category} in database")
-                return []
+async def get_stats(category: str, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    requested = parse_fields(fields, Stat)
+    # Identical concurrent reads share one backend call, keyed by category, role and fields
+    stats = await singleflight.do(
+        "stats", (category, current_user.get("role"), requested),
+        get_store().list, 'stats', {"category": category}, None, store_columns('stats', requested))
+    if requested:
+        return sparse_response(Stat, requested, stats)
+    return stats
+
+@router.get("/{category}/trends", response_model=StatTrends)
+async def get_stat_trends(
+    category: str,
+    period: str = Query("month", pattern="^(day|week|month)$"),
+    periods: int = Query(12, ge=2),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Last value of every stat in each of the last `periods` periods, from the
+    periodic snapshots plus the live values, with the change against the
+    previous period and the trend slope
+    """
+    if periods > PERIODS[period]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {PERIODS[period]} periods of a {period}"
+        )
+    stats = await singleflight.do(
+        "stats", (category, current_user.get("role"), None), get_store().list, 'stats', {"category": category})
+    if not stats:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stats category not found"
+        )
+    return stats_history.trends(category, stats, period, periods)
+
+def _diff_stats(category: str, current: List[dict], incoming: List[StatUpdateItem]):
+    """
+    Compare the submitted tiles against the stored rows of a category.
+    Tiles are matched by id first and by label otherwise, so unchanged rows
+    keep their ids. Returns (upserts, delete_ids, result) where result is the
+    category in the submitted order.
+    """
+    by_id = {row["id"]: row for row in current}
+    by_label = {row["label"]: row for row in current}
+    fields = ("label", "value", "number", "value_format", "icon", "color")
+
+    upserts = []
+    result = []
+    kept_ids = set()
+    for item in incoming:
+        existing = by_id.get(item.id) if item.id else None
+        if existing is None:
+            existing = by_label.get(item.label)
+        if existing is not None and existing["id"] in kept_ids:
+            # Two tiles matched the same row, treat the second one as new
+            existing = None
+
+        stat_dict = typed_stat(item.model_dump(exclude={"id"}))
+        stat_dict["category"] = category
+        if existing is not None:
+            stat_dict["id"] = existing["id"]
+            if any(existing.get(f) != stat_dict[f] for f in fields):
+                upserts.append(stat_dict)
         else:
-            # Fallback to in-memory
-            logger.warning("Using in-memory storage for stats")
-            if category not in stats_db:
-                return []
-            return stats_db[category]
-    except Exception as e:
-        logger.error(f"Error fetching stats: {e}")
-        # Fallback to in-memory on error
-        if category not in stats_db:
-            return []
-        return stats_db[category]
+            stat_dict["id"] = str(uuid.uuid4())
+            upserts.append(stat_dict)
+        kept_ids.add(stat_dict["id"])
+        result.append(stat_dict)
+
+    delete_ids = [row["id"] for row in current if row["id"] not in kept_ids]
+    return upserts, delete_ids, result
 
 @router.put("/{category}", response_model=List[Stat])
 async def update_stats(category: str, stats_update: StatsUpdate, current_user: dict = Depends(get_current_user)):
@@ -60,35 +96,17 @@ async def update_stats(category: str, stats_update: StatsUpdate, current_user: d
             detail="Only team members can update statistics"
         )
     
-    try:
-        db = get_db()
-        
-        # Convert StatBase items to full Stat items with IDs
-        new_stats = []
-        for idx, stat_base in enumerate(stats_update.stats):
-            stat_dict = stat_base.model_dump()
-            # Generate unique ID if not present
-            stat_dict["id"] = str(uuid.uuid4())
-            stat_dict["category"] = category
-            new_stats.append(stat_dict)
-        
-        if db is not None:
-            # Delete old stats for this category
-            db.table('stats').delete().eq('category', category).execute()
-            
-            # Insert new stats
-            if new_stats:
-                response = db.table('stats').insert(new_stats).execute()
-                return response.data
-            return []
-        else:
-            # Fallback to in-memory
-            logger.warning("Using in-memory storage for stats update")
-            stats_db[category] = new_stats
-            return new_stats
-            
-    except Exception as e:
-        logger.error(f"Error updating stats: {e}")
-        # Fallback to in-memory on error
-        stats_db[category] = new_stats
-        return new_stats
\ No newline at end of file
+    if any(item.value is None and item.number is None for item in stats_update.stats):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Every stat needs a value or a number"
+        )
+    
+    store = get_store()
+    current = store.list('stats', {"category": category})
+    upserts, delete_ids, new_stats = _diff_stats(category, current, stats_update.stats)
+    
+    # Apply inserts, updates and deletes in a single transaction
+    if upserts or delete_ids:
+        store.apply_changes('stats', upserts, delete_ids, scope={"category": category})
+    return new_stats
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from models.schemas import SyncResponse
+from routes.messages import visible_channels, with_presence
+from storage.changelog import SYNCED_TABLES
+from utils.auth import get_current_user
+from utils.database import get_store
+import asyncio
+
+router = APIRouter(prefix="/api/sync", tags=["Sync"])
+
+def _visible(entity: str, rows: list, current_user: dict) -> list:
+    # Same role filtering as GET /api/messages/channels
+    if entity == "channels":
+        return with_presence(visible_channels(rows, current_user), current_user.get("user_id"))
+    return rows
+
+@router.get("", response_model=SyncResponse)
+async def sync(
+    since: int = 0,
+    limit: int = Query(1000, ge=1, le=5000),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Changes to cohorts, campus leads, events and channels since the version
+    returned by the previous sync. The first sync (since=0), or one from before
+    the log was compacted, returns a full snapshot instead.
+    """
+    store = get_store()
+    if not hasattr(store, "read_changes"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Change log is disabled"
+        )
+    
+    changes, version = await asyncio.to_thread(store.read_changes, since, limit)
+    if changes is None:
+        # The version is read before the collections, so later changes are picked up by the next sync
+        collections = await asyncio.gather(*(asyncio.to_thread(store.list, entity) for entity in SYNCED_TABLES))
+        snapshot = {entity: _visible(entity, rows, current_user) for entity, rows in zip(SYNCED_TABLES, collections)}
+        return {"version": version, "snapshot": snapshot}
+    
+    # Only the latest change per row matters to the client
+    latest = {}
+    for change in changes:
+        latest.pop((change["entity"], change["entity_id"]), None)
+        latest[(change["entity"], change["entity_id"])] = change
+    result = []
+    for (entity, entity_id), change in latest.items():
+        data, operation = change.get("data"), change["operation"]
+        if data is not None:
+            visible = _visible(entity, [dict(data)], current_user)
+            # A channel the user can't see (any more, e.g. after leaving it) is removed on the client
+            data, operation = (visible[0], operation) if visible else (None, "delete")
+        result.append({
+            "version": change["version"], "entity": entity, "id": entity_id,
+            "operation": operation, "data": data
+        })
+    return {"version": version, "changes": result, "has_more": len(changes) == limit}
@@ -1,8 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, cohorts, campus_leads, messages, events, profile, stats
-from utils.database import db
+from routes import auth, cohorts, campus_leads, messages, events, profile, stats, dashboard, sync, exports, profiling
+from utils.auth import active_payload
+from utils.database import db, get_store
 from utils.db_init import initialize_database
+from utils.config import settings
+from utils.metrics import MetricsMiddleware, registry, PROMETHEUS_CONTENT_TYPE
+from utils.profiling import ProfilingMiddleware
+from utils.rate_limit import client_ip
+from utils.idempotency import idempotency
+from utils.jobs import job_queue
+from utils.reminders import reminders
+from utils.retention import retention
+from utils.stats_history import stats_history
+import asyncio
 import logging
 
 # Configure logging
@@ -25,15 +36,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, request and error counts (exposed on /metrics)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# On-demand request profiling, not installed at all unless enabled
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
 # Initialize database connection
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up EdVenture Park Community API...")
+    # Create the configured store (opens SQLite and creates its tables if needed)
+    get_store()
+    # Background job workers, also re-queues durable jobs left from the previous run
+    await job_queue.start()
+    # Deletes expired idempotency keys now and then every interval
+    idempotency.start()
+    if settings.message_retention_enabled:
+        # Moves old messages to archive blocks now and then every interval
+        retention.start()
+    if settings.stats_snapshots_enabled:
+        # Snapshots every stats category now and then every interval
+        stats_history.start()
+    if settings.reminders_enabled:
+        # Loads upcoming event and cohort dates in the background
+        app.state.reminders_task = asyncio.create_task(reminders.start())
+    if settings.storage_backend != "supabase":
+        logger.info("API is ready!")
+        return
     db.connect()
     # Initialize database tables and data
-    initialize_database()
+    if settings.db_init_in_background:
+        # Seeding is not needed to serve requests, keep it off the critical path
+        app.state.db_init_task = asyncio.create_task(initialize_database())
+    else:
+        await initialize_database()
     logger.info("API is ready!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    reminders.stop()
+    retention.stop()
+    stats_history.stop()
+    idempotency.stop()
+    await job_queue.stop()
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(cohorts.router)
@@ -42,6 +91,11 @@ app.include_router(messages.router)
 app.include_router(events.router)
 app.include_router(profile.router)
 app.include_router(stats.router)
+app.include_router(dashboard.router)
+app.include_router(sync.router)
+app.include_router(exports.router)
+if settings.profiling_enabled:
+    app.include_router(profiling.router)
 
 # Health check endpoint
 @app.get("/api/health")
@@ -52,6 +106,22 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Addresses allowed to scrape /metrics without a token, matched against the trusted proxy hop
+METRICS_ALLOWED_IPS = {ip.strip() for ip in settings.metrics_allowed_ips.split(",") if ip.strip()}
+
+# Prometheus metrics endpoint, for team members and allowed addresses only
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if client_ip(request) not in METRICS_ALLOWED_IPS:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        payload = active_payload(token) if scheme.lower() == "bearer" else None
+        if payload is None or payload.get("role") != "team":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Metrics are only available to team members and allowed addresses"
+            )
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -63,4 +133,5 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Several workers need an import string so each process loads its own app
+    uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=settings.workers)
@@ -0,0 +1,278 @@
+"""
+Storage interface shared by all backends
+Every router reads and writes rows through a Store, so the in-memory, Supabase
+and SQLite backends are interchangeable (see `storage_backend` in utils/config.py).
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+@dataclass(frozen=True)
+class Table:
+    name: str
+    # Column name -> type: "text", "int", "real", "bool" or "json" (lists and dicts)
+    columns: Dict[str, str]
+    # Columns with a secondary index, lookups by these columns avoid full scans
+    indexes: Tuple[str, ...] = ()
+    unique: Tuple[str, ...] = ()
+    primary_key: str = "id"
+    # Column Supabase orders reads by, most tables there have a created_at default (SUPABASE_SETUP.sql)
+    order_by: str = "created_at"
+
+TABLES = {
+    table.name: table for table in (
+        Table(
+            name="users",
+            columns={
+                "id": "text", "email": "text", "password_hash": "text", "name": "text", "role": "text",
+                "phone": "text", "location": "text", "college": "text", "department": "text", "bio": "text",
+                "skills": "json", "achievements": "json", "joined_date": "text", "token_version": "int",
+                "avatar": "text",
+            },
+            indexes=("email",),
+            unique=("email",),
+        ),
+        Table(
+            name="cohorts",
+            columns={
+                "id": "text", "name": "text", "program": "text", "status": "text", "start_date": "text",
+                "end_date": "text", "participants": "int", "progress": "int", "milestones": "json",
+                "completed_milestones": "int", "created_at": "text",
+            },
+            indexes=("status",),
+        ),
+        # Samples of cohort progress over time (utils/progress_history.py), recorded_at is epoch seconds
+        Table(
+            name="cohort_progress",
+            columns={
+                "id": "text", "cohort_id": "text", "recorded_at": "int", "progress": "int",
+                "completed_milestones": "int", "participants": "int",
+            },
+            indexes=("cohort_id",),
+            order_by="recorded_at",
+        ),
+        Table(
+            name="campus_leads",
+            columns={
+                "id": "text", "user_id": "text", "name": "text", "college": "text", "location": "text",
+                "status": "text", "events_organized": "int", "students_reached": "int",
+                "last_activity": "text", "performance": "text",
+            },
+            indexes=("status", "user_id"),
+        ),
+        Table(
+            name="stats",
+            columns={
+                "id": "text", "category": "text", "label": "text", "value": "text", "number": "real",
+                "value_format": "text", "icon": "text", "color": "text",
+            },
+            indexes=("category",),
+        ),
+        # Periodic snapshots of each stats category (utils/stats_history.py), ids and numbers are parallel arrays
+        Table(
+            name="stats_snapshots",
+            columns={"id": "text", "category": "text", "taken_at": "int", "stat_ids": "json", "numbers": "json"},
+            indexes=("category",),
+            order_by="taken_at",
+        ),
+        Table(
+            name="channels",
+            columns={
+                "id": "text", "name": "text", "type": "text", "unread": "int", "last_message": "text",
+                "last_message_time": "text", "online": "bool", "typing": "bool", "members_only": "bool",
+                "cohort_id": "text", "created_at": "text",
+            },
+            indexes=("type", "cohort_id"),
+        ),
+        # Members of channels (utils/membership.py), id is "<channel id>:<user id>"
+        Table(
+            name="channel_members",
+            columns={"id": "text", "channel_id": "text", "user_id": "text", "joined_at": "text"},
+            indexes=("channel_id", "user_id"),
+            order_by="joined_at",
+        ),
+        Table(
+            name="messages",
+            columns={
+                "id": "text", "channel_id": "text", "sender": "text", "role": "text", "content": "text",
+                "timestamp": "text", "time": "text", "date": "text", "read": "bool", "starred": "bool",
+                "file_name": "text", "file_type": "text", "file_url": "text", "reply_to_id": "text",
+            },
+            indexes=("channel_id", "reply_to_id", "date"),
+        ),
+        Table(
+            name="events",
+            columns={
+                "id": "text", "title": "text", "description": "text", "date": "text", "time": "text",
+                "cohort_id": "text", "created_by": "text", "attendees": "json", "created_at": "text",
+            },
+            indexes=("date", "cohort_id"),
+        ),
+        # Compressed blocks of old messages (utils/retention.py), message_ids, parent_ids and dates index each block
+        Table(
+            name="message_archives",
+            columns={
+                "id": "text", "channel_id": "text", "seq": "int", "count": "int", "first_date": "text",
+                "last_date": "text", "message_ids": "json", "parent_ids": "json", "data": "text", "revision": "int",
+                "created_at": "text",
+            },
+            indexes=("channel_id",),
+        ),
+        # Archive block holding each archived message (utils/retention.py), id is the message id
+        Table(
+            name="archived_messages",
+            columns={"id": "text", "block_id": "text"},
+            order_by="id",
+        ),
+        # Revoked access tokens (utils/revocation.py): a jti, or a user's lowest valid token version
+        Table(
+            name="revoked_tokens",
+            columns={"id": "text", "kind": "text", "user_id": "text", "token_version": "int", "expires_at": "int"},
+            order_by="id",
+        ),
+        # First responses of requests sent with an Idempotency-Key (utils/idempotency.py), id hashes user and key
+        Table(
+            name="idempotency_keys",
+            columns={"id": "text", "operation": "text", "fingerprint": "text", "response": "json", "expires_at": "int"},
+            indexes=("expires_at",),
+            order_by="id",
+        ),
+        # Durable background jobs (utils/jobs.py), rows are removed once a job succeeds
+        Table(
+            name="jobs",
+            columns={
+                "id": "text", "name": "text", "payload": "json", "status": "text", "attempts": "int",
+                "last_error": "text", "created_at": "text",
+            },
+            indexes=("status",),
+        ),
+        # Named counters advanced by Store.next_sequence, e.g. the change log's versions
+        Table(
+            name="sequences",
+            columns={"id": "text", "value": "int"},
+            order_by="id",
+        ),
+        # Change log for GET /api/sync (storage/changelog.py), compacted to the newest entries
+        Table(
+            name="changes",
+            columns={
+                "id": "text", "version": "int", "entity": "text", "entity_id": "text", "operation": "text",
+                "data": "json", "created_at": "text",
+            },
+            indexes=("version",),
+        ),
+    )
+}
+
+def get_table(name: str) -> Table:
+    if name not in TABLES:
+        raise ValueError(f"Unknown table: {name}")
+    return TABLES[name]
+
+def project_row(table: Table, row: dict) -> dict:
+    """Drop keys that are not columns of the table"""
+    return {k: v for k, v in row.items() if k in table.columns}
+
+def check_columns(table: Table, columns: Optional[Tuple[str, ...]]) -> Optional[Tuple[str, ...]]:
+    """Validate a column projection, None means every column"""
+    if columns is None:
+        return None
+    for column in columns:
+        if column not in table.columns:
+            raise ValueError(f"Unknown column {column} for table {table.name}")
+    return tuple(columns)
+
+class Store:
+    """
+    Row storage used by the routers. Rows are plain dicts keyed by column name.
+    Returned rows are copies, so changes must be written back with update().
+    Unless stated otherwise rows come back in insertion order.
+    Reads accept `columns` to fetch only some columns of each row.
+    """
+    name = "base"
+
+    def list(self, table: str, filters: Optional[dict] = None, limit: Optional[int] = None,
+             columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        """Return rows whose columns equal every value in `filters`"""
+        raise NotImplementedError
+
+    def get(self, table: str, row_id: str, columns: Optional[Tuple[str, ...]] = None) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_many(self, table: str, row_ids: List[str], columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        """Rows with the given ids in one lookup, ids without a row are left out"""
+        rows = (self.get(table, row_id, columns) for row_id in dict.fromkeys(row_ids))
+        return [row for row in rows if row is not None]
+
+    def find_one(self, table: str, filters: dict) -> Optional[dict]:
+        rows = self.list(table, filters, limit=1)
+        return rows[0] if rows else None
+
+    def insert(self, table: str, row: dict) -> dict:
+        raise NotImplementedError
+
+    def update(self, table: str, row_id: str, changes: dict) -> Optional[dict]:
+        """Apply `changes` to a row and return it, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def delete(self, table: str, row_id: str) -> bool:
+        """Delete a row, returns False if it didn't exist"""
+        raise NotImplementedError
+
+    def apply_changes(self, table: str, upserts: List[dict], delete_ids: List[str], scope: Optional[dict] = None):
+        """
+        Upsert and delete rows in one atomic operation.
+        Deletes are restricted to rows matching `scope` (e.g. a stats category).
+        """
+        raise NotImplementedError
+
+    def next_sequence(self, name: str, start: int = 0) -> int:
+        """
+        Atomically advance a counter in the sequences table and return its new
+        value, a counter that doesn't exist yet continues after `start`
+        """
+        raise NotImplementedError
+
+    def iter_pages(self, table: str, filters: Optional[dict] = None, columns: Optional[Tuple[str, ...]] = None,
+                   page_size: int = 1000) -> Iterator[List[dict]]:
+        """
+        Like list(), in pages of up to `page_size` rows fetched one at a time,
+        so large tables can be streamed without holding every row
+        """
+        rows = self.list(table, filters, columns=columns)
+        for start in range(0, len(rows), page_size):
+            yield rows[start:start + page_size]
+
+    def list_range(self, table: str, column: str, after, limit: Optional[int] = None) -> List[dict]:
+        """Rows whose `column` is greater than `after`, ordered by that column"""
+        check_columns(get_table(table), (column,))
+        rows = [row for row in self.list(table) if row.get(column) is not None and row[column] > after]
+        rows.sort(key=lambda row: row[column])
+        return rows[:limit] if limit is not None else rows
+
+    def list_before(self, table: str, column: str, before, limit: Optional[int] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        """Rows whose `column` is less than `before`, ordered by that column and then insertion"""
+        check_columns(get_table(table), (column,))
+        rows = [row for row in self.list(table) if row.get(column) is not None and row[column] < before]
+        rows.sort(key=lambda row: row[column])
+        rows = rows[:limit] if limit is not None else rows
+        return [{c: row.get(c) for c in columns} for row in rows] if columns is not None else rows
+
+    def list_recent(self, table: str, filters: Optional[dict], limit: int, before: Optional[str] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> Optional[List[dict]]:
+        """
+        The last `limit` rows matching `filters` inserted before row `before`
+        (the newest ones without it), oldest first. None if `before` isn't a
+        row matching the filters.
+        """
+        rows = self.list(table, filters, columns=None if columns is None else tuple(dict.fromkeys(("id", *columns))))
+        if before is not None:
+            position = next((i for i, row in enumerate(rows) if row["id"] == before), None)
+            if position is None:
+                return None
+            rows = rows[:position]
+        rows = rows[max(len(rows) - limit, 0):]
+        return [{c: row.get(c) for c in columns} for row in rows] if columns is not None else rows
+
+    def count(self, table: str) -> int:
+        return len(self.list(table))
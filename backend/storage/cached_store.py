@@ -0,0 +1,174 @@
+"""
+Per-worker read cache with cross-process invalidation
+When the API runs with several uvicorn workers, authoritative state lives in a
+shared store (SQLite or Supabase) and each worker caches reads locally. Every
+write bumps a per-table version counter in a small memory-mapped file shared by
+all workers; a cached read is only served while its table version is unchanged,
+so a write in one worker is visible to reads in every other worker immediately.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from typing import Iterator, List, Optional, Tuple
+from .base import Store, TABLES
+
+# Fixed number of counter slots so new tables can be added without resizing the file
+VERSION_SLOTS = 64
+_COUNTER = struct.Struct("<Q")
+
+class SharedVersions:
+    """Per-table version counters in a memory-mapped file shared between processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._slots = {name: index for index, name in enumerate(TABLES)}
+        size = VERSION_SLOTS * _COUNTER.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    def get(self, table: str) -> int:
+        # Reading 8 bytes from the mapping is enough, no syscall on the read path
+        return _COUNTER.unpack_from(self._map, self._slots[table] * _COUNTER.size)[0]
+
+    def bump(self, table: str) -> int:
+        offset = self._slots[table] * _COUNTER.size
+        # flock serialises increments from different processes
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            version = _COUNTER.unpack_from(self._map, offset)[0] + 1
+            _COUNTER.pack_into(self._map, offset, version)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return version
+
+    def raise_to(self, table: str, value: int):
+        """Move a counter forward to at least `value`"""
+        offset = self._slots[table] * _COUNTER.size
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if _COUNTER.unpack_from(self._map, offset)[0] < value:
+                _COUNTER.pack_into(self._map, offset, value)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+class CachedStore(Store):
+    """
+    Read-through cache in front of a shared store.
+    Entries are tagged with the table version read before the backend call, so
+    a write that races with a read can only make the entry look stale, never fresh.
+    """
+
+    def __init__(self, inner: Store, versions: SharedVersions, max_entries: int = 1024):
+        self.inner = inner
+        self.versions = versions
+        self.max_entries = max_entries
+        self.name = inner.name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # table -> (version, {key: result})
+        self._cache = {}
+
+    def _cached(self, table: str, key, load):
+        version = self.versions.get(table)
+        with self._lock:
+            cached_version, entries = self._cache.get(table, (None, None))
+            if cached_version == version and key in entries:
+                self.hits += 1
+                return entries[key]
+        self.misses += 1
+        result = load()
+        with self._lock:
+            cached_version, entries = self._cache.get(table, (None, None))
+            if cached_version != version or len(entries) >= self.max_entries:
+                entries = {}
+                self._cache[table] = (version, entries)
+            entries[key] = result
+        return result
+
+    def _written(self, table: str):
+        self.versions.bump(table)
+        with self._lock:
+            self._cache.pop(table, None)
+
+    def list(self, table: str, filters: Optional[dict] = None, limit: Optional[int] = None,
+             columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        key = ("list", tuple(sorted((filters or {}).items())), limit, columns)
+        rows = self._cached(table, key, lambda: self.inner.list(table, filters, limit, columns))
+        return [dict(row) for row in rows]
+
+    def get(self, table: str, row_id: str, columns: Optional[Tuple[str, ...]] = None) -> Optional[dict]:
+        row = self._cached(table, ("get", row_id, columns), lambda: self.inner.get(table, row_id, columns))
+        return dict(row) if row is not None else None
+
+    def get_many(self, table: str, row_ids: List[str], columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        key = ("many", tuple(row_ids), columns)
+        rows = self._cached(table, key, lambda: self.inner.get_many(table, row_ids, columns))
+        return [dict(row) for row in rows]
+
+    def iter_pages(self, table: str, filters: Optional[dict] = None, columns: Optional[Tuple[str, ...]] = None,
+                   page_size: int = 1000) -> Iterator[List[dict]]:
+        # Streamed reads are usually one-off exports, not worth caching
+        return self.inner.iter_pages(table, filters, columns, page_size)
+
+    def list_range(self, table: str, column: str, after, limit: Optional[int] = None) -> List[dict]:
+        key = ("range", column, after, limit)
+        rows = self._cached(table, key, lambda: self.inner.list_range(table, column, after, limit))
+        return [dict(row) for row in rows]
+
+    def list_before(self, table: str, column: str, before, limit: Optional[int] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        key = ("before", column, before, limit, columns)
+        rows = self._cached(table, key, lambda: self.inner.list_before(table, column, before, limit, columns))
+        return [dict(row) for row in rows]
+
+    def list_recent(self, table: str, filters: Optional[dict], limit: int, before: Optional[str] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> Optional[List[dict]]:
+        key = ("recent", tuple(sorted((filters or {}).items())), limit, before, columns)
+        rows = self._cached(table, key, lambda: self.inner.list_recent(table, filters, limit, before, columns))
+        return [dict(row) for row in rows] if rows is not None else None
+
+    def insert(self, table: str, row: dict) -> dict:
+        try:
+            return self.inner.insert(table, row)
+        finally:
+            self._written(table)
+
+    def update(self, table: str, row_id: str, changes: dict) -> Optional[dict]:
+        try:
+            return self.inner.update(table, row_id, changes)
+        finally:
+            self._written(table)
+
+    def delete(self, table: str, row_id: str) -> bool:
+        try:
+            return self.inner.delete(table, row_id)
+        finally:
+            self._written(table)
+
+    def apply_changes(self, table: str, upserts: List[dict], delete_ids: List[str], scope: Optional[dict] = None):
+        try:
+            return self.inner.apply_changes(table, upserts, delete_ids, scope)
+        finally:
+            self._written(table)
+
+    def next_sequence(self, name: str, start: int = 0) -> int:
+        try:
+            return self.inner.next_sequence(name, start)
+        finally:
+            self._written('sequences')
+
+    def count(self, table: str) -> int:
+        return self._cached(table, ("count",), lambda: self.inner.count(table))
@@ -0,0 +1,198 @@
+"""
+Change log behind GET /api/sync
+ChangeLogStore wraps the configured store and appends one row per write to a
+synced table to the `changes` table: entity, id, operation, the row as
+written, and a version from the `changes` sequence in the store
+(Store.next_sequence), so every worker on every host numbers from one
+sequence. Versions are taken after the write itself, so every version a
+reader sees belongs to data that is already stored. The log keeps the newest
+`max_entries` versions, older ones are deleted through the version index;
+clients that fell further behind get a snapshot.
+"""
+from datetime import datetime, timedelta
+import logging
+import threading
+from typing import List, Optional, Tuple
+from .base import Store
+from .cached_store import SharedVersions
+
+logger = logging.getLogger(__name__)
+
+# Entities clients can sync
+SYNCED_TABLES = ("cohorts", "campus_leads", "events", "channels")
+
+# A missing version younger than this is assumed to be a write still in flight
+GAP_GRACE_SECONDS = 5
+
+# Sequence the versions come from
+SEQUENCE = "changes"
+
+# Old entries deleted per compaction query
+COMPACT_BATCH = 1000
+
+class LocalCounter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> int:
+        with self._lock:
+            self.value += 1
+            return self.value
+
+    def current(self) -> int:
+        return self.value
+
+    def raise_to(self, value: int):
+        with self._lock:
+            self.value = max(self.value, value)
+
+class SharedCounter:
+    """Counter in a SharedVersions file, so every worker draws from one sequence"""
+
+    def __init__(self, path: str, slot: str = "changes"):
+        self._versions = SharedVersions(path)
+        self.slot = slot
+
+    def next(self) -> int:
+        return self._versions.bump(self.slot)
+
+    def current(self) -> int:
+        return self._versions.get(self.slot)
+
+    def raise_to(self, value: int):
+        self._versions.raise_to(self.slot, value)
+
+class ChangeLogStore(Store):
+    def __init__(self, inner: Store, max_entries: int = 10000):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.name = inner.name
+        self._start = None  # Version the sequence continues after if it doesn't exist yet
+        self._lock = threading.Lock()
+
+    def _next_version(self) -> int:
+        if self._start is None:
+            with self._lock:
+                if self._start is None:
+                    start = 0
+                    if self.inner.get('sequences', SEQUENCE) is None:
+                        # Versions logged before they came from the sequence, read once
+                        rows = self.inner.list('changes', columns=("version",))
+                        start = max((row["version"] for row in rows), default=0)
+                    self._start = start
+        return self.inner.next_sequence(SEQUENCE, self._start)
+
+    def _record(self, table: str, entity_id: str, operation: str, data: Optional[dict]):
+        if table not in SYNCED_TABLES:
+            return
+        try:
+            version = self._next_version()
+            self.inner.insert('changes', {
+                "id": str(version), "version": version, "entity": table, "entity_id": entity_id,
+                "operation": operation, "data": data, "created_at": datetime.now().isoformat()
+            })
+            if version % 1000 == 0:
+                self._compact(version)
+        except Exception as e:
+            # The write itself succeeded; readers skip the missing version after the grace period
+            logger.error(f"Failed to record change to {table} {entity_id}: {e}")
+
+    def _compact(self, version: int):
+        floor = version - self.max_entries
+        if floor <= 0:
+            return
+        previous = None
+        while True:
+            old = self.inner.list_before('changes', 'version', floor + 1, COMPACT_BATCH, columns=("id",))
+            if not old or old[0]["id"] == previous:
+                # Done, or the last batch wasn't deleted
+                return
+            previous = old[0]["id"]
+            self.inner.apply_changes('changes', [], [row["id"] for row in old])
+            if len(old) < COMPACT_BATCH:
+                return
+
+    def read_changes(self, since: int, limit: int) -> Tuple[Optional[List[dict]], int]:
+        """
+        Changes after `since` as (changes, version to resume from), or
+        (None, current version) when the client needs a snapshot: first sync,
+        a version from before compaction, or one this log never issued.
+        Stops at the first missing version unless it is older than the grace period.
+        """
+        sequence = self.inner.get('sequences', SEQUENCE)
+        # Nothing logged yet, skip version 0 so a snapshot taken now has a version to resume from
+        current = sequence["value"] if sequence is not None else self._next_version()
+        # Compaction always keeps at least the newest max_entries versions
+        if since <= 0 or since > current or since < current - self.max_entries:
+            return None, current
+        rows = self.inner.list_range('changes', 'version', since, limit)
+        grace = (datetime.now() - timedelta(seconds=GAP_GRACE_SECONDS)).isoformat()
+        changes, cursor = [], since
+        for row in rows:
+            if row["version"] != cursor + 1 and (row.get("created_at") or "") > grace:
+                break
+            changes.append(row)
+            cursor = row["version"]
+        return changes, cursor
+
+    def touch(self, table: str, row_id: str):
+        """Log a row as rewritten, for changes that affect who sees it (e.g. channel membership)"""
+        row = self.inner.get(table, row_id)
+        if row is not None:
+            self._record(table, row_id, "upsert", row)
+
+    def list(self, table, filters=None, limit=None, columns=None):
+        return self.inner.list(table, filters, limit, columns)
+
+    def get(self, table, row_id, columns=None):
+        return self.inner.get(table, row_id, columns)
+
+    def get_many(self, table, row_ids, columns=None):
+        return self.inner.get_many(table, row_ids, columns)
+
+    def find_one(self, table, filters):
+        return self.inner.find_one(table, filters)
+
+    def iter_pages(self, table, filters=None, columns=None, page_size=1000):
+        return self.inner.iter_pages(table, filters, columns, page_size)
+
+    def list_range(self, table, column, after, limit=None):
+        return self.inner.list_range(table, column, after, limit)
+
+    def list_before(self, table, column, before, limit=None, columns=None):
+        return self.inner.list_before(table, column, before, limit, columns)
+
+    def list_recent(self, table, filters, limit, before=None, columns=None):
+        return self.inner.list_recent(table, filters, limit, before, columns)
+
+    def count(self, table):
+        return self.inner.count(table)
+
+    def next_sequence(self, name, start=0):
+        return self.inner.next_sequence(name, start)
+
+    def insert(self, table: str, row: dict) -> dict:
+        result = self.inner.insert(table, row)
+        self._record(table, result.get("id"), "upsert", result)
+        return result
+
+    def update(self, table: str, row_id: str, changes: dict) -> Optional[dict]:
+        result = self.inner.update(table, row_id, changes)
+        if result is not None:
+            self._record(table, row_id, "upsert", result)
+        return result
+
+    def delete(self, table: str, row_id: str) -> bool:
+        deleted = self.inner.delete(table, row_id)
+        if deleted:
+            self._record(table, row_id, "delete", None)
+        return deleted
+
+    def apply_changes(self, table: str, upserts: List[dict], delete_ids: List[str], scope: Optional[dict] = None):
+        result = self.inner.apply_changes(table, upserts, delete_ids, scope)
+        for row in upserts:
+            self._record(table, row["id"], "upsert", row)
+        for row_id in delete_ids:
+            self._record(table, row_id, "delete", None)
+        return result
@@ -0,0 +1,210 @@
+"""
+In-memory store for development and tests
+Rows live in per-table dicts keyed by id (insertion ordered). Indexed columns
+from the table definitions get hash indexes so filtered reads don't scan.
+Messages and events are kept as compact records (storage/records.py), every
+read hands out a fresh dict either way.
+"""
+import copy
+import threading
+from typing import Iterator, List, Optional, Tuple
+from .base import Store, check_columns, get_table, project_row
+from .records import RECORD_TYPES, Record
+from .seed import SEED_DATA
+from utils.metrics import track_backend_call
+
+class MemoryStore(Store):
+    name = "memory"
+
+    def __init__(self, seed: bool = True):
+        self._lock = threading.RLock()
+        self._rows = {}
+        # table -> column -> value -> {row_id: None} (dict used as an ordered set)
+        self._indexes = {}
+        if seed:
+            for table, rows in SEED_DATA.items():
+                for row in rows:
+                    self._put(table, copy.deepcopy(row))
+
+    def _table_rows(self, table: str) -> dict:
+        get_table(table)
+        return self._rows.setdefault(table, {})
+
+    def _column_index(self, table: str, column: str) -> dict:
+        return self._indexes.setdefault(table, {}).setdefault(column, {})
+
+    def _index_add(self, table: str, row: dict, previous: Optional[dict] = None):
+        for column in get_table(table).indexes:
+            if previous is not None and previous.get(column) == row.get(column):
+                continue
+            self._column_index(table, column).setdefault(row.get(column), {})[row["id"]] = None
+
+    def _index_remove(self, table: str, row: dict, current: Optional[dict] = None):
+        for column in get_table(table).indexes:
+            if current is not None and current.get(column) == row.get(column):
+                # An update keeping the value keeps the row's place in the bucket, like in rows
+                continue
+            bucket = self._column_index(table, column).get(row.get(column))
+            if bucket is not None:
+                bucket.pop(row["id"], None)
+                if not bucket:
+                    del self._column_index(table, column)[row.get(column)]
+
+    def _put(self, table: str, row: dict):
+        rows = self._table_rows(table)
+        previous = rows.get(row["id"])
+        if previous is not None:
+            self._index_remove(table, previous, row)
+        record_type = RECORD_TYPES.get(table)
+        rows[row["id"]] = record_type(row) if record_type is not None else row
+        self._index_add(table, row, previous)
+
+    def _ordered_ids(self, table: str, filters: Optional[dict]) -> dict:
+        """Ids of the rows to check against the filters in insertion order, an index bucket when possible"""
+        if filters:
+            for column in get_table(table).indexes:
+                if column in filters:
+                    return self._column_index(table, column).get(filters[column], {})
+        return self._table_rows(table)
+
+    def _candidates(self, table: str, filters: Optional[dict]):
+        """Rows to check against the filters, narrowed through an index when possible"""
+        rows = self._table_rows(table)
+        ids = self._ordered_ids(table, filters)
+        return rows.values() if ids is rows else [rows[row_id] for row_id in ids]
+
+    def _copy(self, row, columns: Optional[Tuple[str, ...]]) -> dict:
+        if columns is not None:
+            return {c: row.get(c) for c in columns}
+        return row.to_dict() if isinstance(row, Record) else dict(row)
+
+    def list(self, table: str, filters: Optional[dict] = None, limit: Optional[int] = None,
+             columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        columns = check_columns(get_table(table), columns)
+        with track_backend_call("memory", table, "select"), self._lock:
+            result = []
+            for row in self._candidates(table, filters):
+                if filters and any(row.get(k) != v for k, v in filters.items()):
+                    continue
+                result.append(self._copy(row, columns))
+                if limit is not None and len(result) >= limit:
+                    break
+            return result
+
+    def iter_pages(self, table: str, filters: Optional[dict] = None, columns: Optional[Tuple[str, ...]] = None,
+                   page_size: int = 1000) -> Iterator[List[dict]]:
+        columns = check_columns(get_table(table), columns)
+        with self._lock:
+            row_ids = [row["id"] for row in self._candidates(table, filters)]
+        for start in range(0, len(row_ids), page_size):
+            with track_backend_call("memory", table, "select"), self._lock:
+                rows = self._table_rows(table)
+                page = [rows.get(row_id) for row_id in row_ids[start:start + page_size]]
+                page = [self._copy(row, columns) for row in page
+                        if row is not None and not (filters and any(row.get(k) != v for k, v in filters.items()))]
+            if page:
+                yield page
+
+    def list_before(self, table: str, column: str, before, limit: Optional[int] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        definition = get_table(table)
+        check_columns(definition, (column,))
+        columns = check_columns(definition, columns)
+        with track_backend_call("memory", table, "select"), self._lock:
+            rows = self._table_rows(table)
+            if column in definition.indexes:
+                # Index buckets in value order, each bucket in insertion order
+                index = self._column_index(table, column)
+                values = sorted(value for value in index if value is not None and value < before)
+                candidates = (rows[row_id] for value in values for row_id in index[value])
+            else:
+                candidates = sorted((row for row in rows.values() if row.get(column) is not None and row[column] < before),
+                                    key=lambda row: row[column])
+            result = []
+            for row in candidates:
+                if limit is not None and len(result) >= limit:
+                    break
+                result.append(self._copy(row, columns))
+            return result
+
+    def list_recent(self, table: str, filters: Optional[dict], limit: int, before: Optional[str] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> Optional[List[dict]]:
+        columns = check_columns(get_table(table), columns)
+        with track_backend_call("memory", table, "select"), self._lock:
+            rows = self._table_rows(table)
+            result, found = [], before is None
+            # Newest first, stops once the page is full
+            for row_id in reversed(self._ordered_ids(table, filters)):
+                row = rows[row_id]
+                if filters and any(row.get(k) != v for k, v in filters.items()):
+                    continue
+                if not found:
+                    found = row_id == before
+                    continue
+                if len(result) >= limit:
+                    break
+                result.append(self._copy(row, columns))
+            if not found:
+                return None
+            result.reverse()
+            return result
+
+    def get(self, table: str, row_id: str, columns: Optional[Tuple[str, ...]] = None) -> Optional[dict]:
+        columns = check_columns(get_table(table), columns)
+        with track_backend_call("memory", table, "select"), self._lock:
+            row = self._table_rows(table).get(row_id)
+            return self._copy(row, columns) if row is not None else None
+
+    def get_many(self, table: str, row_ids: List[str], columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        columns = check_columns(get_table(table), columns)
+        with track_backend_call("memory", table, "select"), self._lock:
+            rows = self._table_rows(table)
+            return [self._copy(rows[row_id], columns) for row_id in dict.fromkeys(row_ids) if row_id in rows]
+
+    def insert(self, table: str, row: dict) -> dict:
+        with track_backend_call("memory", table, "insert"), self._lock:
+            row = project_row(get_table(table), row)
+            self._put(table, row)
+            return dict(row)
+
+    def update(self, table: str, row_id: str, changes: dict) -> Optional[dict]:
+        with track_backend_call("memory", table, "update"), self._lock:
+            existing = self._table_rows(table).get(row_id)
+            if existing is None:
+                return None
+            row = {**self._copy(existing, None), **project_row(get_table(table), changes), "id": row_id}
+            self._put(table, row)
+            return dict(row)
+
+    def delete(self, table: str, row_id: str) -> bool:
+        with track_backend_call("memory", table, "delete"), self._lock:
+            row = self._table_rows(table).pop(row_id, None)
+            if row is None:
+                return False
+            self._index_remove(table, row)
+            return True
+
+    def apply_changes(self, table: str, upserts: List[dict], delete_ids: List[str], scope: Optional[dict] = None):
+        with track_backend_call("memory", table, "apply_changes"), self._lock:
+            definition = get_table(table)
+            rows = self._table_rows(table)
+            for row in upserts:
+                existing = rows.get(row["id"])
+                self._put(table, {**(self._copy(existing, None) if existing is not None else {}),
+                                  **project_row(definition, row)})
+            for row_id in delete_ids:
+                row = rows.get(row_id)
+                if row is None or (scope and any(row.get(k) != v for k, v in scope.items())):
+                    continue
+                del rows[row_id]
+                self._index_remove(table, row)
+
+    def next_sequence(self, name: str, start: int = 0) -> int:
+        with track_backend_call("memory", "sequences", "update"), self._lock:
+            rows = self._table_rows('sequences')
+            value = (rows[name]["value"] if name in rows else start) + 1
+            rows[name] = {"id": name, "value": value}
+            return value
+
+    def count(self, table: str) -> int:
+        return len(self._table_rows(table))
@@ -0,0 +1,128 @@
+"""
+Compact in-memory rows for the largest tables
+The memory store keeps messages, events and the archive index as slotted
+records instead of dicts: no per-row hash table, and strings that repeat across rows (senders,
+roles, channel ids, attendee ids) are interned so every row points at one
+copy. A message stores the instant it was sent once, as epoch seconds of its
+naive local time; `timestamp` ("10:30 AM"), `time` ("10:30") and `date`
+("2025-10-22") are derived from it when the row is read. Messages whose
+display fields don't come from one instant keep them as given.
+Records are read through get() and to_dict(), like the dicts of other tables.
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+import sys
+from typing import Optional, Tuple
+from .base import get_table
+
+EPOCH = datetime(1970, 1, 1)
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+@lru_cache(maxsize=4096)
+def display_fields(at: int) -> Tuple[str, str, str]:
+    """(timestamp, time, date) of epoch seconds, consecutive messages mostly share a minute"""
+    moment = EPOCH + timedelta(seconds=at)
+    return moment.strftime("%I:%M %p"), moment.strftime("%H:%M"), moment.strftime("%Y-%m-%d")
+
+def _epoch(row: dict) -> Optional[int]:
+    """Epoch seconds the display fields of a message describe, None if they don't describe one instant"""
+    try:
+        at = (datetime.fromisoformat(f"{row['date']}T{row['time']}") - EPOCH) // timedelta(seconds=1)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return at if display_fields(at) == (row.get("timestamp"), row["time"], row["date"]) else None
+
+class Record:
+    __slots__ = ()
+    COLUMNS: Tuple[str, ...] = ()
+    # Columns stored as the slot of the same name, read with a plain getattr
+    STORED: frozenset = frozenset()
+
+    def get(self, column: str, default=None):
+        return getattr(self, column) if column in self.STORED else default
+
+    def __getitem__(self, column: str):
+        if column not in self.COLUMNS:
+            raise KeyError(column)
+        return self.get(column)
+
+    def to_dict(self) -> dict:
+        return {column: self.get(column) for column in self.COLUMNS}
+
+class MessageRecord(Record):
+    __slots__ = ("id", "channel_id", "sender", "role", "content", "at", "display", "read", "starred",
+                 "file_name", "file_type", "file_url", "reply_to_id")
+    COLUMNS = tuple(get_table('messages').columns)
+    DISPLAY = {"timestamp": 0, "time": 1, "date": 2}
+    STORED = frozenset(COLUMNS) - frozenset(DISPLAY)
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.channel_id = _intern(row.get("channel_id"))
+        self.sender = _intern(row.get("sender"))
+        self.role = _intern(row.get("role"))
+        self.content = row.get("content")
+        self.at = _epoch(row)
+        self.display = None if self.at is not None else tuple(_intern(row.get(c)) for c in self.DISPLAY)
+        self.read = row.get("read")
+        self.starred = row.get("starred")
+        self.file_name = row.get("file_name")
+        self.file_type = _intern(row.get("file_type"))
+        self.file_url = row.get("file_url")
+        self.reply_to_id = row.get("reply_to_id")
+
+    def _display(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        return display_fields(self.at) if self.at is not None else self.display
+
+    def get(self, column: str, default=None):
+        if column in self.STORED:
+            return getattr(self, column)
+        index = self.DISPLAY.get(column)
+        return default if index is None else self._display()[index]
+
+    def to_dict(self) -> dict:
+        timestamp, time, date = self._display()
+        return {
+            "id": self.id, "channel_id": self.channel_id, "sender": self.sender, "role": self.role,
+            "content": self.content, "timestamp": timestamp, "time": time, "date": date, "read": self.read,
+            "starred": self.starred, "file_name": self.file_name, "file_type": self.file_type,
+            "file_url": self.file_url, "reply_to_id": self.reply_to_id,
+        }
+
+class EventRecord(Record):
+    __slots__ = ("id", "title", "description", "date", "time", "cohort_id", "created_by", "attendees", "created_at")
+    COLUMNS = tuple(get_table('events').columns)
+    STORED = frozenset(COLUMNS) - {"attendees"}
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.title = row.get("title")
+        self.description = row.get("description")
+        self.date = _intern(row.get("date"))
+        self.time = _intern(row.get("time"))
+        self.cohort_id = _intern(row.get("cohort_id"))
+        self.created_by = _intern(row.get("created_by"))
+        # A tuple has no spare capacity, unlike a list that was appended to
+        attendees = row.get("attendees")
+        self.attendees = None if attendees is None else tuple(_intern(user_id) for user_id in attendees)
+        self.created_at = row.get("created_at")
+
+    def get(self, column: str, default=None):
+        if column == "attendees":
+            return None if self.attendees is None else list(self.attendees)
+        return super().get(column, default)
+
+class ArchivedMessageRecord(Record):
+    __slots__ = ("id", "block_id")
+    COLUMNS = tuple(get_table('archived_messages').columns)
+    STORED = frozenset(COLUMNS)
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        # Hundreds of messages share a block
+        self.block_id = _intern(row.get("block_id"))
+
+# Tables the memory store keeps as records, the others stay dicts
+RECORD_TYPES = {"messages": MessageRecord, "events": EventRecord, "archived_messages": ArchivedMessageRecord}
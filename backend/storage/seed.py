@@ -0,0 +1,249 @@
+"""
+Default data loaded into empty stores
+The in-memory and SQLite backends seed themselves from here, and
+utils/db_init.py seeds Supabase with the same rows.
+"""
+from datetime import datetime
+
+DEFAULT_CHANNELS = [
+    {
+        "id": "1",
+        "name": "Team Announcements",
+        "type": "team",
+        "unread": 3,
+        "last_message": "New cohort starting next month",
+        "last_message_time": "10:30 AM",
+        "online": True,
+        "typing": False,
+        "members_only": False,
+        "cohort_id": None,
+        "created_at": datetime.now().isoformat()
+    },
+    {
+        "id": "2",
+        "name": "Campus Leads - Telangana",
+        "type": "campus_leads",
+        "unread": 5,
+        "last_message": "Info session scheduled",
+        "last_message_time": "11:45 AM",
+        "online": True,
+        "typing": False,
+        "members_only": False,
+        "cohort_id": None,
+        "created_at": datetime.now().isoformat()
+    },
+    {
+        "id": "3",
+        "name": "Campus Leads - Maharashtra",
+        "type": "campus_leads",
+        "unread": 0,
+        "last_message": "Great turnout today!",
+        "last_message_time": "Yesterday",
+        "online": False,
+        "typing": False,
+        "members_only": False,
+        "cohort_id": None,
+        "created_at": datetime.now().isoformat()
+    },
+    {
+        "id": "4",
+        "name": "EVP A25 Coordinators",
+        "type": "general",
+        "unread": 2,
+        "last_message": "Interview dates confirmed",
+        "last_message_time": "9:15 AM",
+        "online": True,
+        "typing": False,
+        "members_only": False,
+        "cohort_id": "1",
+        "created_at": datetime.now().isoformat()
+    },
+    {
+        "id": "5",
+        "name": "EdAstra Team",
+        "type": "team",
+        "unread": 1,
+        "last_message": "Workshop materials ready",
+        "last_message_time": "2 days ago",
+        "online": False,
+        "typing": False,
+        "members_only": False,
+        "cohort_id": None,
+        "created_at": datetime.now().isoformat()
+    }
+]
+
+DEFAULT_MESSAGES = [
+    {
+        "id": "1",
+        "channel_id": "2",
+        "sender": "Sarah",
+        "role": "team",
+        "content": "Hi everyone! We have confirmed the dates for the EVP A25 preliminary interviews.",
+        "timestamp": "10:30 AM",
+        "time": "10:30",
+        "date": "2025-10-22",
+        "read": True,
+        "starred": False,
+        "file_name": None,
+        "file_type": None,
+        "file_url": None,
+        "reply_to_id": None
+    },
+    {
+        "id": "2",
+        "channel_id": "2",
+        "sender": "Priya",
+        "role": "campus_lead",
+        "content": "That's great! We have around 30 students interested from our campus.",
+        "timestamp": "10:35 AM",
+        "time": "10:35",
+        "date": "2025-10-22",
+        "read": True,
+        "starred": False,
+        "file_name": None,
+        "file_type": None,
+        "file_url": None,
+        "reply_to_id": None
+    },
+    {
+        "id": "3",
+        "channel_id": "2",
+        "sender": "Rahul",
+        "role": "campus_lead",
+        "content": "We organized an info session yesterday. Got excellent response with 45+ registrations!",
+        "timestamp": "10:42 AM",
+        "time": "10:42",
+        "date": "2025-10-22",
+        "read": True,
+        "starred": True,
+        "file_name": None,
+        "file_type": None,
+        "file_url": None,
+        "reply_to_id": None
+    }
+]
+
+DEFAULT_CAMPUS_LEADS = [
+    {
+        "id": "1",
+        "user_id": None,
+        "name": "Priya Sharma",
+        "college": "MS Degree College",
+        "location": "Hyderabad, Telangana",
+        "status": "Active",
+        "events_organized": 12,
+        "students_reached": 245,
+        "last_activity": "2 hours ago",
+        "performance": "Excellent"
+    },
+    {
+        "id": "2",
+        "user_id": None,
+        "name": "Rahul Verma",
+        "college": "IIT Bombay",
+        "location": "Mumbai, Maharashtra",
+        "status": "Active",
+        "events_organized": 18,
+        "students_reached": 320,
+        "last_activity": "5 hours ago",
+        "performance": "Excellent"
+    },
+    {
+        "id": "3",
+        "user_id": None,
+        "name": "Ananya Reddy",
+        "college": "NIT Warangal",
+        "location": "Warangal, Telangana",
+        "status": "Active",
+        "events_organized": 9,
+        "students_reached": 180,
+        "last_activity": "1 day ago",
+        "performance": "Good"
+    },
+    {
+        "id": "4",
+        "user_id": None,
+        "name": "Karthik Menon",
+        "college": "VIT Chennai",
+        "location": "Chennai, Tamil Nadu",
+        "status": "Active",
+        "events_organized": 15,
+        "students_reached": 290,
+        "last_activity": "3 hours ago",
+        "performance": "Excellent"
+    },
+    {
+        "id": "5",
+        "user_id": None,
+        "name": "Sneha Patel",
+        "college": "BITS Pilani",
+        "location": "Pilani, Rajasthan",
+        "status": "Inactive",
+        "events_organized": 6,
+        "students_reached": 125,
+        "last_activity": "1 week ago",
+        "performance": "Average"
+    }
+]
+
+DEFAULT_COHORTS = [
+    {
+        "id": "1",
+        "name": "EVP A25",
+        "program": "Pre-Incubation",
+        "status": "Active",
+        "start_date": "2025-01-15",
+        "end_date": "2025-04-30",
+        "participants": 45,
+        "progress": 65,
+        "milestones": ["Ideation", "Prototyping", "Market Research", "Pitch Preparation"],
+        "completed_milestones": 2,
+        "created_at": datetime.now().isoformat()
+    },
+    {
+        "id": "2",
+        "name": "EdAstra Batch 6",
+        "program": "Innovation Challenge",
+        "status": "Active",
+        "start_date": "2025-02-01",
+        "end_date": "2025-05-15",
+        "participants": 32,
+        "progress": 40,
+        "milestones": ["Team Formation", "Problem Identification", "Solution Design", "Demo Day"],
+        "completed_milestones": 1,
+        "created_at": datetime.now().isoformat()
+    },
+    {
+        "id": "3",
+        "name": "Tentative Sprint",
+        "program": "Advanced Incubation",
+        "status": "Planning",
+        "start_date": "2025-03-01",
+        "end_date": "2025-06-30",
+        "participants": 28,
+        "progress": 15,
+        "milestones": ["Onboarding", "Mentor Matching", "Development", "Launch"],
+        "completed_milestones": 0,
+        "created_at": datetime.now().isoformat()
+    }
+]
+
+DEFAULT_STATS = [
+    {"id": "c1", "category": "cohort", "label": "Total Participants", "value": "105", "number": 105, "value_format": "{}", "icon": "Users", "color": "text-cyan-600"},
+    {"id": "c2", "category": "cohort", "label": "Active Cohorts", "value": "3", "number": 3, "value_format": "{}", "icon": "TrendingUp", "color": "text-lime-600"},
+    {"id": "c3", "category": "cohort", "label": "Completion Rate", "value": "78%", "number": 78, "value_format": "{}%", "icon": "Target", "color": "text-purple-600"},
+    {"id": "c4", "category": "cohort", "label": "Success Stories", "value": "24", "number": 24, "value_format": "{}", "icon": "Award", "color": "text-orange-600"},
+    {"id": "l1", "category": "campus_lead", "label": "Telangana", "value": "15 leads", "number": 15, "value_format": "{} leads", "icon": "MapPin", "color": "text-cyan-600"},
+    {"id": "l2", "category": "campus_lead", "label": "Maharashtra", "value": "12 leads", "number": 12, "value_format": "{} leads", "icon": "MapPin", "color": "text-lime-600"},
+    {"id": "l3", "category": "campus_lead", "label": "Tamil Nadu", "value": "10 leads", "number": 10, "value_format": "{} leads", "icon": "MapPin", "color": "text-purple-600"},
+    {"id": "l4", "category": "campus_lead", "label": "Karnataka", "value": "8 leads", "number": 8, "value_format": "{} leads", "icon": "MapPin", "color": "text-orange-600"},
+]
+
+SEED_DATA = {
+    "channels": DEFAULT_CHANNELS,
+    "messages": DEFAULT_MESSAGES,
+    "campus_leads": DEFAULT_CAMPUS_LEADS,
+    "cohorts": DEFAULT_COHORTS,
+    "stats": DEFAULT_STATS,
+}
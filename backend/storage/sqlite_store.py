@@ -0,0 +1,335 @@
+"""
+SQLite store for durable single-node deployments
+- WAL journal mode so readers never block the writer
+- One index per indexed column from the table definitions
+- Columns added to a table definition later are added to existing databases
+  on startup, rows that predate them read the column as None
+- SQL text is generated once per statement shape and cached, so sqlite3's
+  per-connection statement cache reuses the prepared statements
+- A fixed-size connection pool shared by the event loop and worker threads
+"""
+from contextlib import contextmanager
+from functools import lru_cache
+import json
+import logging
+import queue
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+from .base import Store, TABLES, check_columns, get_table, project_row
+from .seed import SEED_DATA
+from utils.metrics import track_backend_call
+
+logger = logging.getLogger(__name__)
+
+SQL_TYPES = {"text": "TEXT", "int": "INTEGER", "real": "REAL", "bool": "INTEGER", "json": "TEXT"}
+
+def _encode(kind: str, value):
+    if value is None:
+        return None
+    if kind == "json":
+        return json.dumps(value)
+    if kind == "bool":
+        return int(bool(value))
+    return value
+
+def _decode(kind: str, value):
+    if value is None:
+        return None
+    if kind == "json":
+        return json.loads(value)
+    if kind == "bool":
+        return bool(value)
+    return value
+
+@lru_cache(maxsize=None)
+def _select_sql(table: str, columns: Tuple[str, ...], filter_columns: Tuple[str, ...], limited: bool) -> str:
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if filter_columns:
+        sql += " WHERE " + " AND ".join(f"{c} = ?" for c in filter_columns)
+    sql += " ORDER BY rowid"
+    if limited:
+        sql += " LIMIT ?"
+    return sql
+
+@lru_cache(maxsize=None)
+def _page_sql(table: str, columns: Tuple[str, ...], filter_columns: Tuple[str, ...]) -> str:
+    """Keyset pagination on rowid, every page is an index range scan however deep it is"""
+    conditions = [f"{c} = ?" for c in filter_columns] + ["rowid > ?"]
+    return f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE {' AND '.join(conditions)} ORDER BY rowid LIMIT ?"
+
+@lru_cache(maxsize=256)
+def _select_ids_sql(table: str, columns: Tuple[str, ...], count: int) -> str:
+    return f"SELECT {', '.join(columns)} FROM {table} WHERE id IN ({', '.join('?' for _ in range(count))})"
+
+# Ids per IN (...) query, well below SQLite's bound parameter limit
+_IDS_PER_QUERY = 500
+
+@lru_cache(maxsize=None)
+def _range_sql(table: str, column: str, limited: bool) -> str:
+    sql = f"SELECT {', '.join(TABLES[table].columns)} FROM {table} WHERE {column} > ? ORDER BY {column}"
+    if limited:
+        sql += " LIMIT ?"
+    return sql
+
+@lru_cache(maxsize=None)
+def _before_sql(table: str, column: str, columns: Tuple[str, ...], limited: bool) -> str:
+    sql = f"SELECT {', '.join(columns)} FROM {table} WHERE {column} < ? ORDER BY {column}, rowid"
+    if limited:
+        sql += " LIMIT ?"
+    return sql
+
+@lru_cache(maxsize=None)
+def _recent_sql(table: str, columns: Tuple[str, ...], filter_columns: Tuple[str, ...], bounded: bool) -> str:
+    """Newest rows first, a filtered index range scan backwards from the cursor row"""
+    conditions = [f"{c} = ?" for c in filter_columns] + (["rowid < ?"] if bounded else [])
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY rowid DESC LIMIT ?"
+
+_NEXT_SEQUENCE_SQL = "INSERT INTO sequences (id, value) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET value = value + 1"
+
+@lru_cache(maxsize=None)
+def _insert_sql(table: str, columns: Tuple[str, ...], upsert: bool) -> str:
+    placeholders = ", ".join("?" for _ in columns)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    if upsert:
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+        sql += f" ON CONFLICT(id) DO UPDATE SET {updates}" if updates else " ON CONFLICT(id) DO NOTHING"
+    return sql
+
+@lru_cache(maxsize=None)
+def _update_sql(table: str, columns: Tuple[str, ...]) -> str:
+    return f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?"
+
+@lru_cache(maxsize=None)
+def _delete_sql(table: str, scope_columns: Tuple[str, ...]) -> str:
+    sql = f"DELETE FROM {table} WHERE id = ?"
+    for column in scope_columns:
+        sql += f" AND {column} = ?"
+    return sql
+
+def _table_statements():
+    for table in TABLES.values():
+        columns = ", ".join(
+            f"{name} {SQL_TYPES[kind]}" + (" PRIMARY KEY" if name == table.primary_key else "")
+            for name, kind in table.columns.items()
+        )
+        yield f"CREATE TABLE IF NOT EXISTS {table.name} ({columns})"
+
+def _index_statements():
+    for table in TABLES.values():
+        for column in table.indexes:
+            unique = "UNIQUE " if column in table.unique else ""
+            yield f"CREATE {unique}INDEX IF NOT EXISTS idx_{table.name}_{column} ON {table.name}({column})"
+
+def _migration_statements(conn):
+    """ALTER TABLE statements adding columns of the table definitions that an existing database lacks"""
+    for table in TABLES.values():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table.name})")}
+        for name, kind in table.columns.items():
+            if name not in existing:
+                yield f"ALTER TABLE {table.name} ADD COLUMN {name} {SQL_TYPES[kind]}"
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self._connections = queue.Queue()
+        for _ in range(size):
+            self._connections.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get().close()
+
+class SQLiteStore(Store):
+    name = "sqlite"
+
+    def __init__(self, path: str, pool_size: int = 4, seed: bool = True):
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.transaction() as conn:
+            for statement in _table_statements():
+                conn.execute(statement)
+            for statement in list(_migration_statements(conn)):
+                logger.info(f"Migrating SQLite schema: {statement}")
+                conn.execute(statement)
+            # After the migration, an index may be on a column it just added
+            for statement in _index_statements():
+                conn.execute(statement)
+            if seed:
+                for table, rows in SEED_DATA.items():
+                    # Archived messages count too, or a fully archived history would be seeded again
+                    occupied = (table, "message_archives") if table == "messages" else (table,)
+                    if all(conn.execute(f"SELECT 1 FROM {name} LIMIT 1").fetchone() is None for name in occupied):
+                        for row in rows:
+                            self._insert(conn, table, row, upsert=False)
+                        logger.info(f"Default {table} inserted into SQLite")
+
+    def _row_to_dict(self, table: str, columns: Tuple[str, ...], values) -> dict:
+        kinds = TABLES[table].columns
+        return {name: _decode(kinds[name], value) for name, value in zip(columns, values)}
+
+    def _insert(self, conn, table: str, row: dict, upsert: bool):
+        definition = get_table(table)
+        row = project_row(definition, row)
+        columns = tuple(row)
+        params = [_encode(definition.columns[c], row[c]) for c in columns]
+        conn.execute(_insert_sql(table, columns, upsert), params)
+
+    def _select(self, conn, table: str, filters: Optional[dict], limit: Optional[int],
+                columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        definition = get_table(table)
+        columns = check_columns(definition, columns) or tuple(definition.columns)
+        filter_columns = tuple(filters or ())
+        for column in filter_columns:
+            if column not in definition.columns:
+                raise ValueError(f"Unknown column {column} for table {table}")
+        params = [_encode(definition.columns[c], filters[c]) for c in filter_columns]
+        if limit is not None:
+            params.append(limit)
+        cursor = conn.execute(_select_sql(table, columns, filter_columns, limit is not None), params)
+        return [self._row_to_dict(table, columns, values) for values in cursor.fetchall()]
+
+    def list(self, table: str, filters: Optional[dict] = None, limit: Optional[int] = None,
+             columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        with track_backend_call("sqlite", table, "select"), self.pool.connection() as conn:
+            return self._select(conn, table, filters, limit, columns)
+
+    def get(self, table: str, row_id: str, columns: Optional[Tuple[str, ...]] = None) -> Optional[dict]:
+        with track_backend_call("sqlite", table, "select"), self.pool.connection() as conn:
+            rows = self._select(conn, table, {"id": row_id}, 1, columns)
+            return rows[0] if rows else None
+
+    def get_many(self, table: str, row_ids: List[str], columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        definition = get_table(table)
+        columns = check_columns(definition, columns) or tuple(definition.columns)
+        row_ids = list(dict.fromkeys(row_ids))
+        rows = []
+        with track_backend_call("sqlite", table, "select"), self.pool.connection() as conn:
+            for start in range(0, len(row_ids), _IDS_PER_QUERY):
+                chunk = row_ids[start:start + _IDS_PER_QUERY]
+                cursor = conn.execute(_select_ids_sql(table, columns, len(chunk)), chunk)
+                rows += [self._row_to_dict(table, columns, values) for values in cursor.fetchall()]
+        return rows
+
+    def iter_pages(self, table: str, filters: Optional[dict] = None, columns: Optional[Tuple[str, ...]] = None,
+                   page_size: int = 1000) -> Iterator[List[dict]]:
+        definition = get_table(table)
+        columns = check_columns(definition, columns) or tuple(definition.columns)
+        filter_columns = tuple(filters or ())
+        check_columns(definition, filter_columns)
+        params = [_encode(definition.columns[c], filters[c]) for c in filter_columns]
+        sql = _page_sql(table, columns, filter_columns)
+        after = 0
+        while True:
+            # A connection per page, so a slow consumer never holds one from the pool
+            with track_backend_call("sqlite", table, "select"), self.pool.connection() as conn:
+                fetched = conn.execute(sql, [*params, after, page_size]).fetchall()
+            if not fetched:
+                return
+            after = fetched[-1][0]
+            yield [self._row_to_dict(table, columns, values[1:]) for values in fetched]
+            if len(fetched) < page_size:
+                return
+
+    def list_range(self, table: str, column: str, after, limit: Optional[int] = None) -> List[dict]:
+        definition = get_table(table)
+        check_columns(definition, (column,))
+        params = [_encode(definition.columns[column], after)] + ([limit] if limit is not None else [])
+        with track_backend_call("sqlite", table, "select"), self.pool.connection() as conn:
+            cursor = conn.execute(_range_sql(table, column, limit is not None), params)
+            return [self._row_to_dict(table, tuple(definition.columns), values) for values in cursor.fetchall()]
+
+    def list_before(self, table: str, column: str, before, limit: Optional[int] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        definition = get_table(table)
+        check_columns(definition, (column,))
+        columns = check_columns(definition, columns) or tuple(definition.columns)
+        params = [_encode(definition.columns[column], before)] + ([limit] if limit is not None else [])
+        with track_backend_call("sqlite", table, "select"), self.pool.connection() as conn:
+            cursor = conn.execute(_before_sql(table, column, columns, limit is not None), params)
+            return [self._row_to_dict(table, columns, values) for values in cursor.fetchall()]
+
+    def list_recent(self, table: str, filters: Optional[dict], limit: int, before: Optional[str] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> Optional[List[dict]]:
+        definition = get_table(table)
+        columns = check_columns(definition, columns) or tuple(definition.columns)
+        filter_columns = tuple(filters or ())
+        check_columns(definition, filter_columns)
+        params = [_encode(definition.columns[c], filters[c]) for c in filter_columns]
+        with track_backend_call("sqlite", table, "select"), self.pool.connection() as conn:
+            if before is not None:
+                cursor = conn.execute(_select_sql(table, ("rowid",), ("id", *filter_columns), True), [before, *params, 1])
+                found = cursor.fetchone()
+                if found is None:
+                    return None
+                params.append(found[0])
+            cursor = conn.execute(_recent_sql(table, columns, filter_columns, before is not None), [*params, limit])
+            rows = [self._row_to_dict(table, columns, values) for values in cursor.fetchall()]
+        rows.reverse()
+        return rows
+
+    def insert(self, table: str, row: dict) -> dict:
+        with track_backend_call("sqlite", table, "insert"), self.pool.connection() as conn:
+            self._insert(conn, table, row, upsert=False)
+        return project_row(get_table(table), row)
+
+    def update(self, table: str, row_id: str, changes: dict) -> Optional[dict]:
+        definition = get_table(table)
+        changes = {k: v for k, v in project_row(definition, changes).items() if k != "id"}
+        with track_backend_call("sqlite", table, "update"), self.pool.transaction() as conn:
+            if changes:
+                columns = tuple(changes)
+                params = [_encode(definition.columns[c], changes[c]) for c in columns] + [row_id]
+                if conn.execute(_update_sql(table, columns), params).rowcount == 0:
+                    return None
+            rows = self._select(conn, table, {"id": row_id}, 1)
+            return rows[0] if rows else None
+
+    def delete(self, table: str, row_id: str) -> bool:
+        with track_backend_call("sqlite", table, "delete"), self.pool.connection() as conn:
+            return conn.execute(_delete_sql(get_table(table).name, ()), [row_id]).rowcount > 0
+
+    def apply_changes(self, table: str, upserts: List[dict], delete_ids: List[str], scope: Optional[dict] = None):
+        definition = get_table(table)
+        scope_columns = tuple(scope or ())
+        scope_params = [_encode(definition.columns[c], scope[c]) for c in scope_columns]
+        with track_backend_call("sqlite", table, "apply_changes"), self.pool.transaction() as conn:
+            for row in upserts:
+                self._insert(conn, table, row, upsert=True)
+            if delete_ids:
+                conn.executemany(_delete_sql(table, scope_columns), [[row_id, *scope_params] for row_id in delete_ids])
+
+    def next_sequence(self, name: str, start: int = 0) -> int:
+        with track_backend_call("sqlite", "sequences", "update"), self.pool.transaction() as conn:
+            conn.execute(_NEXT_SEQUENCE_SQL, [name, start + 1])
+            return conn.execute("SELECT value FROM sequences WHERE id = ?", [name]).fetchone()[0]
+
+    def count(self, table: str) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {get_table(table).name}").fetchone()[0]
@@ -0,0 +1,216 @@
+"""
+Supabase store and the in-memory fallback wrapper
+SupabaseStore maps the Store interface onto postgrest queries. FallbackStore
+keeps the original development behaviour: when Supabase is unreachable or a
+query fails, the request is served from the in-memory store instead.
+"""
+import logging
+from typing import Callable, Iterator, List, Optional, Tuple
+from .base import Store, check_columns, get_table, project_row
+
+logger = logging.getLogger(__name__)
+
+class SupabaseStore(Store):
+    name = "supabase"
+
+    def __init__(self, get_client: Callable):
+        self._get_client = get_client
+
+    def _client(self):
+        client = self._get_client()
+        if client is None:
+            raise RuntimeError("Supabase client not available")
+        return client
+
+    def _projection(self, table: str, columns: Optional[Tuple[str, ...]]) -> str:
+        columns = check_columns(get_table(table), columns)
+        return ','.join(columns) if columns else '*'
+
+    def list(self, table: str, filters: Optional[dict] = None, limit: Optional[int] = None,
+             columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        query = self._client().table(table).select(self._projection(table, columns))
+        for column, value in (filters or {}).items():
+            query = query.eq(column, value)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.order(get_table(table).order_by).execute().data or []
+
+    def get(self, table: str, row_id: str, columns: Optional[Tuple[str, ...]] = None) -> Optional[dict]:
+        response = self._client().table(table).select(self._projection(table, columns)).eq('id', row_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    def get_many(self, table: str, row_ids: List[str], columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        if not row_ids:
+            return []
+        response = self._client().table(table).select(self._projection(table, columns)).in_('id', list(dict.fromkeys(row_ids))).execute()
+        return response.data or []
+
+    def iter_pages(self, table: str, filters: Optional[dict] = None, columns: Optional[Tuple[str, ...]] = None,
+                   page_size: int = 1000) -> Iterator[List[dict]]:
+        order_by = get_table(table).order_by
+        offset = 0
+        while True:
+            query = self._client().table(table).select(self._projection(table, columns))
+            for column, value in (filters or {}).items():
+                query = query.eq(column, value)
+            # id breaks ties, so pages neither overlap nor skip rows
+            query = query.order(order_by) if order_by == 'id' else query.order(order_by).order('id')
+            page = query.range(offset, offset + page_size - 1).execute().data or []
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def list_range(self, table: str, column: str, after, limit: Optional[int] = None) -> List[dict]:
+        check_columns(get_table(table), (column,))
+        query = self._client().table(table).select('*').gt(column, after).order(column)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data or []
+
+    def list_before(self, table: str, column: str, before, limit: Optional[int] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        order_by = get_table(table).order_by
+        check_columns(get_table(table), (column,))
+        query = self._client().table(table).select(self._projection(table, columns)).lt(column, before).order(column)
+        if order_by != column:
+            query = query.order(order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data or []
+
+    def list_recent(self, table: str, filters: Optional[dict], limit: int, before: Optional[str] = None,
+                    columns: Optional[Tuple[str, ...]] = None) -> Optional[List[dict]]:
+        order_by = get_table(table).order_by
+        columns = check_columns(get_table(table), columns)
+        # Rows are ordered by (order_by, id), both are read for the cursor and dropped again
+        projection = ','.join(dict.fromkeys(('id', order_by, *columns))) if columns else '*'
+
+        def query():
+            query = self._client().table(table).select(projection)
+            for column, value in (filters or {}).items():
+                query = query.eq(column, value)
+            return query
+
+        if before is None:
+            rows = query().order(order_by, desc=True).order('id', desc=True).limit(limit).execute().data or []
+        else:
+            cursor = query().eq('id', before).limit(1).execute().data
+            if not cursor:
+                return None
+            at = cursor[0][order_by]
+            # Rows sharing the cursor's order_by value first, then older ones
+            rows = query().eq(order_by, at).lt('id', before).order('id', desc=True).limit(limit).execute().data or []
+            if len(rows) < limit:
+                rows += query().lt(order_by, at).order(order_by, desc=True).order('id', desc=True) \
+                    .limit(limit - len(rows)).execute().data or []
+        rows.reverse()
+        return [{c: row.get(c) for c in columns} for row in rows] if columns else rows
+
+    def insert(self, table: str, row: dict) -> dict:
+        row = project_row(get_table(table), row)
+        response = self._client().table(table).insert(row).execute()
+        return response.data[0] if response.data else row
+
+    def update(self, table: str, row_id: str, changes: dict) -> Optional[dict]:
+        changes = project_row(get_table(table), changes)
+        response = self._client().table(table).update(changes).eq('id', row_id).execute()
+        return response.data[0] if response.data else None
+
+    def delete(self, table: str, row_id: str) -> bool:
+        get_table(table)
+        response = self._client().table(table).delete().eq('id', row_id).execute()
+        return bool(response.data)
+
+    def apply_changes(self, table: str, upserts: List[dict], delete_ids: List[str], scope: Optional[dict] = None):
+        definition = get_table(table)
+        upserts = [project_row(definition, row) for row in upserts]
+        if table == "stats" and scope and "category" in scope:
+            # Single transaction through the apply_stats_diff function (SUPABASE_SETUP.sql)
+            self._client().rpc('apply_stats_diff', {
+                "p_category": scope["category"],
+                "p_upserts": upserts,
+                "p_delete_ids": delete_ids
+            }).execute()
+            return
+        # No server-side function for other tables, upsert first so rows never disappear
+        if upserts:
+            self._client().table(table).upsert(upserts).execute()
+        if delete_ids:
+            query = self._client().table(table).delete().in_('id', delete_ids)
+            for column, value in (scope or {}).items():
+                query = query.eq(column, value)
+            query.execute()
+
+    def next_sequence(self, name: str, start: int = 0) -> int:
+        # One statement through the next_sequence function (SUPABASE_SETUP.sql)
+        response = self._client().rpc('next_sequence', {"p_name": name, "p_start": start}).execute()
+        return int(response.data)
+
+class FallbackStore(Store):
+    """Serve from `primary`, falling back to `fallback` whenever a call raises"""
+
+    def __init__(self, primary: Store, fallback: Store):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+
+    def _call(self, method: str, table: str, *args, **kwargs):
+        try:
+            return getattr(self.primary, method)(table, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error in {self.primary.name} {method} on {table}, using in-memory storage: {e}")
+            return getattr(self.fallback, method)(table, *args, **kwargs)
+
+    def list(self, table, filters=None, limit=None, columns=None):
+        return self._call("list", table, filters, limit, columns)
+
+    def get(self, table, row_id, columns=None):
+        return self._call("get", table, row_id, columns)
+
+    def get_many(self, table, row_ids, columns=None):
+        return self._call("get_many", table, row_ids, columns)
+
+    def find_one(self, table, filters):
+        return self._call("find_one", table, filters)
+
+    def iter_pages(self, table, filters=None, columns=None, page_size=1000):
+        # Pages are read lazily, so only a failure before the first page can still fall back
+        pages = self.primary.iter_pages(table, filters, columns, page_size)
+        try:
+            first = next(pages, None)
+        except Exception as e:
+            logger.error(f"Error in {self.primary.name} iter_pages on {table}, using in-memory storage: {e}")
+            yield from self.fallback.iter_pages(table, filters, columns, page_size)
+            return
+        if first is not None:
+            yield first
+            yield from pages
+
+    def list_range(self, table, column, after, limit=None):
+        return self._call("list_range", table, column, after, limit)
+
+    def list_before(self, table, column, before, limit=None, columns=None):
+        return self._call("list_before", table, column, before, limit, columns)
+
+    def list_recent(self, table, filters, limit, before=None, columns=None):
+        return self._call("list_recent", table, filters, limit, before, columns)
+
+    def insert(self, table, row):
+        return self._call("insert", table, row)
+
+    def update(self, table, row_id, changes):
+        return self._call("update", table, row_id, changes)
+
+    def delete(self, table, row_id):
+        return self._call("delete", table, row_id)
+
+    def apply_changes(self, table, upserts, delete_ids, scope=None):
+        return self._call("apply_changes", table, upserts, delete_ids, scope)
+
+    def next_sequence(self, name, start=0):
+        return self._call("next_sequence", name, start)
+
+    def count(self, table):
+        return self._call("count", table)
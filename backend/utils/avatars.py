@@ -0,0 +1,120 @@
+"""
+Profile avatars
+Uploads are decoded, cropped to a square and resized to every size in
+AVATAR_SIZES in the jobs process pool, so the event loop never decodes an
+image. Thumbnails are WebP files named after the SHA-256 of the uploaded
+bytes, under `avatar_dir/<first two hex digits>/`: the same upload is only
+processed once, files never change once written, and their URLs can be
+cached forever. Served thumbnails are kept in a byte-bounded LRU per worker.
+"""
+from collections import OrderedDict
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+from PIL import Image, ImageOps
+from .config import settings
+from .metrics import registry
+
+# Thumbnail edge lengths in pixels
+AVATAR_SIZES = (32, 64, 128, 256)
+
+# Formats accepted for uploads
+UPLOAD_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+
+# Larger images are rejected before decoding (decompression bombs)
+MAX_PIXELS = 40_000_000
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+avatar_cache_total = registry.counter("avatar_cache_total", "Avatar thumbnail lookups", ("result",))
+
+def avatar_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def avatar_path(digest: str, size: int) -> str:
+    return os.path.join(settings.avatar_dir, digest[:2], f"{digest}-{size}.webp")
+
+def render_avatar(data: bytes) -> Dict[int, bytes]:
+    """Thumbnails of an uploaded image by size, raises ValueError for anything that isn't a supported image"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format not in UPLOAD_FORMATS:
+            raise ValueError(f"Unsupported image format {image.format}")
+        if image.width * image.height > MAX_PIXELS:
+            raise ValueError("Image is too large")
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError("Not a valid image") from e
+    edge = min(image.size)
+    square = ImageOps.fit(image, (edge, edge), method=Image.Resampling.LANCZOS)
+    thumbnails = {}
+    # Largest first, each size is resized from the previous one
+    for size in sorted(AVATAR_SIZES, reverse=True):
+        square = square.resize((size, size), Image.Resampling.LANCZOS) if square.width > size else square
+        out = io.BytesIO()
+        square.save(out, "WEBP", quality=85, method=4)
+        thumbnails[size] = out.getvalue()
+    return thumbnails
+
+def has_avatar(digest: str) -> bool:
+    return all(os.path.exists(avatar_path(digest, size)) for size in AVATAR_SIZES)
+
+def write_avatar(digest: str, thumbnails: Dict[int, bytes]):
+    """Write thumbnails atomically, readers never see a partial file"""
+    directory = os.path.dirname(avatar_path(digest, AVATAR_SIZES[0]))
+    os.makedirs(directory, exist_ok=True)
+    for size, data in thumbnails.items():
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, avatar_path(digest, size))
+        thumbnail_cache.put((digest, size), data)
+
+def cached_thumbnail(digest: str, size: int) -> Optional[bytes]:
+    data = thumbnail_cache.get((digest, size))
+    avatar_cache_total.inc("hit" if data is not None else "miss")
+    return data
+
+def load_thumbnail(digest: str, size: int) -> Optional[bytes]:
+    """Read a thumbnail from disk into the cache, None if it doesn't exist"""
+    try:
+        with open(avatar_path(digest, size), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    thumbnail_cache.put((digest, size), data)
+    return data
+
+class ThumbnailCache:
+    """LRU of thumbnail bytes bounded by their total size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int]) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: Tuple[str, int], data: bytes):
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+thumbnail_cache = ThumbnailCache(settings.avatar_cache_bytes)
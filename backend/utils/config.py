@@ -8,6 +8,87 @@ class Settings(BaseSettings):
     jwt_secret_key: str = "secret_key_for_jwt_tokens_change_in_production"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 43200
+    # Threads reserved for bcrypt, each hash takes tens of milliseconds
+    password_hash_workers: int = 2
+    storage_backend: str = "supabase"  # 'supabase', 'sqlite' or 'memory'
+    sqlite_path: str = "edventure.db"
+    sqlite_pool_size: int = 4
+    # Multi-worker mode: state lives in the shared store, each worker caches reads locally
+    workers: int = 1
+    read_cache_enabled: bool = False
+    shared_state_path: str = "edventure.versions"
+    # Change log for GET /api/sync, clients further behind than max entries get a snapshot
+    change_log_enabled: bool = True
+    change_log_max_entries: int = 10000
+    # Rate limits as "<requests>/<seconds>", empty to disable a rule
+    rate_limit_enabled: bool = True
+    rate_limit_login_per_ip: str = "20/60"
+    rate_limit_login_per_user: str = "5/60"
+    rate_limit_register_per_ip: str = "5/60"
+    rate_limit_send_message_per_ip: str = "120/60"
+    rate_limit_send_message_per_user: str = "30/10"
+    rate_limit_state_path: str = "edventure.ratelimit"
+    # Reverse proxies in front of the API that append to X-Forwarded-For, 0 when clients connect directly
+    trusted_proxy_count: int = 0
+    # Token revocation: Bloom filter sized for this many revoked tokens (it grows past it)
+    revocation_bloom_capacity: int = 100000
+    revocation_error_rate: float = 0.01
+    revocation_prune_seconds: int = 3600
+    revocation_state_path: str = "edventure.revocations"
+    # Channel membership: ring of recent membership changes shared by workers, replayed by the others
+    channel_directory_state_path: str = "edventure.channels"
+    # Cohort progress history: generation counter shared by workers, bumped on every sample
+    progress_history_state_path: str = "edventure.progress"
+    # Stats history: every category is snapshotted once per interval, trends compare the snapshots
+    stats_snapshots_enabled: bool = True
+    stats_snapshot_interval_seconds: int = 86400
+    stats_history_state_path: str = "edventure.stats"
+    # Idempotency-Key on create endpoints: responses kept for the TTL, duplicates wait up to wait_seconds
+    idempotency_ttl_seconds: int = 86400
+    idempotency_cache_size: int = 10000
+    idempotency_wait_seconds: float = 10
+    idempotency_lock_path: str = "edventure.idempotency.lock"
+    idempotency_purge_interval_seconds: int = 3600  # Expired keys of every worker are deleted this often
+    # Avatars: thumbnails on local disk (shared by the workers of a host), hot ones cached in memory
+    avatar_dir: str = "avatars"
+    avatar_max_upload_bytes: int = 5 * 1024 * 1024
+    avatar_cache_bytes: int = 32 * 1024 * 1024
+    # Background jobs: bounded queues per lane, "cpu" jobs run in a process pool
+    jobs_io_workers: int = 4
+    jobs_cpu_workers: int = 1
+    jobs_queue_size: int = 1000
+    jobs_retry_base_seconds: float = 0.5
+    jobs_retry_max_seconds: float = 60
+    jobs_lock_path: str = "edventure.jobs.lock"
+    # Event and cohort reminders posted to a chat channel
+    reminders_enabled: bool = True
+    reminders_channel_id: str = "1"
+    reminders_sender: str = "EdVenture Reminders"
+    event_reminder_lead_minutes: int = 60
+    reminder_default_time: str = "09:00"  # For dates without a time
+    # Presence: entries expire after the TTL, pings within the coalesce window of a refresh are dropped
+    presence_ttl_seconds: float = 45
+    presence_coalesce_seconds: float = 15
+    typing_ttl_seconds: float = 6
+    typing_coalesce_seconds: float = 2
+    presence_state_path: str = "edventure.presence"  # Shared by the workers, with the .online/.typing suffixes
+    # Message retention: older messages move to compressed archive blocks, still readable via history pages
+    message_retention_enabled: bool = True
+    message_hot_days: int = 90
+    message_archive_block_size: int = 500
+    message_archive_interval_seconds: int = 3600
+    message_archive_cache_blocks: int = 16
+    message_archive_lock_path: str = "edventure.archive.lock"
+    db_init_in_background: bool = True
+    metrics_enabled: bool = True
+    # Comma-separated client addresses that may read /metrics without a team token, none by default
+    metrics_allowed_ips: str = ""
+    profiling_enabled: bool = False
+    profiling_header: str = "X-Profile"
+    profiling_output_dir: str = "profiles"
+    profiling_max_profiles: int = 100  # Older request profiles are deleted
+    sampling_profiler_interval_ms: int = 10
+    sampling_profiler_max_seconds: int = 60
     
     class Config:
         env_file = ".env"
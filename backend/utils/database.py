@@ -1,5 +1,12 @@
 from supabase import create_client, Client
 from .config import settings
+from .metrics import InstrumentedClient
+from storage.base import Store
+from storage.cached_store import CachedStore, SharedVersions
+from storage.changelog import ChangeLogStore
+from storage.memory_store import MemoryStore
+from storage.sqlite_store import SQLiteStore
+from storage.supabase_store import SupabaseStore, FallbackStore
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,10 +14,12 @@ logger = logging.getLogger(__name__)
 class Database:
     def __init__(self):
         self.client: Client = None
+        self.store: Store = None
         
     def connect(self):
         try:
-            self.client = create_client(settings.supabase_url, settings.supabase_key)
+            # Every query made through the client is timed for /metrics
+            self.client = InstrumentedClient(create_client(settings.supabase_url, settings.supabase_key))
             logger.info("Successfully connected to Supabase")
         except Exception as e:
             logger.error(f"Failed to connect to Supabase: {e}")
@@ -22,8 +31,36 @@ class Database:
         if self.client is None:
             self.connect()
         return self.client
+    
+    def get_store(self) -> Store:
+        if self.store is None:
+            self.store = create_store(settings.storage_backend)
+        return self.store
+
+def create_store(backend: str) -> Store:
+    if backend == "memory":
+        if settings.workers > 1:
+            raise ValueError("The memory storage backend cannot be shared between workers, use sqlite or supabase")
+        store = MemoryStore()
+    elif backend == "sqlite":
+        store = SQLiteStore(settings.sqlite_path, pool_size=settings.sqlite_pool_size)
+    elif backend == "supabase":
+        # Fall back to in-memory storage when Supabase is unavailable (development)
+        store = FallbackStore(SupabaseStore(get_db), MemoryStore())
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if settings.read_cache_enabled and backend != "memory":
+        # Only safe when every writer goes through this API, writes bump the shared table versions
+        store = CachedStore(store, SharedVersions(settings.shared_state_path))
+    if settings.change_log_enabled:
+        # Outside the cache, so change log writes invalidate cached reads of the log
+        store = ChangeLogStore(store, max_entries=settings.change_log_max_entries)
+    return store
 
 db = Database()
 
 def get_db():
-    return db.get_client()
\ No newline at end of file
+    return db.get_client()
+
+def get_store() -> Store:
+    return db.get_store()
@@ -1,16 +1,55 @@
 """
 Database initialization script for Supabase
 Creates all necessary tables and initial data
+
+Startup only pays for a single cheap lookup of the seed version marker in
+`schema_meta`. The per-table seeding checks run concurrently and only when the
+marker is missing or older than SEED_VERSION.
 """
 from .database import get_db
+from storage.seed import DEFAULT_STATS, DEFAULT_COHORTS, DEFAULT_CAMPUS_LEADS, DEFAULT_CHANNELS, DEFAULT_MESSAGES
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
-def initialize_database():
+# Bump when the default seed data in storage/seed.py changes
+SEED_VERSION = 2
+SEED_VERSION_KEY = "seed_version"
+
+def _get_seed_version(db) -> int:
+    response = db.table('schema_meta').select('value').eq('key', SEED_VERSION_KEY).limit(1).execute()
+    if response.data:
+        return int(response.data[0]["value"])
+    return 0
+
+def _set_seed_version(db, version: int):
+    db.table('schema_meta').upsert({"key": SEED_VERSION_KEY, "value": str(version)}).execute()
+
+def _seed_table(db, table: str, default_rows: list) -> bool:
+    """
+    Insert default rows into a table if it is empty.
+    Only a single id is fetched to check for existing rows.
+    """
+    try:
+        response = db.table(table).select('id').limit(1).execute()
+        if not response.data:
+            db.table(table).insert(default_rows).execute()
+            logger.info(f"Default {table} inserted")
+        return True
+    except Exception as e:
+        logger.info(f"{table.capitalize()} table handling: {e}")
+        return False
+
+async def _seed_channels(db) -> bool:
+    channels_ok = await asyncio.to_thread(_seed_table, db, 'channels', DEFAULT_CHANNELS)
+    messages_ok = await asyncio.to_thread(_seed_table, db, 'messages', DEFAULT_MESSAGES)
+    return channels_ok and messages_ok
+
+async def initialize_database():
     """
     Initialize database tables in Supabase
-    This will create all necessary tables if they don't exist
+    This will seed default data if the stored seed version is outdated
     """
     try:
         db = get_db()
@@ -18,77 +57,32 @@ def initialize_database():
             logger.warning("Database client not available. Skipping initialization.")
             return False
         
-        logger.info("Database initialization started...")
-        
-        # Check if tables exist by trying to query them
-        # If they don't exist, Supabase will return an error
-        
-        # Initialize stats with default data if table is empty
         try:
-            stats_response = db.table('stats').select('*').execute()
-            if not stats_response.data:
-                # Insert default stats
-                default_stats = [
-                    {"category": "cohort", "label": "Total Participants", "value": "105", "icon": "Users", "color": "text-cyan-600"},
-                    {"category": "cohort", "label": "Active Cohorts", "value": "3", "icon": "TrendingUp", "color": "text-lime-600"},
-                    {"category": "cohort", "label": "Completion Rate", "value": "78%", "icon": "Target", "color": "text-purple-600"},
-                    {"category": "cohort", "label": "Success Stories", "value": "24", "icon": "Award", "color": "text-orange-600"},
-                    {"category": "campus_lead", "label": "Telangana", "value": "15 leads", "icon": "MapPin", "color": "text-cyan-600"},
-                    {"category": "campus_lead", "label": "Maharashtra", "value": "12 leads", "icon": "MapPin", "color": "text-lime-600"},
-                    {"category": "campus_lead", "label": "Tamil Nadu", "value": "10 leads", "icon": "MapPin", "color": "text-purple-600"},
-                    {"category": "campus_lead", "label": "Karnataka", "value": "8 leads", "icon": "MapPin", "color": "text-orange-600"},
-                ]
-                db.table('stats').insert(default_stats).execute()
-                logger.info("Default stats inserted")
+            current_version = await asyncio.to_thread(_get_seed_version, db)
         except Exception as e:
-            logger.info(f"Stats table handling: {e}")
+            # schema_meta missing, fall back to checking the tables themselves
+            logger.info(f"Seed version lookup failed: {e}")
+            current_version = 0
         
-        # Initialize cohorts with default data if table is empty
-        try:
-            cohorts_response = db.table('cohorts').select('*').execute()
-            if not cohorts_response.data:
-                default_cohorts = [
-                    {
-                        "id": "1",
-                        "name": "EVP A25",
-                        "program": "Pre-Incubation",
-                        "status": "Active",
-                        "start_date": "2025-01-15",
-                        "end_date": "2025-04-30",
-                        "participants": 45,
-                        "progress": 65,
-                        "milestones": ["Ideation", "Prototyping", "Market Research", "Pitch Preparation"],
-                        "completed_milestones": 2
-                    },
-                    {
-                        "id": "2",
-                        "name": "EdAstra Batch 6",
-                        "program": "Innovation Challenge",
-                        "status": "Active",
-                        "start_date": "2025-02-01",
-                        "end_date": "2025-05-15",
-                        "participants": 32,
-                        "progress": 40,
-                        "milestones": ["Team Formation", "Problem Identification", "Solution Design", "Demo Day"],
-                        "completed_milestones": 1
-                    },
-                    {
-                        "id": "3",
-                        "name": "Tentative Sprint",
-                        "program": "Advanced Incubation",
-                        "status": "Planning",
-                        "start_date": "2025-03-01",
-                        "end_date": "2025-06-30",
-                        "participants": 28,
-                        "progress": 15,
-                        "milestones": ["Onboarding", "Mentor Matching", "Development", "Launch"],
-                        "completed_milestones": 0
-                    }
-                ]
-                db.table('cohorts').insert(default_cohorts).execute()
-                logger.info("Default cohorts inserted")
-        except Exception as e:
-            logger.info(f"Cohorts table handling: {e}")
+        if current_version >= SEED_VERSION:
+            logger.info(f"Database seed is up to date (version {current_version})")
+            return True
+        
+        logger.info("Database initialization started...")
+        
+        # Check and seed the tables concurrently, messages reference channels so they go after them
+        results = await asyncio.gather(
+            asyncio.to_thread(_seed_table, db, 'stats', DEFAULT_STATS),
+            asyncio.to_thread(_seed_table, db, 'cohorts', DEFAULT_COHORTS),
+            asyncio.to_thread(_seed_table, db, 'campus_leads', DEFAULT_CAMPUS_LEADS),
+            _seed_channels(db),
+        )
+        
+        if all(results):
+            try:
+                await asyncio.to_thread(_set_seed_version, db, SEED_VERSION)
+            except Exception as e:
+                logger.info(f"Seed version update failed: {e}")
         
         logger.info("Database initialization completed successfully")
         return True
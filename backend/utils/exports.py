@@ -0,0 +1,95 @@
+"""
+Streaming exports
+Rows come from generators reading the store page by page and are encoded
+into chunks of about EXPORT_CHUNK_BYTES, optionally gzipped as they go, so an
+export holds one page and one chunk at a time however large it is.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, List, Optional, Sequence
+from storage.base import Store
+from .metrics import registry
+from .retention import iter_history
+
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+TRANSCRIPT_COLUMNS = (
+    "id", "date", "time", "timestamp", "sender", "role", "content", "reply_to_id", "starred", "file_name",
+    "file_type", "file_url",
+)
+
+COHORT_REPORT_COLUMNS = (
+    "id", "name", "program", "status", "start_date", "end_date", "participants", "progress", "milestones",
+    "completed_milestones", "events", "created_at",
+)
+
+export_rows_total = registry.counter("export_rows_total", "Rows written to exports", ("export",))
+
+def csv_chunks(columns: Sequence[str], pages: Iterable[List[dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for page in pages:
+        for row in page:
+            writer.writerow(["" if row.get(column) is None else row[column] for column in columns])
+            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def jsonl_chunks(columns: Sequence[str], pages: Iterable[List[dict]]) -> Iterator[bytes]:
+    lines, size = [], 0
+    for page in pages:
+        for row in page:
+            line = json.dumps({column: row.get(column) for column in columns}, separators=(",", ":")) + "\n"
+            lines.append(line)
+            size += len(line)
+            if size >= EXPORT_CHUNK_BYTES:
+                yield "".join(lines).encode()
+                lines, size = [], 0
+    if lines:
+        yield "".join(lines).encode()
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a stream of chunks, compressed output is passed on as soon as zlib emits it"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def _counted(export: str, pages: Iterable[List[dict]]) -> Iterator[List[dict]]:
+    for page in pages:
+        export_rows_total.inc(export, amount=len(page))
+        yield page
+
+def transcript_chunks(store: Store, channel_id: str, format: str, start: Optional[str] = None,
+                      end: Optional[str] = None) -> Iterator[bytes]:
+    """A channel's messages oldest first as CSV or JSONL, dates are YYYY-MM-DD and inclusive"""
+    pages = _counted("transcript", iter_history(store, channel_id, start, end))
+    if format == "jsonl":
+        return jsonl_chunks(("channel_id", *TRANSCRIPT_COLUMNS), pages)
+    return csv_chunks(TRANSCRIPT_COLUMNS, pages)
+
+def _cohort_pages(store: Store, start: Optional[str], end: Optional[str]) -> Iterator[List[dict]]:
+    events = {}
+    for page in store.iter_pages('events', columns=("cohort_id",)):
+        for row in page:
+            if row["cohort_id"]:
+                events[row["cohort_id"]] = events.get(row["cohort_id"], 0) + 1
+    for page in store.iter_pages('cohorts'):
+        yield [
+            {**cohort, "milestones": "; ".join(cohort.get("milestones") or []), "events": events.get(cohort["id"], 0)}
+            for cohort in page
+            # Cohorts running at any point between start and end
+            if (start is None or (cohort.get("end_date") or "9999") >= start)
+            and (end is None or (cohort.get("start_date") or "") <= end)
+        ]
+
+def cohort_report_chunks(store: Store, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[bytes]:
+    """One CSV row per cohort with its milestones and number of events"""
+    return csv_chunks(COHORT_REPORT_COLUMNS, _counted("cohorts", _cohort_pages(store, start, end)))
@@ -0,0 +1,47 @@
+"""
+Sparse fieldsets for list and detail endpoints
+`?fields=name,status,progress` limits a response to the given fields. The
+fields are pushed down to the store as a column projection, so other columns
+are never fetched, and the response is encoded with a model holding only the
+requested fields. Derived models are cached per (model, fields).
+"""
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel, TypeAdapter, create_model
+from storage.base import get_table
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """Parse the fields query parameter, None when every field was requested"""
+    if not fields:
+        return None
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields requested"
+        )
+    return requested
+
+def store_columns(table: str, fields: Optional[Tuple[str, ...]], *extra: str) -> Optional[Tuple[str, ...]]:
+    """Columns to fetch for the requested fields, plus any the route itself needs"""
+    if fields is None:
+        return None
+    columns = get_table(table).columns
+    return tuple(dict.fromkeys(c for c in (*fields, *extra) if c in columns))
+
+@lru_cache(maxsize=256)
+def sparse_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    definitions = {name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields}
+    return create_model(f"{model.__name__}Fields", **definitions)
+
+@lru_cache(maxsize=256)
+def _adapter(model: Type[BaseModel], fields: Tuple[str, ...], many: bool) -> TypeAdapter:
+    sparse = sparse_model(model, fields)
+    return TypeAdapter(List[sparse] if many else sparse)
+
+def sparse_response(model: Type[BaseModel], fields: Tuple[str, ...], data, many: bool = True) -> Response:
+    """Validate and encode rows with only the requested fields"""
+    adapter = _adapter(model, fields, many)
+    return Response(content=adapter.dump_json(adapter.validate_python(data)), media_type="application/json")
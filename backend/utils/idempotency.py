@@ -0,0 +1,241 @@
+"""
+Idempotency keys for create endpoints
+A client retrying a POST sends the same `Idempotency-Key` header and gets
+the first response back instead of creating a duplicate. Keys are scoped to
+the user. The first response is stored in the idempotency_keys table for
+`idempotency_ttl_seconds`, next to a fingerprint of the request: reusing a
+key for a different request is rejected with 422. Each worker keeps the
+recent responses in a bounded TTL LRU in front of the table.
+A duplicate arriving while the first request is still running waits for its
+result: in the same worker on the first request's future, across workers on
+a lock file with one byte-range lock per key stripe (POSIX locks, released by
+the OS if a worker dies). Whoever gets the lock first runs the request, the
+others find its stored response once they get it. If the first request fails
+nothing is stored, and a waiting duplicate runs the request itself.
+Expired rows are deleted every `idempotency_purge_interval_seconds` through
+the expires_at index, whichever worker wrote them.
+"""
+from collections import OrderedDict
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, Response, status
+from .config import settings
+from .database import get_store
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+# Byte-range locks in the lock file, different keys rarely share one
+LOCK_STRIPES = 4096
+
+# How often a duplicate waiting on another worker checks the lock again
+POLL_SECONDS = 0.05
+
+# Expired rows deleted per purge query
+PURGE_BATCH = 1000
+
+idempotent_requests_total = registry.counter(
+    "idempotent_requests_total", "Requests carrying an Idempotency-Key by outcome", ("operation", "result"))
+
+def fingerprint(operation: str, params: dict) -> str:
+    raw = json.dumps([operation, params], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class ResponseCache:
+    """LRU of stored responses bounded by entry count, entries expire after their TTL"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key: str, expires_at: float, request_fingerprint: str, response: dict):
+        with self._lock:
+            self._entries[key] = (expires_at, request_fingerprint, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+class StripeLocks:
+    """Cross-process locks on key stripes, reference counted within the process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._held: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, stripe: int) -> bool:
+        with self._lock:
+            if self._held.get(stripe):
+                # POSIX locks belong to the process, another request of this worker already holds it
+                self._held[stripe] += 1
+                return True
+            if self._fd is None:
+                # Kept open for good: closing any descriptor of the file drops all of the process's locks
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, stripe)
+            except OSError:
+                return False
+            self._held[stripe] = 1
+            return True
+
+    def release(self, stripe: int):
+        with self._lock:
+            self._held[stripe] -= 1
+            if not self._held[stripe]:
+                del self._held[stripe]
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+class Idempotency:
+    def __init__(self, locks: Optional[StripeLocks]):
+        self.locks = locks  # None with a single worker, in-flight futures are enough
+        self.cache = ResponseCache(settings.idempotency_cache_size)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.purge_expired)
+                if purged:
+                    logger.info(f"Purged {purged} expired idempotency keys")
+            except Exception as e:
+                logger.error(f"Idempotency key purge failed: {e}")
+            await asyncio.sleep(settings.idempotency_purge_interval_seconds)
+
+    def purge_expired(self) -> int:
+        """Delete stored responses whose TTL has passed, returns how many"""
+        store = get_store()
+        now = int(time.time())
+        purged, previous = 0, None
+        while True:
+            expired = store.list_before('idempotency_keys', 'expires_at', now, PURGE_BATCH, columns=("id",))
+            if not expired or expired[0]["id"] == previous:
+                # Done, or the last batch wasn't deleted
+                return purged
+            previous = expired[0]["id"]
+            store.apply_changes('idempotency_keys', [], [row["id"] for row in expired])
+            purged += len(expired)
+            if len(expired) < PURGE_BATCH:
+                return purged
+
+    async def run(self, key: Optional[str], user: dict, operation: str, params: dict, response: Response,
+                  create: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        create() once per user and key: replays return the stored response
+        with an `Idempotent-Replayed: true` header. Without a key create()
+        simply runs.
+        """
+        if key is None:
+            return await create()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+            )
+        row_id = hashlib.sha256(f"{user.get('user_id')}:{key}".encode()).hexdigest()
+        request_fingerprint = fingerprint(operation, params)
+
+        cached = self.cache.get(row_id)
+        while cached is None and row_id in self._inflight:
+            idempotent_requests_total.inc(operation, "waited")
+            # Shielded so a disconnecting duplicate doesn't cancel the first request. If that
+            # one failed nothing was cached, and this request runs it next.
+            await asyncio.shield(self._inflight[row_id])
+            cached = self.cache.get(row_id)
+        if cached is None:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[row_id] = future
+            try:
+                cached, result = await self._run_first(row_id, operation, request_fingerprint, create)
+            finally:
+                del self._inflight[row_id]
+                future.set_result(None)
+            if cached is None:
+                idempotent_requests_total.inc(operation, "first")
+                return result
+        stored_fingerprint, stored = cached
+        if stored_fingerprint != request_fingerprint:
+            idempotent_requests_total.inc(operation, "mismatch")
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        idempotent_requests_total.inc(operation, "replayed")
+        response.headers["Idempotent-Replayed"] = "true"
+        return stored
+
+    async def _run_first(self, row_id: str, operation: str, request_fingerprint: str,
+                         create: Callable[[], Awaitable[dict]]) -> Tuple[Optional[Tuple[str, dict]], Optional[dict]]:
+        """
+        ((fingerprint, response), None) if another request got there first,
+        else run create() and store it, (None, its result)
+        """
+        stripe = int(row_id[:8], 16) % LOCK_STRIPES
+        if self.locks is not None:
+            deadline = time.monotonic() + settings.idempotency_wait_seconds
+            while not self.locks.try_acquire(stripe):
+                if time.monotonic() >= deadline:
+                    idempotent_requests_total.inc(operation, "timeout")
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="A request with this Idempotency-Key is still in progress"
+                    )
+                await asyncio.sleep(POLL_SECONDS)
+        try:
+            stored = await asyncio.to_thread(get_store().get, 'idempotency_keys', row_id)
+            if stored is not None and stored["expires_at"] > time.time():
+                self.cache.put(row_id, stored["expires_at"], stored["fingerprint"], stored["response"])
+                return (stored["fingerprint"], stored["response"]), None
+            result = await create()
+            expires_at = int(time.time()) + settings.idempotency_ttl_seconds
+            stored = json.loads(json.dumps(result, default=str))
+            await asyncio.to_thread(self._store, {
+                "id": row_id, "operation": operation, "fingerprint": request_fingerprint, "response": stored,
+                "expires_at": expires_at,
+            })
+            self.cache.put(row_id, expires_at, request_fingerprint, stored)
+            return None, result
+        finally:
+            if self.locks is not None:
+                self.locks.release(stripe)
+
+    def _store(self, row: dict):
+        get_store().apply_changes('idempotency_keys', [row], [])
+
+def _create_idempotency() -> Idempotency:
+    if settings.workers > 1:
+        return Idempotency(StripeLocks(settings.idempotency_lock_path))
+    return Idempotency(None)
+
+idempotency = _create_idempotency()
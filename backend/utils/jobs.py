@@ -0,0 +1,233 @@
+"""
+In-process background jobs for post-write side effects
+Write handlers enqueue a job and respond; workers run it afterwards.
+- Two lanes with bounded queues: "io" jobs run on the event loop (sync
+  handlers in a thread), "cpu" jobs run in a process pool so they never hold
+  the GIL while requests are being served
+- Failed jobs are retried with exponential backoff and jitter
+- Durable jobs are written to the jobs table before they are queued and
+  removed once they succeed; jobs left over from a previous run are picked up
+  again at startup, so handlers must be idempotent
+Without a running queue (scripts, TestClient without lifespan) jobs run inline.
+Request handlers that need a CPU-heavy result can `run_cpu` it in the same
+process pool and await it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+import asyncio
+import fcntl
+import inspect
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Callable, Dict
+from .config import settings
+from .database import get_store
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LANES = ("io", "cpu")
+
+jobs_queue_depth = registry.gauge("jobs_queue_depth", "Jobs waiting in each lane", ("lane",))
+jobs_total = registry.counter("jobs_total", "Job attempts by outcome", ("job", "outcome"))
+job_wait_seconds = registry.histogram("job_wait_seconds", "Time from enqueue to start of a job attempt", ("job",))
+job_duration_seconds = registry.histogram("job_duration_seconds", "Job attempt run time", ("job",))
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    handler: Callable
+    lane: str
+    max_attempts: int
+    durable: bool
+
+# Job name -> JobType, filled by the @job decorator
+JOB_TYPES: Dict[str, JobType] = {}
+
+def job(name: str, lane: str = "io", max_attempts: int = 5, durable: bool = True):
+    """
+    Register a job handler taking the payload dict. CPU lane handlers must be
+    module-level functions so they can be sent to the process pool.
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown job lane: {lane}")
+
+    def register(handler: Callable):
+        JOB_TYPES[name] = JobType(name, handler, lane, max_attempts, durable)
+        return handler
+    return register
+
+@dataclass
+class Job:
+    id: str
+    name: str
+    payload: dict
+    attempts: int = 0
+    queued_at: float = field(default_factory=time.monotonic)
+
+class JobQueue:
+    def __init__(self):
+        self.running = False
+        self._queues = {}
+        self._workers = []
+        self._pending_retries = set()
+        self._pool = None
+        self._lock_fd = None
+        self._started_at = None
+
+    async def start(self):
+        self._started_at = datetime.now().isoformat()
+        self._queues = {lane: asyncio.Queue(maxsize=settings.jobs_queue_size) for lane in LANES}
+        if settings.jobs_cpu_workers > 0:
+            self._pool = ProcessPoolExecutor(max_workers=settings.jobs_cpu_workers)
+        lane_workers = {"io": settings.jobs_io_workers, "cpu": max(1, settings.jobs_cpu_workers)}
+        for lane, count in lane_workers.items():
+            self._workers += [asyncio.create_task(self._worker(lane)) for _ in range(count)]
+        self.running = True
+        self._workers.append(asyncio.create_task(self._recover()))
+
+    async def stop(self, timeout: float = 5.0):
+        """Let queued jobs finish for up to `timeout` seconds, durable leftovers run on the next start"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues.values())), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Background jobs still queued at shutdown")
+        self.running = False
+        for task in self._workers + list(self._pending_retries):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._pending_retries, return_exceptions=True)
+        self._workers, self._pending_retries = [], set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def enqueue(self, name: str, payload: dict) -> str:
+        """Queue a job and return its id, waits for space when the lane is full"""
+        job_type = JOB_TYPES[name]
+        queued = Job(id=str(uuid.uuid4()), name=name, payload=payload)
+        if job_type.durable:
+            get_store().insert('jobs', {
+                "id": queued.id, "name": name, "payload": payload, "status": "pending",
+                "attempts": 0, "created_at": datetime.now().isoformat()
+            })
+        if not self.running:
+            await self._execute(queued, retry=False)
+            return queued.id
+        await self._put(job_type.lane, queued)
+        return queued.id
+
+    async def run_cpu(self, fn: Callable, *args):
+        """Run a module-level function in the CPU pool and return its result, in a thread without a pool"""
+        if self._pool is None:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def _put(self, lane: str, queued: Job):
+        queue = self._queues[lane]
+        queued.queued_at = time.monotonic()
+        await queue.put(queued)
+        jobs_queue_depth.set(lane, value=queue.qsize())
+
+    async def _worker(self, lane: str):
+        queue = self._queues[lane]
+        while True:
+            queued = await queue.get()
+            jobs_queue_depth.set(lane, value=queue.qsize())
+            try:
+                await self._execute(queued, retry=True)
+            except Exception:
+                logger.exception(f"Background job {queued.name} could not be processed")
+            finally:
+                queue.task_done()
+
+    async def _call(self, job_type: JobType, payload: dict):
+        if inspect.iscoroutinefunction(job_type.handler):
+            return await job_type.handler(payload)
+        if not self.running:
+            # Inline, exactly as if the handler had been called directly
+            return job_type.handler(payload)
+        if job_type.lane == "cpu" and self._pool is not None:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, job_type.handler, payload)
+        return await asyncio.to_thread(job_type.handler, payload)
+
+    async def _execute(self, queued: Job, retry: bool):
+        job_type = JOB_TYPES[queued.name]
+        job_wait_seconds.observe(queued.name, value=time.monotonic() - queued.queued_at)
+        queued.attempts += 1
+        started = time.perf_counter()
+        try:
+            await self._call(job_type, queued.payload)
+        except Exception as e:
+            job_duration_seconds.observe(queued.name, value=time.perf_counter() - started)
+            if retry and self.running and queued.attempts < job_type.max_attempts:
+                jobs_total.inc(queued.name, "retried")
+                delay = min(settings.jobs_retry_max_seconds,
+                            settings.jobs_retry_base_seconds * 2 ** (queued.attempts - 1))
+                # Jitter so jobs that failed together don't retry together
+                delay *= random.uniform(0.5, 1.0)
+                logger.warning(f"Background job {queued.name} failed (attempt {queued.attempts}), retrying in {delay:.1f}s: {e}")
+                if job_type.durable:
+                    await asyncio.to_thread(get_store().update, 'jobs', queued.id, {"attempts": queued.attempts, "last_error": str(e)})
+                task = asyncio.create_task(self._retry_later(job_type.lane, queued, delay))
+                self._pending_retries.add(task)
+                task.add_done_callback(self._pending_retries.discard)
+            else:
+                jobs_total.inc(queued.name, "failed")
+                logger.error(f"Background job {queued.name} failed after {queued.attempts} attempt(s): {e}")
+                if job_type.durable:
+                    await asyncio.to_thread(get_store().update, 'jobs', queued.id, {
+                        "status": "failed", "attempts": queued.attempts, "last_error": str(e)
+                    })
+            return
+        job_duration_seconds.observe(queued.name, value=time.perf_counter() - started)
+        jobs_total.inc(queued.name, "succeeded")
+        if job_type.durable:
+            await asyncio.to_thread(get_store().delete, 'jobs', queued.id)
+
+    async def _retry_later(self, lane: str, queued: Job, delay: float):
+        await asyncio.sleep(delay)
+        await self._put(lane, queued)
+
+    def _claim_recovery(self) -> bool:
+        """Only one worker process re-queues jobs from a previous run"""
+        fd = os.open(settings.jobs_lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        # Held until shutdown
+        self._lock_fd = fd
+        return True
+
+    async def _recover(self):
+        if not self._claim_recovery():
+            return
+        rows = await asyncio.to_thread(get_store().list, 'jobs', {"status": "pending"})
+        recovered = 0
+        for row in rows:
+            # Newer rows belong to jobs queued by the workers of this run
+            if row["name"] not in JOB_TYPES or (row.get("created_at") or "") >= self._started_at:
+                continue
+            queued = Job(id=row["id"], name=row["name"], payload=row.get("payload") or {}, attempts=row.get("attempts") or 0)
+            await self._put(JOB_TYPES[row["name"]].lane, queued)
+            recovered += 1
+        if recovered:
+            logger.info(f"Re-queued {recovered} background job(s) from a previous run")
+
+job_queue = JobQueue()
+
+async def enqueue(name: str, payload: dict) -> str:
+    return await job_queue.enqueue(name, payload)
+
+async def run_cpu(fn: Callable, *args):
+    return await job_queue.run_cpu(fn, *args)
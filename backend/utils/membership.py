@@ -0,0 +1,298 @@
+"""
+Channel membership and visibility
+Team members see every channel. Everyone else sees the open channels that
+aren't team channels, plus members-only channels they were added to (e.g. one
+channel per region, each with its own campus leads).
+The directory keeps, per process, the type of every channel, the open
+channels per role, and user -> channels and channel -> members indexes, so
+listing a user's channels is O(own channels) and an access check is a couple
+of dict lookups, no store reads. Writes through the directory update it in
+place and append the change to a membership log. With several workers the log
+is a ring of the last LOG_ENTRIES changes in a memory-mapped file: the other
+workers apply the entries they haven't seen yet, and only rebuild from the
+store when they fell further behind than the ring.
+Membership changes are logged as changes to the channel, so GET /api/sync
+hands the channel to a user who was added and removes it for one who left.
+"""
+from datetime import datetime
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+from storage.changelog import LocalCounter
+from .config import settings
+from .database import get_store
+
+# Role whose users see every channel
+STAFF_ROLE = "team"
+
+def _log_channel_change(channel_id: str):
+    store = get_store()
+    if hasattr(store, "touch"):
+        store.touch('channels', channel_id)
+
+def _open_to(role: str, channel_type: str, members_only: bool) -> bool:
+    """Whether every user with `role` sees a channel without being a member"""
+    if role == STAFF_ROLE:
+        return True
+    return not members_only and channel_type != "team"
+
+# Membership log operations
+ADD, REMOVE, REMOVE_USER, CHANNEL, RELOAD = range(1, 6)
+
+_LOG_HEADER = struct.Struct("<QQ")  # magic, last sequence
+_LOG_HEADER_SIZE = 64
+_LOG_MAGIC = 0x4D454D4245525331
+_LOG_ENTRY = struct.Struct("<QB64s64s")  # sequence, operation, channel id, user id
+MAX_ID_BYTES = 64
+
+# Changes kept in the shared log, a worker further behind rebuilds from the store
+LOG_ENTRIES = 4096
+
+class LocalMembershipLog:
+    """Sequence numbers only: with a single process the directory already applied every change"""
+
+    def __init__(self):
+        self._counter = LocalCounter()
+
+    def current(self) -> int:
+        return self._counter.current()
+
+    def append(self, operation: int, channel_id: str = "", user_id: str = "") -> int:
+        return self._counter.next()
+
+    def since(self, sequence: int) -> Optional[List[Tuple[int, int, str, str]]]:
+        return []
+
+class SharedMembershipLog:
+    """Ring of membership changes in a memory-mapped file shared by the workers of a host"""
+
+    def __init__(self, path: str, entries: int = LOG_ENTRIES):
+        self.entries = entries
+        size = _LOG_HEADER_SIZE + entries * _LOG_ENTRY.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _LOG_HEADER.size, 0)
+            if len(header) < _LOG_HEADER.size or _LOG_HEADER.unpack(header)[0] != _LOG_MAGIC:
+                # New file, or one of another layout: every worker starts with a rebuild anyway
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _LOG_HEADER.pack(_LOG_MAGIC, 0), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        # Reading the header from the mapping is enough, no syscall on the access check path
+        return _LOG_HEADER.unpack_from(self._map, 0)[1]
+
+    def _offset(self, sequence: int) -> int:
+        return _LOG_HEADER_SIZE + sequence % self.entries * _LOG_ENTRY.size
+
+    def append(self, operation: int, channel_id: str = "", user_id: str = "") -> int:
+        channel_raw, user_raw = channel_id.encode(), user_id.encode()
+        if len(channel_raw) > MAX_ID_BYTES or len(user_raw) > MAX_ID_BYTES:
+            # Ids that don't fit an entry make the other workers rebuild instead
+            operation, channel_raw, user_raw = RELOAD, b"", b""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                sequence = self.current() + 1
+                _LOG_ENTRY.pack_into(self._map, self._offset(sequence), sequence, operation, channel_raw, user_raw)
+                _LOG_HEADER.pack_into(self._map, 0, _LOG_MAGIC, sequence)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return sequence
+
+    def since(self, sequence: int) -> Optional[List[Tuple[int, int, str, str]]]:
+        """(sequence, operation, channel id, user id) of the changes after `sequence`, None if the ring lost some"""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+            try:
+                last = self.current()
+                if last - sequence > self.entries:
+                    return None
+                changes = []
+                for expected in range(sequence + 1, last + 1):
+                    stored, operation, channel_id, user_id = _LOG_ENTRY.unpack_from(self._map, self._offset(expected))
+                    if stored != expected:
+                        return None
+                    changes.append((stored, operation, channel_id.rstrip(b"\0").decode(),
+                                    user_id.rstrip(b"\0").decode()))
+                return changes
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+class ChannelDirectory:
+    def __init__(self, log):
+        self.log = log
+        self._loaded = None  # Log sequence the indexes reflect
+        # Held while the indexes change or are copied, by local writes and log replays alike
+        self._lock = threading.RLock()
+        self._channels: Dict[str, Tuple[str, bool]] = {}  # channel id -> (type, members only)
+        self._open: Dict[str, Dict[str, None]] = {}  # role -> open channel ids (ordered set)
+        self._by_user: Dict[str, Dict[str, None]] = {}  # user id -> member channel ids
+        self._by_channel: Dict[str, Dict[str, None]] = {}  # channel id -> member user ids
+
+    def _current(self):
+        if self._loaded != self.log.current():
+            self._catch_up()
+
+    def knows(self, channel_id: str) -> bool:
+        self._current()
+        return channel_id in self._channels
+
+    def can_access(self, channel_id: str, user: dict) -> bool:
+        self._current()
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            return False
+        return _open_to(user.get("role"), *channel) or channel_id in self._by_user.get(user.get("user_id"), ())
+
+    def visible_ids(self, user: dict) -> List[str]:
+        """Channel ids a user sees, open channels first"""
+        self._current()
+        role = user.get("role")
+        with self._lock:
+            if role == STAFF_ROLE:
+                return list(self._channels)
+            open_ids = self._open_role(role)
+            member_ids = self._by_user.get(user.get("user_id"), {})
+            return list(open_ids) + [channel_id for channel_id in member_ids if channel_id not in open_ids]
+
+    def members(self, channel_id: str) -> List[str]:
+        self._current()
+        with self._lock:
+            return list(self._by_channel.get(channel_id, ()))
+
+    def _open_role(self, role: str) -> Dict[str, None]:
+        open_ids = self._open.get(role)
+        if open_ids is None:
+            open_ids = self._open[role] = {
+                channel_id: None for channel_id, channel in self._channels.items() if _open_to(role, *channel)}
+        return open_ids
+
+    def add_channel(self, channel: dict):
+        with self._lock:
+            self._current()
+            self._put_channel(channel["id"], channel.get("type"), bool(channel.get("members_only")))
+            self._logged(CHANNEL, channel["id"])
+
+    def add_member(self, channel_id: str, user_id: str):
+        """Store and index a membership, adding it twice is a no-op"""
+        self._current()
+        if user_id in self._by_channel.get(channel_id, ()):
+            return
+        get_store().apply_changes('channel_members', [{
+            "id": f"{channel_id}:{user_id}", "channel_id": channel_id, "user_id": user_id,
+            "joined_at": datetime.now().isoformat()
+        }], [])
+        with self._lock:
+            self._current()
+            self._index_member(channel_id, user_id)
+            self._logged(ADD, channel_id, user_id)
+        _log_channel_change(channel_id)
+
+    def remove_member(self, channel_id: str, user_id: str) -> bool:
+        self._current()
+        removed = get_store().delete('channel_members', f"{channel_id}:{user_id}")
+        with self._lock:
+            self._current()
+            self._unindex_member(channel_id, user_id)
+            self._logged(REMOVE, channel_id, user_id)
+        if removed:
+            _log_channel_change(channel_id)
+        return removed
+
+    def remove_user(self, user_id: str):
+        """Drop every membership of a user who was removed"""
+        self._current()
+        store = get_store()
+        rows = store.list('channel_members', {"user_id": user_id}, columns=("id", "channel_id"))
+        if rows:
+            store.apply_changes('channel_members', [], [row["id"] for row in rows])
+        with self._lock:
+            self._current()
+            self._unindex_user(user_id)
+            self._logged(REMOVE_USER, user_id=user_id)
+        for row in rows:
+            _log_channel_change(row["channel_id"])
+
+    def _put_channel(self, channel_id: str, channel_type: Optional[str], members_only: bool):
+        self._channels[channel_id] = (channel_type, members_only)
+        for role, open_ids in self._open.items():
+            if _open_to(role, channel_type, members_only):
+                open_ids[channel_id] = None
+            else:
+                open_ids.pop(channel_id, None)
+
+    def _index_member(self, channel_id: str, user_id: str):
+        self._by_user.setdefault(user_id, {})[channel_id] = None
+        self._by_channel.setdefault(channel_id, {})[user_id] = None
+
+    def _unindex_member(self, channel_id: str, user_id: str):
+        self._by_user.get(user_id, {}).pop(channel_id, None)
+        self._by_channel.get(channel_id, {}).pop(user_id, None)
+
+    def _unindex_user(self, user_id: str):
+        for channel_id in self._by_user.pop(user_id, {}):
+            self._by_channel.get(channel_id, {}).pop(user_id, None)
+
+    def _logged(self, operation: int, channel_id: str = "", user_id: str = ""):
+        """Append a change already applied here, the lock must be held"""
+        sequence = self.log.append(operation, channel_id, user_id)
+        if self._loaded == sequence - 1:
+            # Nothing changed elsewhere since the last catch-up, the local update is complete
+            self._loaded = sequence
+
+    def _apply(self, operation: int, channel_id: str, user_id: str):
+        # Every operation is idempotent, replaying this worker's own changes is harmless
+        if operation == ADD:
+            self._index_member(channel_id, user_id)
+        elif operation == REMOVE:
+            self._unindex_member(channel_id, user_id)
+        elif operation == REMOVE_USER:
+            self._unindex_user(user_id)
+        elif operation == CHANNEL:
+            row = get_store().get('channels', channel_id, columns=("id", "type", "members_only"))
+            if row is not None:
+                self._put_channel(channel_id, row.get("type"), bool(row.get("members_only")))
+
+    def _catch_up(self):
+        """Apply the logged changes made since the last catch-up, or rebuild"""
+        with self._lock:
+            if self._loaded is not None:
+                changes = self.log.since(self._loaded)
+                if changes is not None and all(operation != RELOAD for _, operation, _, _ in changes):
+                    for sequence, operation, channel_id, user_id in changes:
+                        self._apply(operation, channel_id, user_id)
+                        self._loaded = sequence
+                    return
+            self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            # Read before the store, changes racing with the reads are replayed on the next catch-up
+            sequence = self.log.current()
+            store = get_store()
+            channels = {
+                row["id"]: (row.get("type"), bool(row.get("members_only")))
+                for row in store.list('channels', columns=("id", "type", "members_only"))
+            }
+            by_user, by_channel = {}, {}
+            for row in store.list('channel_members', columns=("channel_id", "user_id")):
+                by_user.setdefault(row["user_id"], {})[row["channel_id"]] = None
+                by_channel.setdefault(row["channel_id"], {})[row["user_id"]] = None
+            self._channels, self._open, self._by_user, self._by_channel = channels, {}, by_user, by_channel
+            self._loaded = sequence
+
+def _create_directory() -> ChannelDirectory:
+    if settings.workers > 1:
+        return ChannelDirectory(SharedMembershipLog(settings.channel_directory_state_path))
+    return ChannelDirectory(LocalMembershipLog())
+
+directory = _create_directory()
@@ -0,0 +1,314 @@
+"""
+Heartbeat-based presence and typing indicators
+Clients send a heartbeat while a channel is open and a typing ping while the
+user types. Each channel keeps one TTL index for online users and one for
+typing users: an ordered dict in refresh order, so with a fixed TTL the
+oldest entry is always at the front and expiry pops from the front in
+amortised O(1). Channel snapshots read the live entries of one channel only.
+Heartbeats that arrive well within the TTL are coalesced (dropped) instead of
+refreshing the entry, so frequent pings from many clients cost a dict lookup.
+With a single worker the indexes live in the process and are only touched from
+the event loop; with several workers a heartbeat lands on any one of them, so
+the entries live in memory-mapped tables shared by all workers instead.
+"""
+from collections import OrderedDict
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+presence_pings_total = registry.counter(
+    "presence_pings_total", "Presence heartbeats and typing pings", ("kind", "result"))
+
+class TTLIndex:
+    """Keys that expire `ttl` seconds after their last refresh"""
+
+    def __init__(self, ttl: float, coalesce: float):
+        self.ttl = ttl
+        self.coalesce = coalesce
+        # key -> (expires_at, value), oldest refresh first
+        self._entries = OrderedDict()
+
+    def touch(self, key, value, now: float) -> bool:
+        """Refresh a key, returns False when the ping was coalesced"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] - now > self.ttl - self.coalesce:
+            return False
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        return True
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def expire(self, now: float):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+
+    def live(self, now: float) -> Dict:
+        self.expire(now)
+        return {key: value for key, (_, value) in self._entries.items()}
+
+    def has_other(self, key, now: float) -> bool:
+        """Whether anyone but `key` is present"""
+        self.expire(now)
+        return len(self._entries) > (1 if key in self._entries else 0)
+
+class LocalPresenceTable:
+    """One TTL index per channel, for a single process"""
+
+    def __init__(self, ttl: float, coalesce: float):
+        self.ttl = ttl
+        self.coalesce = coalesce
+        self._indexes: Dict[str, TTLIndex] = {}
+
+    def touch(self, channel_id: str, user_id: str, email: str, now: float) -> str:
+        index = self._indexes.get(channel_id)
+        if index is None:
+            index = self._indexes[channel_id] = TTLIndex(self.ttl, self.coalesce)
+        return "applied" if index.touch(user_id, email, now) else "coalesced"
+
+    def discard(self, channel_id: str, user_id: str):
+        index = self._indexes.get(channel_id)
+        if index is not None:
+            index.discard(user_id)
+
+    def live(self, channel_id: str, now: float) -> Dict:
+        index = self._indexes.get(channel_id)
+        return index.live(now) if index else {}
+
+    def has_other(self, channel_id: str, user_id: Optional[str], now: float) -> bool:
+        index = self._indexes.get(channel_id)
+        return index.has_other(user_id, now) if index else False
+
+_HEADER = struct.Struct("<QQ")  # magic, entries per region
+_HEADER_SIZE = 64
+_MAGIC = 0x50524553454E4345
+_HEAD = struct.Struct("<QQd")  # channel hash, user hash, expires at
+_ENTRY = struct.Struct("<QQd64s256s")  # head, user id, email
+
+# Longest user id and email an entry holds, longer ones are rejected rather than truncated
+MAX_USER_ID_BYTES = 64
+MAX_EMAIL_BYTES = 256
+
+# Entries per channel region, regions double while one is full of live entries
+REGION_SLOTS = 64
+MAX_REGION_SLOTS = 4096
+
+presence_evictions_total = registry.counter(
+    "presence_evictions_total", "Live presence entries overwritten because their region was at its maximum size",
+    ("table",))
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little") or 1
+
+def _text(raw: bytes) -> str:
+    return raw.rstrip(b"\0").decode()
+
+class SharedPresenceTable:
+    """
+    Presence entries in a memory-mapped file shared by the workers of a host.
+    Each channel hashes to a region of entries, reads scan that region only.
+    Expired entries are free slots. When a region has no free slot every region
+    doubles (up to MAX_REGION_SLOTS) and the live entries are rehashed; the file
+    header holds the region size, so other workers remap on their next access.
+    Expiry is wall-clock time, monotonic clocks aren't comparable between
+    processes.
+    """
+
+    def __init__(self, path: str, name: str, ttl: float, coalesce: float, regions: int = 128):
+        self.name = name
+        self.ttl = ttl
+        self.coalesce = coalesce
+        self.regions = regions
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._map = None
+        self._slots = 0
+        self._lock = threading.Lock()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(self._fd).st_size
+                header = os.pread(self._fd, _HEADER.size, 0) if size >= _HEADER_SIZE else b""
+                if len(header) < _HEADER.size or _HEADER.unpack(header)[0] != _MAGIC:
+                    # New file, or one of another layout: presence is short-lived, start empty
+                    self._resize(REGION_SLOTS)
+                self._sync()
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _size(self, slots: int) -> int:
+        return _HEADER_SIZE + self.regions * slots * _ENTRY.size
+
+    def _resize(self, slots: int):
+        """Empty the file and size it for `slots` entries per region, the flock must be held exclusively"""
+        if self._map is not None:
+            self._map.close()
+        # Truncating to zero first leaves the file sparse, untouched regions take no memory
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, self._size(slots))
+        self._map = mmap.mmap(self._fd, self._size(slots))
+        _HEADER.pack_into(self._map, 0, _MAGIC, slots)
+        self._slots = slots
+
+    def _sync(self):
+        """Remap if another worker grew the table, the flock must be held"""
+        if self._map is not None and _HEADER.unpack_from(self._map, 0)[1] == self._slots:
+            return
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        self._slots = _HEADER.unpack_from(self._map, 0)[1]
+
+    def _offsets(self, channel_hash: int):
+        start = _HEADER_SIZE + (channel_hash % self.regions) * self._slots * _ENTRY.size
+        return range(start, start + self._slots * _ENTRY.size, _ENTRY.size)
+
+    def _locked(self, operation: int, action: Callable):
+        with self._lock:
+            fcntl.flock(self._fd, operation)
+            try:
+                self._sync()
+                return action()
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _grow(self, now: float):
+        """Double every region, keeping the live entries"""
+        live = []
+        for offset in range(_HEADER_SIZE, len(self._map), _ENTRY.size):
+            slot_channel, _, expires_at = _HEAD.unpack_from(self._map, offset)
+            if slot_channel and expires_at > now:
+                live.append((slot_channel, self._map[offset:offset + _ENTRY.size]))
+        self._resize(self._slots * 2)
+        filled: Dict[int, int] = {}
+        for channel_hash, entry in live:
+            region = channel_hash % self.regions
+            index = filled[region] = filled.get(region, -1) + 1
+            offset = _HEADER_SIZE + (region * self._slots + index) * _ENTRY.size
+            self._map[offset:offset + _ENTRY.size] = entry
+        logger.info(f"Presence table {self.name} grown to {self._slots} entries per region")
+
+    def touch(self, channel_id: str, user_id: str, email: str, now: float) -> str:
+        """Refresh an entry, returns "applied", "coalesced" or "rejected" (id or email too long)"""
+        user_raw, email_raw = user_id.encode(), (email or "").encode()
+        if len(user_raw) > MAX_USER_ID_BYTES or len(email_raw) > MAX_EMAIL_BYTES:
+            return "rejected"
+        channel_hash, user_hash = _hash(channel_id), _hash(user_id)
+
+        def free_slot() -> Optional[int]:
+            free = None
+            for offset in self._offsets(channel_hash):
+                slot_channel, slot_user, expires_at = _HEAD.unpack_from(self._map, offset)
+                if slot_channel == channel_hash and slot_user == user_hash:
+                    return -1 if expires_at - now > self.ttl - self.coalesce else offset
+                if free is None and (slot_channel == 0 or expires_at <= now):
+                    free = offset
+            return free
+
+        def touch() -> str:
+            target = free_slot()
+            while target is None and self._slots < MAX_REGION_SLOTS:
+                self._grow(now)
+                target = free_slot()
+            if target == -1:
+                return "coalesced"
+            if target is None:
+                # At the maximum size, the live entry expiring first makes room
+                target = min(self._offsets(channel_hash), key=lambda offset: _HEAD.unpack_from(self._map, offset)[2])
+                presence_evictions_total.inc(self.name)
+            _ENTRY.pack_into(self._map, target, channel_hash, user_hash, now + self.ttl, user_raw, email_raw)
+            return "applied"
+        return self._locked(fcntl.LOCK_EX, touch)
+
+    def discard(self, channel_id: str, user_id: str):
+        channel_hash, user_hash = _hash(channel_id), _hash(user_id)
+
+        def discard():
+            for offset in self._offsets(channel_hash):
+                if _HEAD.unpack_from(self._map, offset)[:2] == (channel_hash, user_hash):
+                    _HEAD.pack_into(self._map, offset, 0, 0, 0.0)
+        self._locked(fcntl.LOCK_EX, discard)
+
+    def live(self, channel_id: str, now: float) -> Dict:
+        channel_hash = _hash(channel_id)
+
+        def live() -> list:
+            entries = []
+            for offset in self._offsets(channel_hash):
+                slot_channel, _, expires_at, user_id, email = _ENTRY.unpack_from(self._map, offset)
+                if slot_channel == channel_hash and expires_at > now:
+                    entries.append((expires_at, _text(user_id), _text(email)))
+            return entries
+        # Oldest refresh first, like the local indexes
+        return {user_id: email for _, user_id, email in sorted(self._locked(fcntl.LOCK_SH, live))}
+
+    def has_other(self, channel_id: str, user_id: Optional[str], now: float) -> bool:
+        channel_hash, user_hash = _hash(channel_id), _hash(user_id) if user_id else 0
+
+        def has_other() -> bool:
+            for offset in self._offsets(channel_hash):
+                slot_channel, slot_user, expires_at = _HEAD.unpack_from(self._map, offset)
+                if slot_channel == channel_hash and slot_user != user_hash and expires_at > now:
+                    return True
+            return False
+        return self._locked(fcntl.LOCK_SH, has_other)
+
+class Presence:
+    def __init__(self, online, typing, clock: Callable[[], float]):
+        self._online = online
+        self._typing = typing
+        self._clock = clock
+
+    def heartbeat(self, channel_id: str, user_id: str, email: str):
+        presence_pings_total.inc("heartbeat", self._online.touch(channel_id, user_id, email, self._clock()))
+
+    def typing(self, channel_id: str, user_id: str, email: str):
+        now = self._clock()
+        # Typing implies the user is in the channel
+        self.heartbeat(channel_id, user_id, email)
+        presence_pings_total.inc("typing", self._typing.touch(channel_id, user_id, email, now))
+
+    def stopped_typing(self, channel_id: str, user_id: str):
+        self._typing.discard(channel_id, user_id)
+
+    def snapshot(self, channel_id: str) -> dict:
+        now = self._clock()
+        return {
+            "online": _people(self._online.live(channel_id, now)),
+            "typing": _people(self._typing.live(channel_id, now)),
+        }
+
+    def channel_flags(self, channel_id: str, user_id: Optional[str]) -> dict:
+        """Channel.online / Channel.typing as seen by `user_id` (other people only)"""
+        now = self._clock()
+        return {
+            "online": self._online.has_other(channel_id, user_id, now),
+            "typing": self._typing.has_other(channel_id, user_id, now),
+        }
+
+def _people(entries: dict) -> List[dict]:
+    return [{"user_id": user_id, "email": email} for user_id, email in entries.items()]
+
+def _create_presence() -> Presence:
+    online = (settings.presence_ttl_seconds, settings.presence_coalesce_seconds)
+    typing = (settings.typing_ttl_seconds, settings.typing_coalesce_seconds)
+    if settings.workers > 1:
+        path = settings.presence_state_path
+        return Presence(SharedPresenceTable(f"{path}.online", "online", *online),
+                        SharedPresenceTable(f"{path}.typing", "typing", *typing), time.time)
+    return Presence(LocalPresenceTable(*online), LocalPresenceTable(*typing), time.monotonic)
+
+presence = _create_presence()
@@ -0,0 +1,162 @@
+"""
+Opt-in profiling for the API
+- ProfilingMiddleware profiles a single request with cProfile when a team
+  member sends the profiling header, and stores the result on disk (the
+  newest `profiling_max_profiles` are kept). cProfile hooks the event loop
+  thread, so the profile also holds every other coroutine that ran while the
+  request was in flight, and misses work the request handed to threads
+  (asyncio.to_thread) or the process pool. It is only a faithful picture of
+  one request when no other request is in flight, e.g. against an idle
+  worker; use SamplingProfiler for everything else.
+- SamplingProfiler periodically samples the stacks of every thread for a
+  bounded time and aggregates them in folded (flamegraph) format
+Neither is installed unless `profiling_enabled` is set.
+"""
+from collections import Counter
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from .auth import active_payload
+from .config import settings
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(settings.profiling_output_dir, f"{profile_id}.prof")
+
+def _save_profile(profiler: cProfile.Profile, profile_id: str):
+    os.makedirs(settings.profiling_output_dir, exist_ok=True)
+    profiler.dump_stats(_profile_path(profile_id))
+    _prune_profiles()
+
+def _prune_profiles():
+    """Remove all but the newest `profiling_max_profiles` artifacts"""
+    profiles = []
+    with os.scandir(settings.profiling_output_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".prof"):
+                try:
+                    profiles.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+    profiles.sort(reverse=True)
+    for _, path in profiles[settings.profiling_max_profiles:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def get_profile_path(profile_id: str):
+    """Return the stored profile path for an id, or None if it doesn't exist"""
+    # Ids are generated as uuid4 hex, reject anything else to avoid path traversal
+    if len(profile_id) != 32 or not all(c in "0123456789abcdef" for c in profile_id):
+        return None
+    path = _profile_path(profile_id)
+    return path if os.path.exists(path) else None
+
+def render_profile_text(path: str, limit: int = 50) -> str:
+    """Render a stored profile as a pstats report sorted by cumulative time"""
+    buffer = io.StringIO()
+    stats = pstats.Stats(path, stream=buffer)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return buffer.getvalue()
+
+def _is_authorised(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            # Revoked tokens are refused like on every other endpoint
+            payload = active_payload(token)
+            return payload is not None and payload.get("role") == "team"
+    return False
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling a request when the profiling header is present.
+    The profile id is returned in the X-Profile-Id response header and the
+    artifact can be fetched from /api/profiling/requests/{profile_id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.profiling_header.lower().encode("latin-1")
+        # cProfile hooks the whole thread, so only one request is profiled at a time
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(name == self.header for name, _ in scope.get("headers", [])):
+            await self.app(scope, receive, send)
+            return
+
+        if not _is_authorised(scope) or not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+            # Writing and pruning touch the disk, keep them off the event loop
+            await asyncio.to_thread(_save_profile, profiler, profile_id)
+        finally:
+            self._lock.release()
+
+def _folded_stack(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread at a fixed interval for a bounded time.
+    The result is in folded stack format (`frame;frame;frame count`), which can
+    be turned into a flamegraph with flamegraph.pl or speedscope.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, interval: float = None):
+        self.interval = interval if interval is not None else settings.sampling_profiler_interval_ms / 1000
+        self.samples = Counter()
+        self.sample_count = 0
+
+    def run(self, seconds: float) -> str:
+        """Sample for up to `seconds` (capped by settings) and return folded stacks"""
+        seconds = max(0.0, min(seconds, settings.sampling_profiler_max_seconds))
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A sampling profile is already running")
+        try:
+            own_thread = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != own_thread:
+                        self.samples[_folded_stack(frame)] += 1
+                self.sample_count += 1
+                time.sleep(self.interval)
+        finally:
+            self._lock.release()
+        return self.render()
+
+    def render(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
@@ -0,0 +1,167 @@
+"""
+Cohort progress history
+Every change to a cohort's progress, completed milestones or participants is
+recorded as a sample in the cohort_progress table. Each worker keeps the
+samples of the cohorts it was asked about in numpy columns (epoch seconds and
+one int32 column per tracked field), loaded from the store on first use.
+Range queries binary-search the time column and reduce each bucket with
+min/max/last in a few vectorised passes, so the response has at most
+`buckets` points and a year of samples costs little more than a week.
+Writes bump a generation counter (memory-mapped and shared with several
+workers); the other workers drop their columns when it moves and reload.
+Cohort writes record their sample in the record_cohort_progress job, which
+reads the cohort again so a retried or replayed job adds nothing twice.
+"""
+from datetime import datetime
+import math
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from storage.changelog import LocalCounter, SharedCounter
+from .config import settings
+from .database import get_store
+from .jobs import job
+
+# Cohort fields with a history
+TRACKED_FIELDS = ("progress", "completed_milestones", "participants")
+
+class Series:
+    """Samples of one cohort in time order, in columns that double in size as they fill"""
+
+    def __init__(self, capacity: int = 16):
+        self.size = 0
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((capacity, len(TRACKED_FIELDS)), dtype=np.int32)
+
+    def append(self, at: int, values: Tuple[int, ...]):
+        if self.size == len(self.times):
+            self.times = np.resize(self.times, 2 * self.size)
+            self.values = np.resize(self.values, (2 * self.size, len(TRACKED_FIELDS)))
+        # Clocks of different workers can disagree slightly, keep the column sorted
+        index = self.size
+        if index and at < self.times[index - 1]:
+            index = int(np.searchsorted(self.times[:self.size], at, side="right"))
+            self.times[index + 1:self.size + 1] = self.times[index:self.size]
+            self.values[index + 1:self.size + 1] = self.values[index:self.size]
+        self.times[index] = at
+        self.values[index] = values
+        self.size += 1
+
+    def latest(self) -> Optional[Tuple[int, ...]]:
+        return tuple(self.values[self.size - 1].tolist()) if self.size else None
+
+    def first_time(self) -> Optional[int]:
+        return int(self.times[0]) if self.size else None
+
+    def downsample(self, start: int, end: int, buckets: int) -> Tuple[int, List[dict]]:
+        """
+        Samples between `start` and `end` (epoch seconds, inclusive) in up to
+        `buckets` equal buckets, returns (bucket width, non-empty buckets)
+        """
+        width = max(1, math.ceil((end - start + 1) / buckets))
+        lo = np.searchsorted(self.times[:self.size], start, side="left")
+        hi = np.searchsorted(self.times[:self.size], end, side="right")
+        times, values = self.times[lo:hi], self.values[lo:hi]
+        if not len(times):
+            return width, []
+        bucket = (times - start) // width
+        # First sample of every bucket, samples are sorted so each bucket is one run
+        firsts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+        ends = np.append(firsts[1:], len(times))
+        lows = np.minimum.reduceat(values, firsts, axis=0).tolist()
+        highs = np.maximum.reduceat(values, firsts, axis=0).tolist()
+        lasts = values[ends - 1].tolist()
+        counts = (ends - firsts).tolist()
+        starts = (start + bucket[firsts] * width).tolist()
+        return width, [
+            {
+                "start": datetime.fromtimestamp(bucket_start).isoformat(),
+                "samples": count,
+                **{field: {"min": low[i], "max": high[i], "last": last[i]} for i, field in enumerate(TRACKED_FIELDS)},
+            }
+            for bucket_start, count, low, high, last in zip(starts, counts, lows, highs, lasts)
+        ]
+
+class ProgressHistory:
+    def __init__(self, generation):
+        self.generation = generation
+        self._loaded = None  # Generation the loaded series reflect
+        # Held while a sample is recorded (job threads) or the series are read
+        self._lock = threading.RLock()
+        self._series: Dict[str, Series] = {}
+
+    def _get(self, cohort_id: str) -> Series:
+        if self._loaded != self.generation.current():
+            with self._lock:
+                self._series = {}
+                self._loaded = self.generation.current()
+        series = self._series.get(cohort_id)
+        if series is None:
+            rows = get_store().list('cohort_progress', {"cohort_id": cohort_id},
+                                    columns=("recorded_at", *TRACKED_FIELDS))
+            rows.sort(key=lambda row: row["recorded_at"])
+            series = Series(max(16, len(rows)))
+            for row in rows:
+                series.append(row["recorded_at"], tuple(row[field] or 0 for field in TRACKED_FIELDS))
+            self._series[cohort_id] = series
+        return series
+
+    def record(self, cohort: dict):
+        """Add a sample if a tracked field differs from the latest one"""
+        with self._lock:
+            series = self._get(cohort["id"])
+            values = tuple(int(cohort.get(field) or 0) for field in TRACKED_FIELDS)
+            if series.latest() == values:
+                return
+            at = int(time.time())
+            get_store().insert('cohort_progress', {
+                "id": str(uuid.uuid4()), "cohort_id": cohort["id"], "recorded_at": at,
+                **dict(zip(TRACKED_FIELDS, values))
+            })
+            series.append(at, values)
+            self._bump()
+
+    def query(self, cohort_id: str, start: Optional[int], end: int, buckets: int) -> dict:
+        """Downsampled history, `start` defaults to the first sample"""
+        with self._lock:
+            series = self._get(cohort_id)
+            if start is None:
+                start = min(series.first_time() or end, end)
+            width, points = series.downsample(start, end, buckets)
+        return {
+            "cohort_id": cohort_id,
+            "start": datetime.fromtimestamp(start).isoformat(),
+            "end": datetime.fromtimestamp(end).isoformat(),
+            "bucket_seconds": width,
+            "buckets": points,
+        }
+
+    def drop(self, cohort_id: str):
+        store = get_store()
+        rows = store.list('cohort_progress', {"cohort_id": cohort_id}, columns=("id",))
+        if rows:
+            store.apply_changes('cohort_progress', [], [row["id"] for row in rows])
+        self._series.pop(cohort_id, None)
+        self._bump()
+
+    def _bump(self):
+        generation = self.generation.next()
+        if self._loaded == generation - 1:
+            # Nothing changed elsewhere since the series were loaded, the local update is complete
+            self._loaded = generation
+
+def _create_history() -> ProgressHistory:
+    if settings.workers > 1:
+        return ProgressHistory(SharedCounter(settings.progress_history_state_path, "cohort_progress"))
+    return ProgressHistory(LocalCounter())
+
+progress_history = _create_history()
+
+@job("record_cohort_progress")
+def record_cohort_progress(payload: dict):
+    cohort = get_store().get('cohorts', payload["cohort_id"])
+    # Deleted since the job was queued, drop() already removed its history
+    if cohort is not None:
+        progress_history.record(cohort)
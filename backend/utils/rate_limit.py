@@ -0,0 +1,179 @@
+"""
+Token-bucket rate limiting
+Each rule (e.g. "login_ip") has a capacity and a refill period, configured in
+utils/config.py as "<requests>/<seconds>". A bucket is two floats per key
+(tokens, last update), buckets of idle keys are evicted once they would be full
+again. With a single worker buckets live in an in-process LRU dict; with
+several workers they live in a memory-mapped table shared by all workers so a
+client can't multiply its allowance by hitting different workers.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Tuple
+from fastapi import HTTPException, Request, status
+from .config import settings
+from .metrics import registry
+
+rate_limited_total = registry.counter(
+    "rate_limited_total", "Requests rejected by the rate limiter", ("rule",))
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    capacity: float
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimitRule":
+        """Parse "<requests>/<seconds>", e.g. "10/60" allows 10 requests per minute"""
+        count, _, seconds = spec.partition("/")
+        return cls(capacity=float(count), period=float(seconds or 1))
+
+def _refill(tokens: float, last: float, now: float, rule: RateLimitRule) -> float:
+    return min(rule.capacity, tokens + (now - last) * rule.rate)
+
+def _take(tokens: float, rule: RateLimitRule) -> Tuple[bool, float, float]:
+    """Try to take one token, returns (allowed, remaining tokens, retry after seconds)"""
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rule.rate
+
+class LocalBuckets:
+    """Buckets for a single process, kept in LRU order so idle keys are evicted from the front"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, last, _ = self._buckets.pop(key, (rule.capacity, now, rule))
+            allowed, tokens, retry_after = _take(_refill(tokens, last, now, rule), rule)
+            self._buckets[key] = (tokens, now, rule)
+            self._evict(now)
+            return allowed, retry_after
+
+    def _evict(self, now: float):
+        # The front holds the least recently used keys, drop them while they are full again
+        while self._buckets:
+            key, (tokens, last, rule) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and _refill(tokens, last, now, rule) < rule.capacity:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+_SLOT = struct.Struct("<Qdd")  # key hash, tokens, last update
+_PROBE = 8
+
+class SharedBuckets:
+    """
+    Fixed-size open-addressing table of buckets in a memory-mapped file.
+    Slots whose bucket has refilled completely are treated as free, and when a
+    probe window is full the least recently updated slot is reused.
+    """
+
+    def __init__(self, path: str, slots: int = 65536):
+        self.slots = slots
+        size = slots * _SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        start = key_hash % self.slots
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                target, tokens, last = None, rule.capacity, now
+                oldest_offset, oldest_time = None, math.inf
+                for i in range(_PROBE):
+                    offset = ((start + i) % self.slots) * _SLOT.size
+                    slot_hash, slot_tokens, slot_last = _SLOT.unpack_from(self._map, offset)
+                    if slot_hash == key_hash:
+                        target, tokens, last = offset, slot_tokens, slot_last
+                        break
+                    idle = slot_hash == 0 or _refill(slot_tokens, slot_last, now, rule) >= rule.capacity
+                    if idle and target is None:
+                        target = offset
+                    if slot_last < oldest_time:
+                        oldest_offset, oldest_time = offset, slot_last
+                if target is None:
+                    target = oldest_offset
+                allowed, tokens, retry_after = _take(_refill(tokens, last, now, rule), rule)
+                _SLOT.pack_into(self._map, target, key_hash, tokens, now)
+                return allowed, retry_after
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+class RateLimiter:
+    def __init__(self, buckets, rules: dict):
+        self.buckets = buckets
+        self.rules = rules
+
+    def check(self, rule_name: str, key: str):
+        """Take a token from the bucket of `key`, raise 429 with Retry-After when empty"""
+        rule = self.rules.get(rule_name)
+        if rule is None:
+            return
+        allowed, retry_after = self.buckets.take(f"{rule_name}:{key}", rule, time.time())
+        if not allowed:
+            rate_limited_total.inc(rule_name)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+def _create_limiter() -> RateLimiter:
+    rules = {
+        "login_ip": settings.rate_limit_login_per_ip,
+        "login_user": settings.rate_limit_login_per_user,
+        "register_ip": settings.rate_limit_register_per_ip,
+        "send_message_ip": settings.rate_limit_send_message_per_ip,
+        "send_message_user": settings.rate_limit_send_message_per_user,
+    }
+    parsed = {name: RateLimitRule.parse(spec) for name, spec in rules.items() if spec}
+    if settings.workers > 1:
+        buckets = SharedBuckets(settings.rate_limit_state_path)
+    else:
+        buckets = LocalBuckets()
+    return RateLimiter(buckets, parsed)
+
+limiter = _create_limiter()
+
+def client_ip(request: Request) -> str:
+    """
+    Address of the client. Behind `trusted_proxy_count` proxies it is the
+    hop the outermost proxy appended to X-Forwarded-For, counted from the
+    right: entries further left were sent by the client and can be anything.
+    """
+    if settings.trusted_proxy_count > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if hops:
+            return hops[max(len(hops) - settings.trusted_proxy_count, 0)]
+    return request.client.host if request.client else "unknown"
+
+def enforce_rate_limit(rule_name: str, key: str):
+    if settings.rate_limit_enabled:
+        limiter.check(rule_name, key)
@@ -0,0 +1,239 @@
+"""
+Reminders for events and cohort dates, delivered as chat messages
+Due times are kept in a min-heap; a single loop timer is armed for the
+earliest one, so nothing polls. Rescheduling pushes a new heap entry and marks
+the old one dead (lazy deletion), dead entries are dropped when they reach the
+top or when they outnumber the live ones.
+When a reminder fires the event or cohort is read again, so a reminder that
+another worker rescheduled is skipped. It is posted to the channel of the
+cohort it is about (channels.cohort_id, an event's cohort for events), or to
+`reminders_channel_id` if that cohort has no channel. Reminder messages have
+deterministic ids and timestamps taken from the due time, they are upserted so
+workers that fire the same reminder deliver it once.
+"""
+from datetime import datetime, timedelta
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+from .config import settings
+from .database import get_store
+from .jobs import job, enqueue
+
+logger = logging.getLogger(__name__)
+
+# Longest single timer, a wall-clock change is noticed at least this often
+MAX_SLEEP_SECONDS = 3600
+
+# Reminders due this recently when the server starts are logged one by one as missed
+MISSED_WINDOW_SECONDS = 86400
+
+_TIME_FORMATS = ("%I:%M %p", "%H:%M", "%I %p")
+
+def _parse_due(date: str, clock: Optional[str] = None) -> Optional[datetime]:
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    for fmt in _TIME_FORMATS:
+        try:
+            parsed = datetime.strptime((clock or settings.reminder_default_time).strip().upper(), fmt)
+            return day.replace(hour=parsed.hour, minute=parsed.minute)
+        except ValueError:
+            continue
+    return None
+
+def event_reminders(event: dict) -> List[Tuple[Hashable, float, str]]:
+    """(key, due timestamp, message) for an event"""
+    starts = _parse_due(event.get("date"), event.get("time"))
+    if starts is None:
+        return []
+    due = starts - timedelta(minutes=settings.event_reminder_lead_minutes)
+    when = f"{event['date']} at {event['time']}" if event.get("time") else event["date"]
+    return [(("event", event["id"]), due.timestamp(), f"Reminder: {event['title']} starts {when}")]
+
+def cohort_reminders(cohort: dict) -> List[Tuple[Hashable, float, str]]:
+    """(key, due timestamp, message) for a cohort's start and end dates"""
+    reminders = []
+    starts = _parse_due(cohort.get("start_date"))
+    if starts is not None:
+        reminders.append((("cohort_start", cohort["id"]), starts.timestamp(),
+                          f"{cohort['name']} ({cohort['program']}) starts today"))
+    ends = _parse_due(cohort.get("end_date"))
+    if ends is not None:
+        milestones = cohort.get("milestones") or []
+        remaining = milestones[cohort.get("completed_milestones") or 0:]
+        message = f"{cohort['name']} ({cohort['program']}) ends today"
+        if remaining:
+            message += f", open milestones: {', '.join(remaining)}"
+        reminders.append((("cohort_end", cohort["id"]), ends.timestamp(), message))
+    return reminders
+
+class ReminderHeap:
+    """Min-heap of due times with O(log n) push and O(1) lazy cancel"""
+
+    def __init__(self):
+        self._heap = []
+        self._entries: Dict[Hashable, list] = {}
+        self._counter = itertools.count()
+
+    def push(self, key: Hashable, due: float, message: str):
+        self.cancel(key)
+        # [due, tie breaker, key, message, alive]
+        entry = [due, next(self._counter), key, message, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[4] = False
+            if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+                self._heap = [e for e in self._heap if e[4]]
+                heapq.heapify(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        while self._heap and not self._heap[0][4]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[list]:
+        due = []
+        while self.next_due() is not None and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            del self._entries[entry[2]]
+            due.append(entry)
+        return due
+
+    def __len__(self):
+        return len(self._entries)
+
+class ReminderScheduler:
+    def __init__(self):
+        self.heap = ReminderHeap()
+        self._loop = None
+        self._timer = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        store = get_store()
+        events, cohorts = await asyncio.gather(
+            asyncio.to_thread(store.list, 'events'), asyncio.to_thread(store.list, 'cohorts'))
+        past = []
+        for event in events:
+            past += self._schedule(event_reminders(event), arm=False)
+        for cohort in cohorts:
+            past += self._schedule(cohort_reminders(cohort), arm=False)
+        self._arm()
+        logger.info(f"Scheduled {len(self.heap)} reminder(s)")
+        # Not sent late, but reminders that came due while the server was down shouldn't vanish silently
+        now = time.time()
+        for key, due, message in past:
+            if now - due <= MISSED_WINDOW_SECONDS:
+                logger.warning(f"Reminder {key} was due at {datetime.fromtimestamp(due).isoformat()} "
+                               f"and is not sent: {message}")
+        if past:
+            logger.info(f"Skipped {len(past)} reminder(s) already past due")
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._loop = self._timer = None
+
+    def schedule_event(self, event: dict):
+        self._schedule(event_reminders(event), keys=[("event", event["id"])])
+
+    def schedule_cohort(self, cohort: dict):
+        self._schedule(cohort_reminders(cohort), keys=[("cohort_start", cohort["id"]), ("cohort_end", cohort["id"])])
+
+    def cancel_event(self, event_id: str):
+        self._schedule([], keys=[("event", event_id)])
+
+    def cancel_cohort(self, cohort_id: str):
+        self._schedule([], keys=[("cohort_start", cohort_id), ("cohort_end", cohort_id)])
+
+    def _schedule(self, reminders, keys=(), arm: bool = True) -> list:
+        """Schedule reminders, returns the ones already past"""
+        for key in keys:
+            self.heap.cancel(key)
+        now = time.time()
+        past = []
+        for key, due, message in reminders:
+            # Reminders that are already past are not sent late
+            if due > now:
+                self.heap.push(key, due, message)
+            else:
+                past.append((key, due, message))
+        if arm:
+            self._arm()
+        return past
+
+    def _arm(self):
+        if self._loop is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        due = self.heap.next_due()
+        if due is not None:
+            delay = min(max(0.0, due - time.time()), MAX_SLEEP_SECONDS)
+            self._timer = self._loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        for due, _, key, message, _ in self.heap.pop_due(time.time()):
+            self._loop.create_task(self._deliver(key, due, message))
+        self._arm()
+
+    async def _deliver(self, key, due: float, message: str):
+        try:
+            kind, row_id = key
+            table = 'events' if kind == "event" else 'cohorts'
+            row = await asyncio.to_thread(get_store().get, table, row_id)
+            current = event_reminders(row) if table == 'events' and row else cohort_reminders(row) if row else []
+            # Deleted or moved by another worker since this entry was scheduled
+            if not any(k == key and d == due for k, d, _ in current):
+                return
+            cohort_id = row.get("cohort_id") if table == 'events' else row["id"]
+            await enqueue("deliver_reminder", {
+                "id": f"reminder-{kind}-{row_id}-{int(due)}",
+                "channel_id": await asyncio.to_thread(_reminder_channel, cohort_id),
+                "content": message,
+                "due": due,
+            })
+        except Exception as e:
+            logger.error(f"Failed to deliver reminder {key}: {e}")
+
+def _reminder_channel(cohort_id: Optional[str]) -> str:
+    """The cohort's channel, the configured reminders channel if it has none"""
+    if cohort_id:
+        channel = get_store().find_one('channels', {"cohort_id": cohort_id})
+        if channel is not None:
+            return channel["id"]
+    return settings.reminders_channel_id
+
+@job("deliver_reminder")
+def deliver_reminder(payload: dict):
+    store = get_store()
+    # Jobs queued before the due time was part of the payload fall back to now
+    sent = datetime.fromtimestamp(payload["due"]) if "due" in payload else datetime.now()
+    store.apply_changes('messages', [{
+        "id": payload["id"],
+        "channel_id": payload["channel_id"],
+        "sender": settings.reminders_sender,
+        "role": "team",
+        "content": payload["content"],
+        "timestamp": sent.strftime("%I:%M %p"),
+        "time": sent.strftime("%H:%M"),
+        "date": sent.strftime("%Y-%m-%d"),
+        "read": False,
+        "starred": False
+    }], [])
+    store.update('channels', payload["channel_id"], {
+        "last_message": payload["content"],
+        "last_message_time": sent.strftime("%I:%M %p")
+    })
+
+reminders = ReminderScheduler()
@@ -0,0 +1,401 @@
+"""
+Tiered message retention
+Messages older than `message_hot_days` are moved out of the messages table
+into archive blocks (message_archives table) of up to
+`message_archive_block_size` messages from one channel. A block stores its
+messages column by column, zlib-compressed, next to an uncompressed index: the
+message ids it holds, the ids its messages reply to, and its first and last
+date. The archived_messages table maps every archived message id to its block.
+Archiving reads old messages through the date index in batches.
+History reads page backwards from the newest hot message into the channel's
+blocks, newest first, reading only the hot rows a page needs. Blocks are
+listed a few at a time from the page's cursor (the cursor's block comes from
+archived_messages when the cursor itself was archived), so a page reads the
+index of the blocks it reaches, not of the whole archive. A block is only
+fetched and decompressed when a page reaches into it; recently decoded blocks
+are kept in a small LRU. Exports walk all blocks oldest first, one at a time,
+without the LRU. Looking up, starring or deleting archived messages goes
+through archived_messages to their blocks; a change rewrites the block.
+One worker archives at a time (flock). A crash between writing a block and
+deleting its hot rows leaves duplicates, reads drop them by id.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import asyncio
+import base64
+import fcntl
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from storage.base import Store, get_table
+from .config import settings
+from .database import get_store
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_COLUMNS = tuple(get_table('messages').columns)
+
+# Messages read per archiving query, each batch ends in blocks of its own
+ARCHIVE_BATCH_ROWS = 10000
+
+# Block columns read to plan a history page, everything but the data itself
+INDEX_COLUMNS = ("id", "channel_id", "seq", "first_date", "last_date", "message_ids", "parent_ids", "revision")
+
+# Blocks listed per query while a history page walks back through the archive
+BLOCK_PAGE = 4
+
+# Sequence whose existence records that archived_messages covers blocks from before it existed
+INDEX_BACKFILL_SEQUENCE = "archived_messages_backfill"
+
+messages_archived_total = registry.counter("messages_archived_total", "Messages moved to archive blocks")
+message_history_read_seconds = registry.histogram(
+    "message_history_read_seconds", "Message history page reads by the oldest tier reached", ("tier",))
+archive_block_cache_total = registry.counter("archive_block_cache_total", "Archive block lookups", ("result",))
+
+def encode_block(rows: List[dict]) -> str:
+    """Compress messages column by column, columns that are None throughout are left out"""
+    columns = {}
+    for name in MESSAGE_COLUMNS:
+        values = [row.get(name) for row in rows]
+        if any(value is not None for value in values):
+            columns[name] = values
+    raw = json.dumps(columns, separators=(",", ":")).encode()
+    return base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+
+def decode_block(data: str) -> List[dict]:
+    columns = json.loads(zlib.decompress(base64.b64decode(data)))
+    names = tuple(columns)
+    missing = dict.fromkeys(name for name in MESSAGE_COLUMNS if name not in columns)
+    return [{**dict(zip(names, values)), **missing} for values in zip(*columns.values())]
+
+class BlockCache:
+    """LRU of decoded blocks keyed by (block id, revision), so rewritten blocks are never served stale"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int]) -> Optional[List[dict]]:
+        with self._lock:
+            rows = self._blocks.get(key)
+            if rows is not None:
+                self._blocks.move_to_end(key)
+            return rows
+
+    def put(self, key: Tuple[str, int], rows: List[dict]):
+        with self._lock:
+            self._blocks[key] = rows
+            self._blocks.move_to_end(key)
+            while len(self._blocks) > self.size:
+                self._blocks.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+block_cache = BlockCache(settings.message_archive_cache_blocks)
+
+def _blocks(store: Store, channel_id: str) -> List[dict]:
+    """Index entries of a channel's blocks, newest first"""
+    blocks = store.list('message_archives', {"channel_id": channel_id}, columns=INDEX_COLUMNS)
+    blocks.sort(key=lambda block: block["seq"], reverse=True)
+    return blocks
+
+def _older_blocks(store: Store, channel_id: str, before_block: Optional[str] = None) -> Iterator[dict]:
+    """
+    Index entries of a channel's blocks older than `before_block` (all of
+    them without one), newest first, listed BLOCK_PAGE at a time. Blocks are
+    inserted in seq order, so insertion order is block order.
+    """
+    while True:
+        blocks = store.list_recent('message_archives', {"channel_id": channel_id}, BLOCK_PAGE, before_block,
+                                   INDEX_COLUMNS)
+        if not blocks:
+            return
+        yield from reversed(blocks)
+        if len(blocks) < BLOCK_PAGE:
+            return
+        before_block = blocks[0]["id"]
+
+def _block_of(store: Store, channel_id: str, message_id: str, columns: Tuple[str, ...] = INDEX_COLUMNS) -> Optional[dict]:
+    """Index entry of the block holding an archived message of the channel"""
+    entry = store.get('archived_messages', message_id)
+    if entry is None:
+        return None
+    block = store.get('message_archives', entry["block_id"], columns=columns)
+    return block if block is not None and block["channel_id"] == channel_id else None
+
+def _block_rows(store: Store, block: dict) -> List[dict]:
+    key = (block["id"], block["revision"])
+    rows = block_cache.get(key)
+    archive_block_cache_total.inc("hit" if rows is not None else "miss")
+    if rows is None:
+        stored = store.get('message_archives', block["id"], columns=("data",))
+        rows = decode_block(stored["data"]) if stored else []
+        block_cache.put(key, rows)
+    return rows
+
+def read_history(store: Store, channel_id: str, before: Optional[str] = None, limit: Optional[int] = None,
+                 columns: Optional[Tuple[str, ...]] = None) -> List[dict]:
+    """
+    Up to `limit` messages of a channel older than message `before`, oldest
+    first, across the hot table and the archive. Without a limit the whole
+    history is returned; an unknown `before` returns nothing.
+    """
+    started = time.perf_counter()
+    hot_columns = None if columns is None else tuple(dict.fromkeys(("id", *columns)))
+    if limit is None:
+        hot = store.list('messages', {"channel_id": channel_id}, columns=hot_columns)
+        found = before is None
+    else:
+        # Only the hot rows this page can use, nothing when the cursor itself was archived
+        hot = store.list_recent('messages', {"channel_id": channel_id}, limit, before, hot_columns)
+        found = hot is not None
+        hot = hot or []
+    blocks = None
+    if not found:
+        # The cursor was archived: its block, then the older ones
+        cursor_block = _block_of(store, channel_id, before)
+        if cursor_block is None:
+            return []
+        blocks = itertools.chain((cursor_block,), _older_blocks(store, channel_id, cursor_block["id"]))
+    page, seen = [], set()
+
+    def take(rows: List[dict]) -> bool:
+        """Walk rows newest first, True once the page is full"""
+        nonlocal found
+        for row in reversed(rows):
+            if row["id"] in seen:
+                continue
+            seen.add(row["id"])
+            if not found:
+                found = row["id"] == before
+                continue
+            page.append(row)
+            if limit is not None and len(page) >= limit:
+                return True
+        return False
+
+    tier = "hot"
+    if not take(hot):
+        for block in blocks or _older_blocks(store, channel_id):
+            tier = "cold"
+            if limit is not None:
+                # Hot copies of leftovers from an interrupted archive run win, and weren't all read here
+                seen.update(row["id"] for row in store.get_many('messages', block["message_ids"], columns=("id",)))
+            if take(_block_rows(store, block)):
+                break
+    page.reverse()
+    if columns is not None:
+        page = [{column: row.get(column) for column in columns} for row in page]
+    elif tier == "cold":
+        # Decoded rows are shared with the block cache
+        page = [dict(row) for row in page]
+    message_history_read_seconds.observe(tier, value=time.perf_counter() - started)
+    return page
+
+def find_archived(store: Store, channel_id: str, message_ids: List[str]) -> Dict[str, dict]:
+    """Archived messages by id, only blocks holding one of them are read. Rows are shared, don't modify them."""
+    by_block: Dict[str, set] = {}
+    for entry in store.get_many('archived_messages', message_ids):
+        by_block.setdefault(entry["block_id"], set()).add(entry["id"])
+    found = {}
+    for block in store.get_many('message_archives', list(by_block), columns=("id", "channel_id", "revision")):
+        if block["channel_id"] != channel_id:
+            continue
+        hits = by_block[block["id"]]
+        found.update((row["id"], row) for row in _block_rows(store, block) if row["id"] in hits)
+    return found
+
+def archived_replies(store: Store, channel_id: str, parent_id: str) -> List[dict]:
+    """Archived replies to a message, oldest first, only blocks holding one are decoded"""
+    replies = []
+    for block in reversed(_blocks(store, channel_id)):
+        # Blocks without a parent index have to be decoded to find out
+        if block.get("parent_ids") is not None and parent_id not in block["parent_ids"]:
+            continue
+        replies += [dict(row) for row in _block_rows(store, block) if row.get("reply_to_id") == parent_id]
+    return replies
+
+def _in_range(day: Optional[str], start: Optional[str], end: Optional[str]) -> bool:
+    return (start is None or (day or "") >= start) and (end is None or (day or "") <= end)
+
+def iter_history(store: Store, channel_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                 page_size: int = 1000) -> Iterator[List[dict]]:
+    """
+    A channel's whole history in pages, archive blocks oldest first and then
+    the hot table, optionally limited to dates between `start` and `end`
+    (inclusive, YYYY-MM-DD). One block or page is held at a time and blocks
+    bypass the block cache. Hot copies win over leftovers of an interrupted
+    archive run, so the ids of hot messages no newer than the newest block
+    are remembered, the only ones that can be leftovers.
+    """
+    blocks = store.list('message_archives', {"channel_id": channel_id}, columns=("id", "seq", "first_date", "last_date"))
+    blocks.sort(key=lambda block: block["seq"])
+    newest = max((block["last_date"] or "" for block in blocks), default=None)
+    hot_ids = set()
+    if newest is not None:
+        for page in store.iter_pages('messages', {"channel_id": channel_id}, ("id", "date"), page_size):
+            hot_ids.update(row["id"] for row in page if (row["date"] or "") <= newest)
+    for block in blocks:
+        if (start is not None and (block["last_date"] or "") < start) or \
+                (end is not None and block["first_date"] and block["first_date"] > end):
+            continue
+        stored = store.get('message_archives', block["id"], columns=("data",))
+        rows = decode_block(stored["data"]) if stored else []
+        page = [row for row in rows if row["id"] not in hot_ids and _in_range(row.get("date"), start, end)]
+        if page:
+            yield page
+    for page in store.iter_pages('messages', {"channel_id": channel_id}, page_size=page_size):
+        page = [row for row in page if _in_range(row.get("date"), start, end)]
+        if page:
+            yield page
+
+@contextmanager
+def _archive_lock(blocking: bool = True):
+    """Serialises archiving and block rewrites across threads and worker processes"""
+    fd = os.open(settings.message_archive_lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+def _block_fields(rows: List[dict]) -> dict:
+    dates = [row["date"] for row in rows if row.get("date")]
+    return {
+        "count": len(rows),
+        "first_date": min(dates, default=None),
+        "last_date": max(dates, default=None),
+        "message_ids": [row["id"] for row in rows],
+        "parent_ids": sorted({row["reply_to_id"] for row in rows if row.get("reply_to_id")}),
+        "data": encode_block(rows),
+    }
+
+def archive_messages(store: Store, cutoff: str, block_size: int, batch_size: int = ARCHIVE_BATCH_ROWS) -> int:
+    """
+    Move messages dated before `cutoff` (YYYY-MM-DD) into archive blocks,
+    returns how many moved. Messages are read oldest first through the date
+    index, `batch_size` at a time.
+    """
+    archived, previous = 0, set()
+    while True:
+        batch = store.list_before('messages', 'date', cutoff, batch_size)
+        if not batch or previous.intersection(row["id"] for row in batch):
+            # Done, or the last batch wasn't deleted and would be archived again
+            return archived
+        previous = {row["id"] for row in batch}
+        by_channel = {}
+        for row in batch:
+            if row.get("date"):
+                by_channel.setdefault(row["channel_id"], []).append(row)
+        for channel_id, rows in by_channel.items():
+            latest = store.list_recent('message_archives', {"channel_id": channel_id}, 1, columns=("seq",))
+            seq = latest[0]["seq"] if latest else 0
+            for start in range(0, len(rows), block_size):
+                chunk = rows[start:start + block_size]
+                seq += 1
+                block_id = f"{channel_id}-{seq}"
+                # Block first, so a crash in between duplicates messages instead of losing them
+                store.insert('message_archives', {
+                    "id": block_id, "channel_id": channel_id, "seq": seq, "revision": 0,
+                    **_block_fields(chunk), "created_at": datetime.now().isoformat()
+                })
+                store.apply_changes('archived_messages', [{"id": row["id"], "block_id": block_id} for row in chunk], [])
+                store.apply_changes('messages', [], [row["id"] for row in chunk])
+                archived += len(chunk)
+        if len(batch) < batch_size:
+            return archived
+
+def update_archived(store: Store, channel_id: str, message_id: str,
+                    changes: Optional[Callable[[dict], dict]]) -> Optional[dict]:
+    """
+    Apply the changes returned by `changes(message)` to an archived message, or
+    delete it when `changes` is None.
+    Returns the message as updated (or deleted), None if it isn't archived.
+    """
+    with _archive_lock():
+        block = _block_of(store, channel_id, message_id, ("id", "channel_id", "revision"))
+        if block is None:
+            return None
+        rows = [dict(row) for row in _block_rows(store, block)]
+        index = next((i for i, row in enumerate(rows) if row["id"] == message_id), None)
+        if index is None:
+            return None
+        if changes is None:
+            message = rows.pop(index)
+        else:
+            message = rows[index] = {**rows[index], **changes(rows[index])}
+        if rows:
+            store.update('message_archives', block["id"], {**_block_fields(rows), "revision": block["revision"] + 1})
+        else:
+            store.delete('message_archives', block["id"])
+        if changes is None:
+            store.delete('archived_messages', message_id)
+        return message
+
+def backfill_archive_index(store: Store) -> int:
+    """
+    Index the messages of blocks archived before archived_messages existed,
+    once per store. Returns how many messages were indexed.
+    """
+    if store.get('sequences', INDEX_BACKFILL_SEQUENCE) is not None:
+        return 0
+    indexed = 0
+    for page in store.iter_pages('message_archives', columns=("id", "message_ids")):
+        for block in page:
+            store.apply_changes('archived_messages', [
+                {"id": message_id, "block_id": block["id"]} for message_id in block["message_ids"] or []], [])
+            indexed += len(block["message_ids"] or [])
+    store.next_sequence(INDEX_BACKFILL_SEQUENCE)
+    return indexed
+
+class MessageRetention:
+    def __init__(self):
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Message archiving failed: {e}")
+            await asyncio.sleep(settings.message_archive_interval_seconds)
+
+    def run_once(self) -> int:
+        cutoff = (date.today() - timedelta(days=settings.message_hot_days)).isoformat()
+        with _archive_lock(blocking=False) as locked:
+            if not locked:
+                # Another worker is archiving
+                return 0
+            store = get_store()
+            indexed = backfill_archive_index(store)
+            if indexed:
+                logger.info(f"Indexed {indexed} message(s) archived before archived_messages existed")
+            archived = archive_messages(store, cutoff, settings.message_archive_block_size)
+        if archived:
+            messages_archived_total.inc(amount=archived)
+            logger.info(f"Archived {archived} message(s) dated before {cutoff}")
+        return archived
+
+retention = MessageRetention()
@@ -0,0 +1,158 @@
+"""
+Access token revocation
+Tokens carry a `jti` and the user's token version at issue time (`ver`).
+- Logging out revokes the token's jti
+- Logging out everywhere, changing the password or removing a campus lead
+  bumps the user's token version, which revokes every older token
+Revocations are rows in the revoked_tokens table that every worker holds in
+memory: revoked jtis in a Bloom filter in front of an exact set, so a token
+that was never revoked is usually cleared by the filter alone, and the lowest
+valid token version of users that bumped theirs. Each revocation bumps a
+generation counter (memory-mapped and shared with several workers), the other
+workers reload when it moves. Entries are dropped, and the filter rebuilt,
+once every token they revoke would have expired anyway.
+"""
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from storage.changelog import LocalCounter, SharedCounter
+from .config import settings
+from .database import get_store
+from .metrics import registry
+
+token_revocation_checks_total = registry.counter(
+    "token_revocation_checks_total", "Revocation checks that did not pass outright", ("result",))
+
+def token_lifetime_seconds() -> int:
+    return settings.access_token_expire_minutes * 60
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives, ~10 bits per key at a 1% error rate"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _hash(self, key: str) -> Tuple[int, int]:
+        # Double hashing, the k positions come from the two halves of one 64-bit hash.
+        # hash() is salted per process, fine since every worker builds its own filter.
+        value = hash(key) & 0xFFFFFFFFFFFFFFFF
+        return value & 0xFFFFFFFF, (value >> 32) | 1
+
+    def add(self, key: str):
+        h1, h2 = self._hash(key)
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = self._hash(key)
+        bits, size = self._bits, self.size
+        # Stops at the first clear bit, usually the first or second for keys never added
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+class Revocations:
+    def __init__(self, generation):
+        self.generation = generation
+        self._loaded = None  # Generation the in-memory state reflects
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, int] = {}  # jti -> expires at (epoch seconds)
+        self._users: Dict[str, Tuple[int, int]] = {}  # user id -> (lowest valid version, expires at)
+        self._bloom = BloomFilter(settings.revocation_bloom_capacity, settings.revocation_error_rate)
+        self._next_prune = 0.0
+
+    def is_revoked(self, payload: dict) -> bool:
+        if self._loaded != self.generation.current():
+            self._reload()
+        now = time.time()
+        if now >= self._next_prune:
+            self._prune(now)
+        jti = payload.get("jti")
+        if jti is not None and jti in self._bloom:
+            if jti in self._tokens:
+                token_revocation_checks_total.inc("revoked_token")
+                return True
+            token_revocation_checks_total.inc("false_positive")
+        user = self._users.get(payload.get("user_id"))
+        if user is not None and (payload.get("ver") or 0) < user[0]:
+            token_revocation_checks_total.inc("revoked_user")
+            return True
+        return False
+
+    def revoke_token(self, jti: str, user_id: str, expires_at: int):
+        self._write({"id": jti, "kind": "token", "user_id": user_id, "token_version": None, "expires_at": int(expires_at)})
+        self._tokens[jti] = int(expires_at)
+        if len(self._tokens) > self._bloom.capacity:
+            self._install(self._tokens, self._users)
+        else:
+            self._bloom.add(jti)
+
+    def revoke_user(self, user_id: str) -> Optional[int]:
+        """Revoke every token of a user issued so far, returns the version for new tokens"""
+        store = get_store()
+        user = store.get('users', user_id, columns=("id", "token_version"))
+        if user is None:
+            return None
+        version = (user.get("token_version") or 0) + 1
+        store.update('users', user_id, {"token_version": version})
+        # Tokens issued before now are all expired after one token lifetime
+        expires_at = int(time.time()) + token_lifetime_seconds()
+        self._write({"id": f"user:{user_id}", "kind": "user", "user_id": user_id, "token_version": version,
+                     "expires_at": expires_at})
+        self._users[user_id] = (version, expires_at)
+        return version
+
+    def _write(self, row: dict):
+        now = time.time()
+        # Expired entries are deleted with the same write
+        expired = [jti for jti, expires_at in self._tokens.items() if expires_at <= now]
+        expired += [f"user:{user_id}" for user_id, (_, expires_at) in self._users.items() if expires_at <= now]
+        get_store().apply_changes('revoked_tokens', [row], expired)
+        generation = self.generation.next()
+        if self._loaded == generation - 1:
+            # Nobody else revoked anything since the last load, applying the row locally is enough
+            self._loaded = generation
+
+    def _reload(self):
+        with self._lock:
+            generation = self.generation.current()
+            if self._loaded == generation:
+                return
+            now = time.time()
+            tokens, users = {}, {}
+            for row in get_store().list('revoked_tokens'):
+                if row["expires_at"] <= now:
+                    continue
+                if row["kind"] == "user":
+                    users[row["user_id"]] = (row["token_version"], row["expires_at"])
+                else:
+                    tokens[row["id"]] = row["expires_at"]
+            self._install(tokens, users)
+            self._loaded = generation
+
+    def _prune(self, now: float):
+        self._next_prune = now + settings.revocation_prune_seconds
+        tokens = {jti: expires_at for jti, expires_at in self._tokens.items() if expires_at > now}
+        users = {user_id: entry for user_id, entry in self._users.items() if entry[1] > now}
+        if len(tokens) < len(self._tokens) or len(users) < len(self._users):
+            self._install(tokens, users)
+
+    def _install(self, tokens: Dict[str, int], users: Dict[str, Tuple[int, int]]):
+        bloom = BloomFilter(max(settings.revocation_bloom_capacity, 2 * len(tokens)), settings.revocation_error_rate)
+        for jti in tokens:
+            bloom.add(jti)
+        self._bloom, self._tokens, self._users = bloom, dict(tokens), dict(users)
+
+def _create_revocations() -> Revocations:
+    if settings.workers > 1:
+        return Revocations(SharedCounter(settings.revocation_state_path, "revoked_tokens"))
+    return Revocations(LocalCounter())
+
+revocations = _create_revocations()
@@ -0,0 +1,40 @@
+"""
+Single-flight coalescing for hot reads
+Concurrent identical reads (e.g. every team member loading the dashboard at
+once) share one in-flight backend call instead of each issuing their own query.
+The key must include everything that changes what a caller is allowed to see,
+such as the role, so users with different permissions never share a result.
+Coalesced results are shared between callers and must not be mutated.
+"""
+import asyncio
+from typing import Callable, Hashable
+from .metrics import registry
+
+singleflight_calls_total = registry.counter(
+    "singleflight_calls_total", "Backend calls made by the single-flight layer", ("operation",))
+singleflight_coalesced_total = registry.counter(
+    "singleflight_coalesced_total", "Reads served by an in-flight call, i.e. backend calls saved", ("operation",))
+
+class SingleFlight:
+    def __init__(self):
+        # (operation, key) -> task running the backend call
+        self._inflight = {}
+
+    async def do(self, operation: str, key: Hashable, fn: Callable, *args):
+        """Run fn(*args) in a thread, or join the identical call already in flight"""
+        flight_key = (operation, key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            singleflight_calls_total.inc(operation)
+            task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        else:
+            singleflight_coalesced_total.inc(operation)
+        # Shielded so a disconnecting caller doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    def __len__(self):
+        return len(self._inflight)
+
+singleflight = SingleFlight()
@@ -0,0 +1,219 @@
+"""
+Typed stat values and stats history
+A stat keeps its numeric value (`number`) next to the display string
+(`value`), which is the number formatted into `value_format`: 78 and "{}%"
+give "78%". Tiles submitted with only a display string get the number parsed
+out of it, and stored rows from before numbers existed are parsed on read.
+Every `stats_snapshot_interval_seconds` each category is snapshotted into the
+stats_snapshots table: one row per category and interval, holding the stat
+ids and their numbers as parallel arrays. The row id is derived from the
+interval, so later snapshots in the same interval (from any worker) overwrite
+it. Trend queries load a category's snapshots once per generation into a
+numpy matrix (snapshots x stats), then pick the last sample of every period
+and compute deltas and slopes for all stats of the category at once.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from storage.changelog import LocalCounter, SharedCounter
+from .config import settings
+from .database import get_store
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+# Period name -> maximum number of periods a trend query may ask for
+PERIODS = {"day": 366, "week": 260, "month": 120}
+
+stats_snapshots_total = registry.counter("stats_snapshots_total", "Stats category snapshots written")
+
+def parse_value(value: str) -> Tuple[Optional[float], Optional[str]]:
+    """Split a display value into its first number and a format, "15 leads" -> (15.0, "{} leads")"""
+    match = NUMBER_PATTERN.search(value)
+    if match is None:
+        return None, None
+    return float(match.group()), value[:match.start()] + "{}" + value[match.end():]
+
+def format_value(number: float, value_format: Optional[str]) -> str:
+    text = str(int(number)) if float(number).is_integer() else f"{number:.2f}".rstrip("0")
+    return (value_format or "{}").replace("{}", text, 1)
+
+def typed_stat(stat: dict) -> Optional[dict]:
+    """Fill in whichever of number/value_format/value is missing, None if the tile has neither number nor value"""
+    number, value, value_format = stat.get("number"), stat.get("value"), stat.get("value_format")
+    if number is None:
+        if value is None:
+            return None
+        number, parsed_format = parse_value(value)
+        return {**stat, "number": number, "value_format": value_format or parsed_format}
+    if value_format is None:
+        value_format = parse_value(value)[1] if value else None
+    return {**stat, "value": format_value(number, value_format), "value_format": value_format or "{}"}
+
+def stat_number(stat: dict) -> float:
+    """Numeric value of a stored stat, NaN for non-numeric ones"""
+    number = stat.get("number")
+    if number is None and stat.get("value"):
+        number = parse_value(stat["value"])[0]
+    return np.nan if number is None else float(number)
+
+def _period_keys(stamps: np.ndarray, period: str) -> np.ndarray:
+    """Consecutive integers per period (UTC), weeks start on Monday"""
+    days = stamps // 86400
+    if period == "day":
+        return days
+    if period == "week":
+        # 1970-01-01 was a Thursday
+        return (days + 3) // 7
+    return stamps.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+def _period_starts(keys: np.ndarray, period: str) -> List[str]:
+    if period == "day":
+        starts = keys.astype("datetime64[D]")
+    elif period == "week":
+        starts = (keys * 7 - 3).astype("datetime64[D]")
+    else:
+        starts = keys.astype("datetime64[M]").astype("datetime64[D]")
+    return np.datetime_as_string(starts).tolist()
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else round(value, 4) for value in values.tolist()]
+
+def trend_table(stamps: np.ndarray, values: np.ndarray, period: str, periods: int) -> dict:
+    """
+    Last value per period for the `periods` periods up to the newest sample,
+    samples are `values` rows (one column per stat) taken at `stamps`, oldest first
+    """
+    keys = _period_keys(stamps, period)
+    wanted = np.arange(keys[-1] - periods + 1, keys[-1] + 1)
+    # Last sample of every period present, keys are sorted
+    lasts = np.flatnonzero(np.append(keys[1:] != keys[:-1], True))
+    present = keys[lasts]
+    positions = np.minimum(np.searchsorted(present, wanted), len(present) - 1)
+    found = present[positions] == wanted
+    table = np.full((periods, values.shape[1]), np.nan)
+    table[found] = values[lasts[positions[found]]]
+
+    current, previous = table[-1], table[-2] if periods > 1 else np.full(values.shape[1], np.nan)
+    delta = current - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta_percent = np.where(previous != 0, delta / np.abs(previous) * 100, np.nan)
+        # Least squares slope per stat over the periods that have a value
+        known = ~np.isnan(table)
+        x = np.arange(periods, dtype=float)[:, None] * known
+        y = np.where(known, table, 0.0)
+        n = known.sum(axis=0)
+        sx, sy = x.sum(axis=0), y.sum(axis=0)
+        slope = (n * (x * y).sum(axis=0) - sx * sy) / (n * (x * x).sum(axis=0) - sx * sx)
+    slope = np.where(n >= 2, slope, np.nan)
+    return {
+        "periods": _period_starts(wanted, period),
+        "values": table,
+        "delta": delta,
+        "delta_percent": delta_percent,
+        "slope": slope,
+    }
+
+class StatsHistory:
+    def __init__(self, generation):
+        self.generation = generation
+        self._loaded = None  # Generation the loaded matrices reflect
+        self._lock = threading.Lock()
+        # Category -> (snapshot times, stat ids, numbers with one row per snapshot)
+        self._matrices: Dict[str, Tuple[np.ndarray, List[str], np.ndarray]] = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Stats snapshot failed: {e}")
+            await asyncio.sleep(settings.stats_snapshot_interval_seconds)
+
+    def run_once(self) -> int:
+        """Snapshot every category into the current interval's rows, returns how many categories"""
+        interval = settings.stats_snapshot_interval_seconds
+        taken_at = int(time.time()) // interval * interval
+        by_category = {}
+        for row in get_store().list('stats', columns=("id", "category", "value", "number")):
+            by_category.setdefault(row["category"], []).append(row)
+        snapshots = [
+            {
+                "id": f"{category}:{taken_at}", "category": category, "taken_at": taken_at,
+                "stat_ids": [row["id"] for row in rows],
+                "numbers": _nullable(np.array([stat_number(row) for row in rows], dtype=float)),
+            }
+            for category, rows in by_category.items()
+        ]
+        if snapshots:
+            get_store().apply_changes('stats_snapshots', snapshots, [])
+            stats_snapshots_total.inc(amount=len(snapshots))
+            # Loaded matrices are dropped on the next query, here and in the other workers
+            self.generation.next()
+        return len(snapshots)
+
+    def _matrix(self, category: str) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        if self._loaded != self.generation.current():
+            with self._lock:
+                self._matrices = {}
+                self._loaded = self.generation.current()
+        matrix = self._matrices.get(category)
+        if matrix is None:
+            rows = get_store().list('stats_snapshots', {"category": category},
+                                    columns=("taken_at", "stat_ids", "numbers"))
+            rows.sort(key=lambda row: row["taken_at"])
+            ids = list(dict.fromkeys(stat_id for row in rows for stat_id in row["stat_ids"]))
+            index = {stat_id: i for i, stat_id in enumerate(ids)}
+            numbers = np.full((len(rows), len(ids)), np.nan)
+            for i, row in enumerate(rows):
+                columns = [index[stat_id] for stat_id in row["stat_ids"]]
+                numbers[i, columns] = [np.nan if number is None else number for number in row["numbers"]]
+            times = np.array([row["taken_at"] for row in rows], dtype=np.int64)
+            matrix = self._matrices[category] = (times, ids, numbers)
+        return matrix
+
+    def trends(self, category: str, stats: List[dict], period: str, periods: int) -> dict:
+        """
+        Per-period values, deltas and slopes of the current stats of a
+        category, their live values count as the newest sample
+        """
+        times, ids, numbers = self._matrix(category)
+        index = {stat_id: i for i, stat_id in enumerate(ids)}
+        # Stats without history read the NaN column appended at the end
+        padded = np.hstack([numbers, np.full((len(times), 1), np.nan)])
+        columns = [index.get(stat["id"], len(ids)) for stat in stats]
+        values = np.vstack([padded[:, columns], [[stat_number(stat) for stat in stats]]])
+        stamps = np.append(times, int(time.time()))
+        table = trend_table(stamps, values, period, periods)
+        return {"category": category, "period": period, "periods": table["periods"], "stats": [
+            {
+                "id": stat["id"], "label": stat["label"], "value": stat["value"],
+                "values": _nullable(table["values"][:, i]),
+                "delta": _nullable(table["delta"][i:i + 1])[0],
+                "delta_percent": _nullable(table["delta_percent"][i:i + 1])[0],
+                "slope": _nullable(table["slope"][i:i + 1])[0],
+            }
+            for i, stat in enumerate(stats)
+        ]}
+
+def _create_history() -> StatsHistory:
+    if settings.workers > 1:
+        return StatsHistory(SharedCounter(settings.stats_history_state_path, "stats_snapshots"))
+    return StatsHistory(LocalCounter())
+
+stats_history = _create_history()
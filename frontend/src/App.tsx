@@ -32,7 +32,7 @@ export default function App() {
   };
 
   const handleLogout = () => {
-    api.clearToken();
+    api.logout().catch(() => {});
     setIsAuthenticated(false);
     setUserRole(null);
   };
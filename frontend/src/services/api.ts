@@ -45,9 +45,30 @@ class ApiService {
       throw new Error(error.detail || 'Request failed');
     }
 
+    if (response.status === 204) {
+      return undefined as T;
+    }
+
     return response.json();
   }
 
+  // Creates resend the same Idempotency-Key when the network drops, so a retry never creates a duplicate
+  private async createWithRetry<T>(endpoint: string, data: any, idempotencyKey = crypto.randomUUID(), attempts = 3): Promise<T> {
+    for (let attempt = 1; ; attempt++) {
+      try {
+        return await this.request<T>(endpoint, {
+          method: 'POST',
+          headers: { 'Idempotency-Key': idempotencyKey },
+          body: JSON.stringify(data),
+        });
+      } catch (error) {
+        // fetch only rejects with a TypeError for network failures, HTTP errors are final
+        if (!(error instanceof TypeError) || attempt >= attempts) throw error;
+        await new Promise((resolve) => setTimeout(resolve, 500 * attempt));
+      }
+    }
+  }
+
   // Auth endpoints
   async login(email: string, password: string) {
     const response = await this.request<{ access_token: string; user: any }>('/api/auth/login', {
@@ -67,10 +88,43 @@ class ApiService {
     return response;
   }
 
+  // Revokes the token server-side, the local token is dropped either way
+  async logout() {
+    try {
+      await this.request<void>('/api/auth/logout', { method: 'POST' });
+    } finally {
+      this.clearToken();
+    }
+  }
+
+  async changePassword(currentPassword: string, newPassword: string) {
+    const response = await this.request<{ access_token: string; user: any }>('/api/auth/password', {
+      method: 'PUT',
+      body: JSON.stringify({ current_password: currentPassword, new_password: newPassword }),
+    });
+    this.setToken(response.access_token);
+    return response;
+  }
+
   async getMe() {
     return this.request<any>('/api/auth/me');
   }
 
+  // Dashboard: all sections in one request, pass back section versions to skip unchanged data
+  async getDashboard(versions: Record<string, string> = {}) {
+    const known = Object.entries(versions).map(([name, version]) => `${name}:${version}`).join(',');
+    return this.request<Record<string, { version: string; data: any }>>(
+      `/api/dashboard${known ? `?versions=${encodeURIComponent(known)}` : ''}`
+    );
+  }
+
+  // Sync
+  async sync(since = 0) {
+    return this.request<{ version: number; snapshot?: Record<string, any[]>; changes: any[]; has_more: boolean }>(
+      `/api/sync?since=${since}`
+    );
+  }
+
   // Cohorts
   async getCohorts() {
     return this.request<any[]>('/api/cohorts');
@@ -80,11 +134,17 @@ class ApiService {
     return this.request<any>(`/api/cohorts/${id}`);
   }
 
-  async createCohort(data: any) {
-    return this.request<any>('/api/cohorts', {
-      method: 'POST',
-      body: JSON.stringify(data),
-    });
+  async getCohortProgress(id: string, range: { start?: string; end?: string; buckets?: number } = {}) {
+    const params = new URLSearchParams();
+    if (range.start) params.set('start', range.start);
+    if (range.end) params.set('end', range.end);
+    if (range.buckets) params.set('buckets', String(range.buckets));
+    const query = params.toString();
+    return this.request<any>(`/api/cohorts/${id}/progress${query ? `?${query}` : ''}`);
+  }
+
+  async createCohort(data: any, idempotencyKey?: string) {
+    return this.createWithRetry<any>('/api/cohorts', data, idempotencyKey);
   }
 
   async updateCohort(id: string, data: any) {
@@ -109,11 +169,8 @@ class ApiService {
     return this.request<any>(`/api/campus-leads/${id}`);
   }
 
-  async createCampusLead(data: any) {
-    return this.request<any>('/api/campus-leads', {
-      method: 'POST',
-      body: JSON.stringify(data),
-    });
+  async createCampusLead(data: any, idempotencyKey?: string) {
+    return this.createWithRetry<any>('/api/campus-leads', data, idempotencyKey);
   }
 
   async updateCampusLead(id: string, data: any) {
@@ -135,15 +192,46 @@ class ApiService {
     });
   }
 
-  async getMessages(channelId: string) {
-    return this.request<any[]>(`/api/messages/${channelId}`);
+  // Members-only channels (team members only)
+  async getChannelMembers(channelId: string) {
+    return this.request<any[]>(`/api/messages/${channelId}/members`);
   }
 
-  async sendMessage(channelId: string, data: any) {
-    return this.request<any>(`/api/messages/${channelId}`, {
-      method: 'POST',
-      body: JSON.stringify(data),
-    });
+  async addChannelMember(channelId: string, userId: string) {
+    return this.request<void>(`/api/messages/${channelId}/members/${userId}`, { method: 'PUT' });
+  }
+
+  async removeChannelMember(channelId: string, userId: string) {
+    return this.request<void>(`/api/messages/${channelId}/members/${userId}`, { method: 'DELETE' });
+  }
+
+  async getMessages(channelId: string, page: { before?: string; limit?: number } = {}) {
+    const params = new URLSearchParams();
+    if (page.before) params.set('before', page.before);
+    if (page.limit) params.set('limit', String(page.limit));
+    const query = params.toString();
+    return this.request<any[]>(`/api/messages/${channelId}${query ? `?${query}` : ''}`);
+  }
+
+  async getReplies(channelId: string, messageId: string) {
+    return this.request<any[]>(`/api/messages/${channelId}/${messageId}/replies`);
+  }
+
+  async sendMessage(channelId: string, data: any, idempotencyKey?: string) {
+    return this.createWithRetry<any>(`/api/messages/${channelId}`, data, idempotencyKey);
+  }
+
+  // Presence: send a heartbeat every ~20s while a channel is open, and a typing ping while typing
+  async heartbeat(channelId: string) {
+    return this.request<void>(`/api/messages/${channelId}/heartbeat`, { method: 'POST' });
+  }
+
+  async sendTyping(channelId: string) {
+    return this.request<void>(`/api/messages/${channelId}/typing`, { method: 'POST' });
+  }
+
+  async getPresence(channelId: string) {
+    return this.request<{ online: any[]; typing: any[] }>(`/api/messages/${channelId}/presence`);
   }
 
   async toggleStar(channelId: string, messageId: string) {
@@ -163,11 +251,8 @@ class ApiService {
     return this.request<any[]>('/api/events');
   }
 
-  async createEvent(data: any) {
-    return this.request<any>('/api/events', {
-      method: 'POST',
-      body: JSON.stringify(data),
-    });
+  async createEvent(data: any, idempotencyKey?: string) {
+    return this.createWithRetry<any>('/api/events', data, idempotencyKey);
   }
 
   async updateEvent(id: string, data: any) {
@@ -195,11 +280,67 @@ class ApiService {
     });
   }
 
+  // Multipart upload, fetch sets the boundary itself so there is no JSON content type
+  async uploadAvatar(file: File) {
+    const body = new FormData();
+    body.append('file', file);
+    const token = this.getToken();
+    const response = await fetch(`${API_URL}/api/profile/avatar`, {
+      method: 'PUT',
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      body,
+    });
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({ detail: 'Request failed' }));
+      throw new Error(error.detail || 'Request failed');
+    }
+    return response.json();
+  }
+
+  async deleteAvatar() {
+    return this.request<any>('/api/profile/avatar', { method: 'DELETE' });
+  }
+
+  avatarUrl(avatar: string, size: 32 | 64 | 128 | 256 = 128) {
+    return `${API_URL}/api/profile/avatars/${avatar}/${size}`;
+  }
+
+  // Exports are streamed files, returned as a Blob for the caller to save
+  private async download(endpoint: string) {
+    const token = this.getToken();
+    const response = await fetch(`${API_URL}${endpoint}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({ detail: 'Request failed' }));
+      throw new Error(error.detail || 'Request failed');
+    }
+    return response.blob();
+  }
+
+  async exportChannel(channelId: string, format: 'csv' | 'jsonl' = 'csv', start?: string, end?: string, gzip = false) {
+    const params = new URLSearchParams({ format, gzip: String(gzip) });
+    if (start) params.set('start', start);
+    if (end) params.set('end', end);
+    return this.download(`/api/exports/channels/${channelId}?${params}`);
+  }
+
+  async exportCohorts(start?: string, end?: string, gzip = false) {
+    const params = new URLSearchParams({ gzip: String(gzip) });
+    if (start) params.set('start', start);
+    if (end) params.set('end', end);
+    return this.download(`/api/exports/cohorts?${params}`);
+  }
+
   // Stats
   async getStats(category: string) {
     return this.request<any[]>(`/api/stats/${category}`);
   }
 
+  async getStatTrends(category: string, period: 'day' | 'week' | 'month' = 'month', periods = 12) {
+    return this.request<any>(`/api/stats/${category}/trends?period=${period}&periods=${periods}`);
+  }
+
   async updateStats(category: string, stats: any[]) {
     return this.request<any[]>(`/api/stats/${category}`, {
       method: 'PUT',